@@ -0,0 +1,416 @@
+#! /usr/bin/env python3
+import math
+import socket
+import struct
+import logging
+import argparse
+import socketserver
+from os import path, remove
+from threading import Lock, Thread
+from time import monotonic, sleep
+from attrdict import AttrDict
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+import packetmaker as pk
+from Point import Point
+from RobotArm import RobotArm
+from RobotState import RobotState
+from CollisionChecker import CollisionChecker
+from StateMemory import state_memory_name
+from definitions import motor_names
+from robot_kinematics import approach_point_from_angle, get_pose_for_target_analytical
+
+log = logging.getLogger('ArmServer')
+
+# Every frame, in both directions: payload length, request id, opcode (requests) or status (replies).
+frame_header = struct.Struct('<IHB')
+max_payload = 1024
+
+opcodes = AttrDict({
+    'ping': 0,
+    'state': 1,
+    'move': 2,
+    'move2point': 3,
+    'approach': 4,
+    'pick': 5,
+    'place': 6,
+    'unlock': 7,
+})
+ok, error = 0, 1
+
+# Request payloads. Joint masks have bit i set for motor_names[1:][i]. NaN fingers or hand keep the current angle.
+request_formats: Dict[int, struct.Struct] = {
+    opcodes.move: struct.Struct('<B6fI'),           # joint mask, angles, time ms
+    opcodes.move2point: struct.Struct('<3fIff'),    # x, y, z, time ms, fingers, hand
+    opcodes.approach: struct.Struct('<3ffIfff'),    # x, y, z, angle, time ms, offset, fingers, hand
+    opcodes.pick: struct.Struct('<3fIf'),           # x, y, z, time ms, fingers
+    opcodes.place: struct.Struct('<3fI'),           # x, y, z, time ms
+    opcodes.unlock: struct.Struct('<B'),            # joint mask, zero for every joint
+}
+# Reply to every successful command but ping: joint angles, seconds since the last position reply
+# (NaN if the arm never replied), number of position replies.
+state_format = struct.Struct('<6fdI')
+
+Address = Union[str, Tuple[str, int]]
+
+
+def parse_address(text: str) -> Address:
+    """ 'HOST:PORT' for TCP, anything else is the path of a Unix socket. """
+    host, _, port = text.rpartition(':')
+    return (host or 'localhost', int(port)) if port.isdigit() else text
+
+
+def joints_to_mask(joints: List[str]) -> int:
+    return sum(1 << motor_names[1:].index(joint) for joint in joints)
+
+
+def mask_to_joints(mask: int) -> List[str]:
+    return [joint for index, joint in enumerate(motor_names[1:]) if mask & (1 << index)]
+
+
+def optional(value: float) -> Optional[float]:
+    return None if math.isnan(value) else value
+
+
+def receive_exactly(connection: socket.socket, size: int) -> Optional[bytes]:
+    """ Read size bytes, or None if the peer closed the connection first. """
+    data = bytearray()
+    while len(data) < size:
+        chunk = connection.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+class ArmServer:
+    """
+        Owns a RobotArm and serves its commands to local clients. Motion commands are serialized,
+        while state queries are answered from the arm's state, which telemetry keeps current,
+        so they never wait for a move or touch the serial port.
+    """
+
+    def __init__(self, arm: RobotArm, address: Address, telemetry_hz: float = 20.0) -> None:
+        """
+            Initialize the server. Nothing is bound until start or serve_forever.
+        :param arm: Arm to serve.
+        :param address: Path of a Unix socket, or (host, port) for TCP.
+        :param telemetry_hz: Rate of the position polling which keeps the state current. Zero disables it.
+        """
+        self.arm: RobotArm = arm
+        self.address: Address = address
+        self.telemetry_hz: float = telemetry_hz
+        self.motion_lock: Lock = Lock()
+        self.requests: int = 0
+        self.server: Optional[socketserver.BaseServer] = None
+        self.thread: Optional[Thread] = None
+        self.handlers: Dict[int, Callable[[bytes], bytes]] = {
+            opcodes.ping: lambda _payload: b'',
+            opcodes.state: lambda _payload: self.encode_state(),
+            opcodes.move: self.move,
+            opcodes.move2point: self.move_to_point,
+            opcodes.approach: self.approach,
+            opcodes.pick: self.pick,
+            opcodes.place: self.place,
+            opcodes.unlock: self.unlock,
+        }
+
+    def encode_state(self) -> bytes:
+        age = monotonic() - self.arm.last_update if self.arm.position_updates else math.nan
+        angles = [self.arm.State[joint] for joint in motor_names[1:]]
+        return state_format.pack(*angles, age, self.arm.position_updates)
+
+    def dispatch(self, opcode: int, payload: bytes) -> Tuple[int, bytes]:
+        """
+            Run one request.
+        :return: Tuple (status, reply payload). Errors reply with their message.
+        """
+        self.requests += 1
+        handler = self.handlers.get(opcode)
+        if handler is None:
+            return error, f'Unknown opcode {opcode}.'.encode()
+        request_format = request_formats.get(opcode)
+        if request_format is not None and len(payload) != request_format.size:
+            return error, f'Opcode {opcode} takes {request_format.size} bytes, got {len(payload)}.'.encode()
+        try:
+            return ok, handler(payload)
+        except Exception as exception:
+            log.warning(f'Request {opcode} failed: {exception!r}')
+            return error, (str(exception) or type(exception).__name__).encode()
+
+    def current_or(self, angle: float, joint: str) -> float:
+        """ An optional angle of a request, or the current angle of the joint if it was left out (NaN). """
+        return self.arm.State[joint] if math.isnan(angle) else angle
+
+    def check_target(self, target: Dict[str, float]) -> None:
+        """ Raise ValueError if joint angles are unsafe or collide. """
+        state = RobotState(target)
+        if not state.is_state_safe() or self.arm.collides(state):
+            raise ValueError('Target is unsafe or collides. Not sending.')
+
+    def send_target(self, target: Dict[str, float], time_ms: int) -> None:
+        """ Move to joint angles, or raise without sending if they are unsafe. Call with motion_lock held. """
+        self.check_target(target)
+        self.arm.send(pk.write_servo_move(target, time_ms))
+        self.arm.State.update_state(target)
+        self.arm.publish_state()
+
+    def move(self, payload: bytes) -> bytes:
+        mask, *angles, time_ms = request_formats[opcodes.move].unpack(payload)
+        joints = mask_to_joints(mask)
+        with self.motion_lock:
+            target = dict(self.arm.State.items())
+            target.update({joint: angle for joint, angle in zip(motor_names[1:], angles) if joint in joints})
+            self.send_target(target, time_ms)
+        return self.encode_state()
+
+    def solve_point(self, point: Point, fingers: float, hand: float) -> Dict[str, float]:
+        """ Joint angles reaching a point with the given fingers and hand. Raises ValueError if none do. """
+        state = get_pose_for_target_analytical(point)
+        if state is None:
+            raise ValueError('No pose reaches the target. Not sending.')
+        target = dict(state.items())
+        target.update(fingers=fingers, hand=hand)
+        return target
+
+    def run_waypoints(self, waypoints: List[Tuple[Point, int, float, float]]) -> None:
+        """
+            Move through waypoints, each once the previous move has finished. Every waypoint is solved and checked
+            before the first is sent, so a rejected step raises without moving the arm. motion_lock is held while
+            sending, not while waiting for a move to finish.
+        :param waypoints: List of (point, time ms, fingers, hand).
+        :raises ValueError: If any waypoint is unreachable, unsafe or collides.
+        """
+        targets = [(self.solve_point(point, fingers, hand), time_ms) for point, time_ms, fingers, hand in waypoints]
+        for target, _time_ms in targets:
+            self.check_target(target)
+        for index, (target, time_ms) in enumerate(targets):
+            if index:
+                sleep(targets[index - 1][1] / 1000)
+            with self.motion_lock:
+                self.send_target(target, time_ms)
+
+    def move_to_point(self, payload: bytes) -> bytes:
+        # Solved here rather than by RobotArm.move_to_point, which only logs a rejected target.
+        x, y, z, time_ms, fingers, hand = request_formats[opcodes.move2point].unpack(payload)
+        with self.motion_lock:
+            target = self.solve_point(Point(cartesian=(x, y, z)),
+                                      self.current_or(fingers, 'fingers'), self.current_or(hand, 'hand'))
+            self.send_target(target, time_ms)
+        return self.encode_state()
+
+    def approach(self, payload: bytes) -> bytes:
+        x, y, z, angle, time_ms, offset, fingers, hand = request_formats[opcodes.approach].unpack(payload)
+        with self.motion_lock:
+            state = approach_point_from_angle(Point(cartesian=(x, y, z)), angle, offset,
+                                              self.current_or(fingers, 'fingers'), self.current_or(hand, 'hand'))
+            if state is None:
+                raise ValueError('No pose reaches the target. Not sending.')
+            self.send_target(dict(state.items()), time_ms)
+        return self.encode_state()
+
+    def pick(self, payload: bytes) -> bytes:
+        # The moves of RobotArm.pick_at_point, which only logs a rejected step.
+        x, y, z, time_ms, fingers = request_formats[opcodes.pick].unpack(payload)
+        with self.motion_lock:
+            start_x, start_y, start_z = self.arm.State.get_cartesian()
+            current_fingers, fingers = self.arm.State['fingers'], self.current_or(fingers, 'fingers')
+        point, above = Point(cartesian=(x, y, z)), Point(cartesian=(x, y, z + 2))
+        # Lift the gripper clear of the table, open it above the target, lower it, close it and lift the object.
+        self.run_waypoints([(Point(cartesian=(start_x, start_y, max(start_z, 5))), 1000, current_fingers, 90),
+                            (above, 1000, fingers - 40, 90),
+                            (point, time_ms, fingers - 40, 90),
+                            (point, 1000, fingers, 90),
+                            (above, 1000, fingers, 90)])
+        return self.encode_state()
+
+    def place(self, payload: bytes) -> bytes:
+        # The moves of RobotArm.place_at_point, which only logs a rejected step.
+        x, y, z, time_ms = request_formats[opcodes.place].unpack(payload)
+        with self.motion_lock:
+            fingers = self.arm.State['fingers']
+        point, above = Point(cartesian=(x, y, z)), Point(cartesian=(x, y, z + 2))
+        # Carry the object above the target, lower it, open the gripper and lift it.
+        self.run_waypoints([(above, time_ms, fingers, 90),
+                            (point, 1000, fingers, 90),
+                            (point, 1000, fingers - 40, 90),
+                            (above, 1000, fingers - 40, 90)])
+        return self.encode_state()
+
+    def unlock(self, payload: bytes) -> bytes:
+        mask, = request_formats[opcodes.unlock].unpack(payload)
+        with self.motion_lock:
+            self.arm.send(pk.write_servo_unlock(mask_to_joints(mask) if mask else motor_names[1:]))
+        return self.encode_state()
+
+    def bind(self) -> socketserver.BaseServer:
+        if isinstance(self.address, str):
+            if path.exists(self.address):
+                remove(self.address)
+            server: socketserver.BaseServer = ThreadingUnixServer(self.address, ArmRequestHandler)
+        else:
+            server = ThreadingTCPServer(self.address, ArmRequestHandler)
+            # Report the port actually bound, in case port 0 was requested.
+            self.address = server.server_address  # type: ignore
+        server.arm_server = self  # type: ignore
+        return server
+
+    def start(self) -> None:
+        """ Serve on a background thread. """
+        self.server = self.bind()
+        if self.telemetry_hz > 0:
+            self.arm.start_telemetry(self.telemetry_hz)
+        self.thread = Thread(target=self.server.serve_forever, name='ArmServer', daemon=True)
+        self.thread.start()
+        log.info(f'Serving the arm on {self.address}.')
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.arm.stop_telemetry()
+        if isinstance(self.address, str) and path.exists(self.address):
+            remove(self.address)
+
+
+class ArmRequestHandler(socketserver.BaseRequestHandler):
+    """ One connection: requests are answered in order until the client disconnects. """
+
+    def handle(self) -> None:
+        connection: socket.socket = self.request
+        if connection.family != socket.AF_UNIX:
+            connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        arm_server: ArmServer = self.server.arm_server  # type: ignore
+        while True:
+            header = receive_exactly(connection, frame_header.size)
+            if header is None:
+                return
+            length, request_id, opcode = frame_header.unpack(header)
+            if length > max_payload:
+                log.error(f'Closing a connection sending a {length} byte payload.')
+                return
+            payload = receive_exactly(connection, length) if length else b''
+            if payload is None:
+                return
+            status, reply = arm_server.dispatch(opcode, payload)
+            connection.sendall(frame_header.pack(len(reply), request_id, status) + reply)
+
+
+class ThreadingUnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class ArmClient:
+    """ Connection to an ArmServer. One request is in flight at a time; share it between threads freely. """
+
+    def __init__(self, address: Address) -> None:
+        family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+        self.socket: socket.socket = socket.socket(family, socket.SOCK_STREAM)
+        self.socket.connect(address)
+        if family == socket.AF_INET:
+            self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.lock: Lock = Lock()
+        self.request_id: int = 0
+
+    def __enter__(self) -> 'ArmClient':
+        return self
+
+    def __exit__(self, *_args: object) -> None:
+        self.close()
+
+    def request(self, opcode: int, payload: bytes = b'') -> bytes:
+        """
+            Send a request and wait for its reply.
+        :return: Reply payload.
+        :raises RuntimeError: If the server reports an error or closes the connection.
+        """
+        with self.lock:
+            self.request_id = (self.request_id + 1) & 0xFFFF
+            self.socket.sendall(frame_header.pack(len(payload), self.request_id, opcode) + payload)
+            header = receive_exactly(self.socket, frame_header.size)
+            if header is None:
+                raise RuntimeError('ArmServer closed the connection.')
+            length, request_id, status = frame_header.unpack(header)
+            reply = receive_exactly(self.socket, length) if length else b''
+        if reply is None or request_id != self.request_id:
+            raise RuntimeError('ArmServer connection out of sync.')
+        if status != ok:
+            raise RuntimeError(reply.decode())
+        return reply
+
+    def ping(self) -> None:
+        self.request(opcodes.ping)
+
+    def state(self) -> Dict[str, Any]:
+        """ Joint angles, seconds since the last position reply (None if never) and number of replies. """
+        *angles, age, updates = state_format.unpack(self.request(opcodes.state))
+        return {'joints': dict(zip(motor_names[1:], angles)), 'age_s': optional(age), 'updates': updates}
+
+    def move(self, angles: Dict[str, float], time_ms: int = 1000) -> None:
+        """ Move the given joints, keeping the others where they are. """
+        values = [angles.get(joint, 0.0) for joint in motor_names[1:]]
+        self.request(opcodes.move, request_formats[opcodes.move].pack(joints_to_mask(list(angles)), *values, time_ms))
+
+    def move_to_point(self, point: Point, time_ms: int = 1000, fingers: Optional[float] = None,
+                      hand: Optional[float] = None) -> None:
+        self.request(opcodes.move2point, request_formats[opcodes.move2point].pack(
+            *point.cartesian, time_ms, math.nan if fingers is None else fingers, math.nan if hand is None else hand))
+
+    def approach(self, point: Point, angle: float, time_ms: int = 1000, offset: float = 0.0,
+                 fingers: Optional[float] = None, hand: Optional[float] = None) -> None:
+        self.request(opcodes.approach, request_formats[opcodes.approach].pack(
+            *point.cartesian, angle, time_ms, offset,
+            math.nan if fingers is None else fingers, math.nan if hand is None else hand))
+
+    def pick(self, point: Point, time_ms: int = 1000, fingers: float = 0.0) -> None:
+        self.request(opcodes.pick, request_formats[opcodes.pick].pack(*point.cartesian, time_ms, fingers))
+
+    def place(self, point: Point, time_ms: int = 1000) -> None:
+        self.request(opcodes.place, request_formats[opcodes.place].pack(*point.cartesian, time_ms))
+
+    def unlock(self, joints: Optional[List[str]] = None) -> None:
+        """ Unlock the given joints. (Defaults to every joint.) """
+        self.request(opcodes.unlock, request_formats[opcodes.unlock].pack(joints_to_mask(joints or [])))
+
+    def close(self) -> None:
+        self.socket.close()
+
+
+def main() -> None:  # pragma: no cover
+    logging.basicConfig(level=logging.INFO,
+                        format=f'[%(levelname)s] {path.basename(__file__)} %(funcName)s: \n%(message)s')
+
+    parser = argparse.ArgumentParser(description='Serve the arm to local clients.')
+    parser.add_argument('address', type=str, nargs='?', default='/tmp/xarm.sock',
+                        help='Unix socket path, or HOST:PORT for TCP.')
+    parser.add_argument('-p', '--port', type=str, default=None, help='Serial port of the arm.')
+    parser.add_argument('-r', '--rate', type=float, default=20.0, help='Position polls per second. Zero disables.')
+    parser.add_argument('-m', '--memory', type=str, nargs='?', const=state_memory_name, default=None,
+                        help='Also publish the state to this shared memory block for StateReaders.')
+    arguments = parser.parse_args()
+
+    arm = RobotArm(CollisionChecker(), arguments.port)
+    if arguments.memory is not None:
+        arm.start_publishing(arguments.memory)
+    server = ArmServer(arm, parse_address(arguments.address), arguments.rate)
+    server.start()
+    try:
+        if server.thread is not None:
+            server.thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+    finally:
+        arm.stop_publishing()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+import logging
+import numpy as np
+from typing import Dict, Optional, Union
+
+from RobotState import RobotState
+from definitions import motor_names
+
+log = logging.getLogger('ChangeDetector')
+
+# Largest joint motion in degrees which still counts as holding still.
+default_deadband_deg: float = 2.0
+
+
+class ChangeDetector:
+    """
+        Detects keyframes in a stream of states: a keyframe is committed once the joints have stayed
+        within their deadbands for the dwell time. Works in preallocated buffers so it never allocates per sample.
+    """
+
+    def __init__(self, deadbands: Union[float, Dict[str, float]] = default_deadband_deg, dwell_s: float = 5.0) -> None:
+        """
+            Initialize the detector.
+        :param deadbands: Deadband in degrees for every joint, or a dict of deadbands by motor name.
+        :param dwell_s: Time the joints must hold still before a keyframe is committed.
+        """
+        if isinstance(deadbands, dict):
+            self.deadbands: np.ndarray = \
+                np.array([deadbands.get(motor, default_deadband_deg) for motor in motor_names[1:]])
+        else:
+            self.deadbands = np.full(len(motor_names) - 1, deadbands, dtype=np.float64)
+        self.dwell_s: float = dwell_s
+
+        self.current: np.ndarray = np.zeros(len(motor_names) - 1)
+        # Position the dwell timer is measured from, and the last committed keyframe.
+        self.reference: np.ndarray = np.zeros(len(motor_names) - 1)
+        self.keyframe: np.ndarray = np.zeros(len(motor_names) - 1)
+        self.difference: np.ndarray = np.zeros(len(motor_names) - 1)
+        self.exceeded: np.ndarray = np.zeros(len(motor_names) - 1, dtype=bool)
+
+        self.last_change: Optional[float] = None
+        self.committed: bool = False
+        self.keyframes: int = 0
+
+    def reset(self) -> None:
+        """ Forget the reference position, so the next sample starts a new dwell. """
+        self.last_change = None
+        self.committed = False
+
+    def update(self, state: RobotState, now: float) -> bool:
+        """
+            Feed one sample.
+        :param state: Current state of the arm.
+        :param now: Time of the sample in seconds.
+        :return: Whether a keyframe was committed. It is then available in self.keyframe.
+        """
+        for column, motor in enumerate(motor_names[1:]):
+            self.current[column] = state[motor]
+
+        if self.last_change is None:
+            self.reference[:] = self.current
+            self.last_change = now
+            return False
+
+        np.subtract(self.current, self.reference, out=self.difference)
+        np.absolute(self.difference, out=self.difference)
+        np.greater(self.difference, self.deadbands, out=self.exceeded)
+        if self.exceeded.any():
+            log.debug('State Changed.')
+            self.reference[:] = self.current
+            self.last_change = now
+            self.committed = False
+            return False
+
+        if self.committed or now - self.last_change < self.dwell_s:
+            return False
+        self.keyframe[:] = self.current
+        self.committed = True
+        self.keyframes += 1
+        return True
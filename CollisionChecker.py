@@ -0,0 +1,99 @@
+import logging
+import numpy as np
+from typing import List, Optional, Sequence, Tuple
+
+from RobotState import RobotState
+from definitions import base_radius, motor_names, shoulder_height
+from robot_kinematics import forward_kinematics
+
+log = logging.getLogger('CollisionChecker')
+
+
+def interpolate_states(start: RobotState, end: RobotState, samples: int = 20) -> np.ndarray:
+    """
+        Samples the straight joint-space path the servos follow between two states.
+    :param start: State at the start of the move.
+    :param end: State at the end of the move.
+    :param samples: Number of samples, including both ends.
+    :return: Array of shape (samples, 6) of joint angles in motor_names[1:] order.
+    """
+    fractions = np.linspace(0.0, 1.0, samples)[:, np.newaxis]
+    start_joints = np.array([start[joint] for joint in motor_names[1:]], dtype=np.float64)
+    end_joints = np.array([end[joint] for joint in motor_names[1:]], dtype=np.float64)
+    return start_joints + fractions * (end_joints - start_joints)
+
+
+class CollisionChecker:
+    """ Tests trajectories against the table, the base of the arm and box obstacles. """
+
+    def __init__(self, ground_z: float = -shoulder_height, base_radius: float = base_radius, base_top: float = 0.0,
+                 clearance: float = 0.0, link_samples: int = 4) -> None:
+        """
+            Initialize the collision geometry. Coordinates are relative to the shoulder pivot.
+        :param ground_z: Height of the table.
+        :param base_radius: Radius of the cylinder enclosing the base.
+        :param base_top: Height of the top of the base cylinder.
+        :param clearance: Margin kept from every surface.
+        :param link_samples: Points tested along each link, including its far endpoint.
+        """
+        self.ground_z: float = ground_z
+        self.base_radius: float = base_radius
+        self.base_top: float = base_top
+        self.clearance: float = clearance
+        self.boxes: List[Tuple[np.ndarray, np.ndarray]] = []
+        # Fractions along each link. The shoulder pivot itself never moves and is not tested.
+        self.fractions: np.ndarray = np.linspace(0.0, 1.0, link_samples + 1)[1:]
+
+    def add_box(self, lower: Sequence[float], upper: Sequence[float]) -> None:
+        """
+            Add an axis-aligned box obstacle.
+        :param lower: (x, y, z) of the lowest corner.
+        :param upper: (x, y, z) of the highest corner.
+        """
+        self.boxes.append((np.asarray(lower, dtype=np.float64) - self.clearance,
+                           np.asarray(upper, dtype=np.float64) + self.clearance))
+
+    def link_points(self, joints: np.ndarray) -> np.ndarray:
+        """
+            Points along every link for a batch of joint vectors.
+        :param joints: Array of shape (N, 6).
+        :return: Array of shape (N, 3 * link_samples, 3).
+        """
+        endpoints = forward_kinematics(joints)
+        starts, ends = endpoints[:, :-1, np.newaxis, :], endpoints[:, 1:, np.newaxis, :]
+        points = starts + self.fractions[:, np.newaxis] * (ends - starts)
+        return points.reshape(len(endpoints), -1, 3)
+
+    def collisions(self, joints: np.ndarray) -> np.ndarray:
+        """
+            Tests every sample of a trajectory at once.
+        :param joints: Array of shape (N, 6) of joint angles in motor_names[1:] order.
+        :return: Boolean array of shape (N,), True where the sample collides.
+        """
+        points = self.link_points(joints)
+        x, y, z = points[..., 0], points[..., 1], points[..., 2]
+
+        hits = z < self.ground_z + self.clearance
+        hits |= (z < self.base_top + self.clearance) & (x ** 2 + y ** 2 < (self.base_radius + self.clearance) ** 2)
+        for lower, upper in self.boxes:
+            hits |= np.all((lower <= points) & (points <= upper), axis=-1)
+        return np.any(hits, axis=1)
+
+    def first_collision(self, joints: np.ndarray) -> Optional[int]:
+        """
+            Finds the first colliding sample of a trajectory.
+        :param joints: Array of shape (N, 6) of joint angles in motor_names[1:] order.
+        :return: Index of the first offending sample, or None if the trajectory is clear.
+        """
+        hits = np.flatnonzero(self.collisions(np.atleast_2d(joints)))
+        return int(hits[0]) if len(hits) else None
+
+    def check_move(self, start: RobotState, end: RobotState, samples: int = 20) -> Optional[int]:
+        """
+            Tests the joint-space path between two states.
+        :return: Index of the first offending sample, or None if the move is clear.
+        """
+        index = self.first_collision(interpolate_states(start, end, samples))
+        if index is not None:
+            log.warning(f'Collision at sample {index} of {samples} on the way to:\n{end}')
+        return index
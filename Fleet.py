@@ -0,0 +1,163 @@
+#! /usr/bin/env python3
+import logging
+import argparse
+from os import path
+from time import monotonic, sleep
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Mapping, Optional
+
+import packetmaker as pk
+from RobotArm import RobotArm
+from RobotState import RobotState
+from CollisionChecker import CollisionChecker
+from PlaybackScheduler import PlaybackScheduler
+from motion_compiler import CompiledMotion, play_compiled
+
+log = logging.getLogger('Fleet')
+
+
+class Fleet:
+    """
+        Several arms on separate serial ports. Each port has its own worker thread, so the blocking
+        serial I/O of the arms overlaps, while the commands to any one arm still run in order.
+    """
+
+    def __init__(self, ports: List[str], collision_checker: Optional[Callable[[], CollisionChecker]] = None) -> None:
+        """
+            Initialize the fleet. No port is opened until an arm is first used.
+        :param ports: Serial port of each arm, e.g. ['/dev/ttyUSB0', '/dev/ttyUSB1'].
+        :param collision_checker: Factory of the collision checker of each arm. (Defaults to none.)
+        """
+        self.arms: Dict[str, RobotArm] = {
+            port: RobotArm(None if collision_checker is None else collision_checker(), port) for port in ports}
+        self.workers: Dict[str, ThreadPoolExecutor] = {
+            port: ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'Fleet-{path.basename(port)}')
+            for port in ports}
+
+    def __enter__(self) -> 'Fleet':
+        return self
+
+    def __exit__(self, *_args: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.arms)
+
+    def submit(self, port: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """
+            Queue a command on the worker of one arm.
+        :param port: Port of the arm.
+        :param func: Function called with the arm as first argument, e.g. RobotArm.move_to_point.
+        :return: Future of the result.
+        """
+        return self.workers[port].submit(func, self.arms[port], *args, **kwargs)
+
+    def run(self, port: str, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """ Run a command on one arm and wait for its result. """
+        return self.submit(port, func, *args, **kwargs).result()
+
+    def broadcast(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        """
+            Run the same command on every arm at once and wait for all of them.
+        :return: Dict of port to result. The first exception raised by an arm is re-raised.
+        """
+        futures = {port: self.submit(port, func, *args, **kwargs) for port in self.arms}
+        return {port: future.result() for port, future in futures.items()}
+
+    def play(self, motions: Mapping[str, CompiledMotion], lead_s: float = 0.05,
+             spin_s: float = 0.002) -> Dict[str, PlaybackScheduler]:
+        """
+            Play compiled motions on several arms, starting together. Every arm's frame offsets
+            are measured from one shared start time, so the arms stay aligned throughout.
+        :param motions: Dict of port to the compiled motion of that arm.
+        :param lead_s: Delay before the shared start, long enough for every worker to be waiting.
+        :param spin_s: Final stretch before each frame spent busy-waiting.
+        :return: Dict of port to the scheduler, holding each arm's lateness statistics.
+        :raises RuntimeError: If the port of an arm cannot be opened.
+        """
+        # Ports are opened first: an arm opening its port after the start would send its first frame late.
+        opened = {port: self.submit(port, RobotArm.ensure_serial) for port in motions}
+        for port, future in opened.items():
+            if not future.result():
+                raise RuntimeError(f'No serial connection to the arm on {port}. No arm was moved.')
+        origin = monotonic() + lead_s
+        futures = {port: self.workers[port].submit(play_compiled, self.arms[port].send, motion,
+                                                   spin_s=spin_s, origin=origin)
+                   for port, motion in motions.items()}
+        return {port: future.result() for port, future in futures.items()}
+
+    def move(self, targets: Mapping[str, Dict[str, float]], time_ms: int, lead_s: float = 0.05,
+             spin_s: float = 0.002) -> Dict[str, PlaybackScheduler]:
+        """
+            Move several arms to joint targets, starting together. Nothing is sent unless every target is safe.
+        :param targets: Dict of port to joint angles. Joints left out keep their current angle.
+        :param time_ms: Duration of the move.
+        :param lead_s: Delay before the shared start.
+        :param spin_s: Final stretch before the start spent busy-waiting.
+        :return: Dict of port to the scheduler of each arm.
+        """
+        states = {}
+        for port, angles in targets.items():
+            arm = self.arms[port]
+            unknown = set(angles) - set(arm.State.keys())
+            if unknown:
+                raise ValueError(f'Unknown joints for the arm on {port}: {sorted(unknown)}. No arm was moved.')
+            state = RobotState({**dict(arm.State.items()), **angles})
+            if not state.is_state_safe() or arm.collides(state):
+                raise ValueError(f'Target of the arm on {port} is unsafe or collides. No arm was moved: {angles}')
+            states[port] = state
+
+        motions = {port: CompiledMotion([(0, pk.write_servo_move(vars(state), time_ms))])
+                   for port, state in states.items()}
+        schedulers = self.play(motions, lead_s, spin_s)
+        for port, state in states.items():
+            self.arms[port].State.update_state(vars(state))
+            self.arms[port].publish_state()
+        return schedulers
+
+    def poll(self, wait_s: float = 0.1) -> Dict[str, Dict[str, Any]]:
+        """ Request the positions of every arm at once, read the replies and return a snapshot. """
+        self.broadcast(RobotArm.request_positions)
+        sleep(wait_s)
+        self.broadcast(RobotArm.receive_serial)
+        return self.snapshot()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+            Current state of every arm.
+        :return: Dict of port to joint angles, Cartesian tip position, number of position updates
+            and seconds since the last update (None if the arm never replied).
+        """
+        now = monotonic()
+        return {port: {'joints': dict(arm.State.items()),
+                       'cartesian': tuple(arm.State.get_cartesian()),
+                       'updates': arm.position_updates,
+                       'age_s': now - arm.last_update if arm.position_updates else None}
+                for port, arm in self.arms.items()}
+
+    def close(self) -> None:
+        """ Stop the telemetry of every arm and wait for queued commands to finish. """
+        for arm in self.arms.values():
+            arm.stop_telemetry()
+        for worker in self.workers.values():
+            worker.shutdown(wait=True)
+
+
+def main() -> None:  # pragma: no cover
+    logging.basicConfig(level=logging.INFO,
+                        format=f'[%(levelname)s] {path.basename(__file__)} %(funcName)s: \n%(message)s')
+
+    parser = argparse.ArgumentParser(description='Poll or unlock several arms at once.')
+    parser.add_argument('ports', type=str, nargs='+', help='Serial port of each arm.')
+    parser.add_argument('-u', '--unlock', action='store_true', help='Unlock the servos of every arm.')
+    arguments = parser.parse_args()
+
+    with Fleet(arguments.ports) as fleet:
+        if arguments.unlock:
+            fleet.broadcast(RobotArm.unlock_servos)
+        for port, state in fleet.poll().items():
+            log.info(f'{port}: {state}')
+
+
+if __name__ == '__main__':
+    main()
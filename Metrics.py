@@ -0,0 +1,158 @@
+import os
+import time
+import logging
+from functools import wraps
+from typing import Any, Callable, Dict, List
+
+log = logging.getLogger('Metrics')
+
+# XARM_METRICS=0 leaves every instrumented function unwrapped: zero overhead, but `stats on` has no effect.
+instrumented: bool = os.environ.get('XARM_METRICS', '1') != '0'
+clock_ns: Callable[[], int] = getattr(time, 'perf_counter_ns', lambda: int(time.perf_counter() * 1e9))
+
+# Histogram precision: values below 2**precision_bits nanoseconds are exact, larger ones keep
+# precision_bits - 1 significant bits (about 6 % resolution) in logarithmically sized buckets.
+precision_bits = 5
+sub_buckets = 1 << precision_bits
+half_sub_buckets = sub_buckets >> 1
+bucket_count = 64 * half_sub_buckets + sub_buckets
+
+
+def bucket_index(value: int) -> int:
+    """ HDR-style bucket of a non-negative integer. """
+    if value < sub_buckets:
+        return value
+    shift = value.bit_length() - precision_bits
+    return shift * half_sub_buckets + (value >> shift)
+
+
+def bucket_value(index: int) -> int:
+    """ Lowest value of a bucket. """
+    if index < sub_buckets:
+        return index
+    shift, offset = divmod(index, half_sub_buckets)
+    return (offset + half_sub_buckets) << (shift - 1)
+
+
+class Counter:
+    __slots__ = ('value',)
+
+    def __init__(self) -> None:
+        self.value: int = 0
+
+    def increment(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Histogram:
+    """
+        Latency histogram in nanoseconds with a fixed number of log-linear buckets.
+        Only the buckets and the total are updated per value; everything else is derived from them.
+    """
+    __slots__ = ('counts', 'total')
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * bucket_count
+        self.total: int = 0
+
+    def clear(self) -> None:
+        self.counts[:] = [0] * bucket_count
+        self.total = 0
+
+    def record(self, value: int) -> None:
+        self.counts[bucket_index(value)] += 1
+        self.total += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def percentile(self, percentile: float) -> int:
+        """ Lowest value of the bucket holding the given percentile. """
+        rank = max(1, int(round(percentile / 100 * self.count)))
+        seen = 0
+        for index, bucket in enumerate(self.counts):
+            seen += bucket
+            if seen >= rank:
+                return bucket_value(index)
+        return 0
+
+    def snapshot(self) -> Dict[str, float]:
+        """ Count and latency summary in microseconds. The maximum is the lowest value of the highest bucket. """
+        count = self.count
+        result: Dict[str, float] = {'count': float(count)}
+        if count:
+            result['mean_us'] = self.total / count / 1000
+            for percentile in (50, 90, 99, 100):
+                result['max_us' if percentile == 100 else f'p{percentile}_us'] = self.percentile(percentile) / 1000
+        return result
+
+
+class MetricsRegistry:
+    """ Named counters and histograms. Recording is skipped entirely while disabled. """
+
+    def __init__(self, enabled: bool = False) -> None:
+        self.enabled: bool = enabled
+        self.counters: Dict[str, Counter] = {}
+        self.histograms: Dict[str, Histogram] = {}
+
+    def counter(self, name: str) -> Counter:
+        return self.counters.setdefault(name, Counter())
+
+    def histogram(self, name: str) -> Histogram:
+        return self.histograms.setdefault(name, Histogram())
+
+    def reset(self) -> None:
+        """ Clear every metric, keeping the objects the instrumented code holds. """
+        for counter in self.counters.values():
+            counter.value = 0
+        for histogram in self.histograms.values():
+            histogram.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """ Dict of the counters and histograms which recorded anything. """
+        return {
+            'counters': {name: counter.value for name, counter in sorted(self.counters.items()) if counter.value},
+            'histograms': {name: histogram.snapshot()
+                           for name, histogram in sorted(self.histograms.items()) if histogram.count},
+        }
+
+
+registry = MetricsRegistry()
+
+
+def timed(name: str) -> Callable[[Callable], Callable]:
+    """
+        Decorator recording the duration of each call in the histogram name of the registry.
+        While the registry is disabled a call costs one flag check.
+    """
+    def decorator(func: Callable) -> Callable:
+        if not instrumented:
+            return func
+        histogram = registry.histogram(name)
+        counts = histogram.counts
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not registry.enabled:
+                return func(*args, **kwargs)
+            start = clock_ns()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                # Histogram.record, inlined: this runs on every instrumented call.
+                elapsed = clock_ns() - start
+                if elapsed < sub_buckets:
+                    counts[elapsed] += 1
+                else:
+                    shift = elapsed.bit_length() - precision_bits
+                    counts[shift * half_sub_buckets + (elapsed >> shift)] += 1
+                histogram.total += elapsed
+        return wrapper
+    return decorator
+
+
+def count(name: str, amount: int = 1) -> None:
+    """ Increment the counter name of the registry, if enabled. """
+    if registry.enabled:
+        registry.counter(name).increment(amount)
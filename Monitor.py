@@ -0,0 +1,76 @@
+import logging
+import numpy as np
+from threading import Event, Thread
+from typing import Callable, Dict, Optional
+
+from RobotState import RobotState
+from Telemetry import Telemetry, joint_columns
+from definitions import motor_names
+
+log = logging.getLogger('Monitor')
+
+
+def format_sample(sample: np.ndarray, stats: Dict[str, float]) -> str:
+    """
+        Render one telemetry sample as a status line.
+    :param sample: Telemetry row: request time, reply time, joint angles.
+    :param stats: Telemetry.stats() for the achieved rate and latency.
+    :return: Joint angles, Cartesian tip position, sample rate and reply latency.
+    """
+    state = RobotState(dict(zip(motor_names[1:], sample[joint_columns].tolist())))
+    joints = '  '.join(f'{motor} {angle:+7.2f}' for motor, angle in state.items())
+    x, y, z = state.get_cartesian()
+    latency = f"latency p50 {stats['latency_p50_ms']:.1f} ms p99 {stats['latency_p99_ms']:.1f} ms" \
+        if 'latency_p50_ms' in stats else 'no replies'
+    return f'{joints}\ntip ({x:+6.2f}, {y:+6.2f}, {z:+6.2f})  {stats["rate_hz"]:.1f} Hz  {latency}'
+
+
+class Monitor:
+    """ Renders the latest telemetry sample on a background thread, at most refresh_hz times per second. """
+
+    def __init__(self, telemetry: Telemetry, render: Callable[[str], bool], refresh_hz: float = 2.0) -> None:
+        """
+            Initialize the monitor.
+        :param telemetry: Running telemetry of the arm.
+        :param render: Function which displays a status text. Returns False if the terminal was busy.
+        :param refresh_hz: Largest number of renders per second.
+        """
+        self.telemetry: Telemetry = telemetry
+        self.render: Callable[[str], bool] = render
+        self.period: float = 1 / refresh_hz
+        self.rendered_count: int = -1
+        self.renders: int = 0
+        self.stopped: Event = Event()
+        self.thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        self.stopped.clear()
+        self.thread = Thread(target=self.run, name='Monitor', daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self, cycles: Optional[int] = None) -> None:
+        """
+            Refresh once per period until stopped.
+        :param cycles: Number of periods to run. (Defaults to running until stop is called.)
+        """
+        cycle = 0
+        while (cycles is None or cycle < cycles) and not self.stopped.wait(self.period):
+            self.refresh()
+            cycle += 1
+
+    def refresh(self) -> bool:
+        """ Render the latest sample, unless nothing new arrived since the last render. """
+        count = self.telemetry.count
+        if count == 0 or count == self.rendered_count:
+            return False
+        if not self.render(format_sample(self.telemetry.latest(1)[0], self.telemetry.stats())):
+            return False
+        self.rendered_count = count
+        self.renders += 1
+        return True
@@ -0,0 +1,278 @@
+#! /usr/bin/env python3
+import lzma
+import zlib
+import struct
+import logging
+import argparse
+import numpy as np
+from os import path
+from typing import BinaryIO, Iterator, List, Optional, Tuple
+
+from MotionPath import MotionPath, has_durations, has_timestamps
+from definitions import motor_names
+
+log = logging.getLogger('MotionArchive')
+
+archive_magic = b'XAMZ'
+archive_version = 1
+# magic, version, codec, flags, samples per chunk, sample count, comma-separated joint names
+header_format = '<4sBBBxIQ56s'
+header_size = struct.calcsize(header_format)
+# chunk magic, sample count, compressed length
+chunk_header_format = '<4sII'
+chunk_header_size = struct.calcsize(chunk_header_format)
+chunk_magic = b'ZCHK'
+# Written after the last chunk: offset of the chunk index, number of chunks, magic
+footer_format = '<QI4s'
+footer_size = struct.calcsize(footer_format)
+index_magic = b'ZIDX'
+
+codecs = ['zlib', 'lzma']
+joint_count = len(motor_names) - 1
+
+
+def quantize(joints: np.ndarray) -> np.ndarray:
+    """ Vectorized degrees_to_rotation: joint angles to servo counts 0-1000. """
+    return np.clip(np.round((np.asarray(joints, dtype=np.float64) + 120) * 1000 / 240), 0, 1000).astype(np.int16)
+
+
+def dequantize(counts: np.ndarray) -> np.ndarray:
+    """ Vectorized rotation_to_degrees: servo counts to joint angles. """
+    return (counts * (240 / 1000) - 120).astype(np.float32)
+
+
+def deltas(values: np.ndarray) -> np.ndarray:
+    """ Differences along the first axis, the first relative to zero: np.diff(prepend=0) before numpy 1.16. """
+    return np.concatenate((values[:1], np.diff(values, axis=0)))
+
+
+def compress(payload: bytes, codec: int) -> bytes:
+    return lzma.compress(payload) if codecs[codec] == 'lzma' else zlib.compress(payload, 9)
+
+
+def decompress(payload: bytes, codec: int) -> bytes:
+    return lzma.decompress(payload) if codecs[codec] == 'lzma' else zlib.decompress(payload)
+
+
+def encode_chunk(joints: np.ndarray, timestamps: Optional[np.ndarray], durations: Optional[np.ndarray],
+                 codec: int) -> bytes:
+    """
+        Quantize, delta-encode and compress one chunk. The first sample of every chunk is stored
+        relative to zero, so each chunk decodes on its own.
+    :param joints: Array of shape (N, 6) of joint angles in motor_names[1:] order.
+    :param timestamps: Sample times in seconds, stored as microsecond deltas.
+    :param durations: Move durations in milliseconds, stored as float32.
+    :param codec: Index into codecs.
+    :return: Chunk header and compressed payload.
+    """
+    # One column per joint, so each joint's small deltas are contiguous for the compressor.
+    parts = [deltas(quantize(joints)).T.astype('<i2').tobytes()]
+    if timestamps is not None:
+        microseconds = np.round(np.asarray(timestamps, dtype=np.float64) * 1e6).astype(np.int64)
+        parts.append(deltas(microseconds).astype('<i8').tobytes())
+    if durations is not None:
+        parts.append(np.asarray(durations, dtype='<f4').tobytes())
+    payload = compress(b''.join(parts), codec)
+    return struct.pack(chunk_header_format, chunk_magic, len(joints), len(payload)) + payload
+
+
+def decode_chunk(payload: bytes, count: int, flags: int, codec: int) -> MotionPath:
+    """ Inverse of encode_chunk, given the compressed payload and the chunk's sample count. """
+    data = decompress(payload, codec)
+    offset = count * joint_count * 2
+    deltas = np.frombuffer(data[:offset], dtype='<i2').reshape(joint_count, count)
+    joints = dequantize(np.cumsum(deltas, axis=1, dtype=np.int32).T)
+    timestamps = durations = None
+    if flags & has_timestamps:
+        microseconds = np.cumsum(np.frombuffer(data[offset:offset + count * 8], dtype='<i8'))
+        timestamps = microseconds / 1e6
+        offset += count * 8
+    if flags & has_durations:
+        durations = np.frombuffer(data[offset:offset + count * 4], dtype='<f4')
+    return MotionPath(joints, timestamps, durations)
+
+
+def write_archive(motion_path: MotionPath, f: BinaryIO, chunk_size: int = 1024, codec: str = 'zlib') -> None:
+    """
+        Write a motion path in the compressed format. Joint angles are rounded to servo counts.
+    :param motion_path: Motion path to write.
+    :param f: File opened for binary writing.
+    :param chunk_size: Samples per independently decodable chunk.
+    :param codec: 'zlib' or 'lzma'.
+    """
+    codec_index = codecs.index(codec)
+    flags = (has_timestamps if motion_path.timestamps is not None else 0) | \
+            (has_durations if motion_path.durations is not None else 0)
+    names = ','.join(motor_names[1:]).encode()
+    start = f.tell()
+    f.write(struct.pack(header_format, archive_magic, archive_version, codec_index, flags, chunk_size,
+                        len(motion_path), names))
+
+    offsets = []
+    for first in range(0, len(motion_path), chunk_size):
+        offsets.append(f.tell() - start)
+        window = slice(first, first + chunk_size)
+        f.write(encode_chunk(motion_path.joints[window],
+                             None if motion_path.timestamps is None else motion_path.timestamps[window],
+                             None if motion_path.durations is None else motion_path.durations[window],
+                             codec_index))
+
+    index_offset = f.tell() - start
+    f.write(np.asarray(offsets, dtype='<u8').tobytes())
+    f.write(struct.pack(footer_format, index_offset, len(offsets), index_magic))
+
+
+def save_archive(motion_path: MotionPath, filename: str, chunk_size: int = 1024, codec: str = 'zlib') -> None:
+    with open(filename, 'wb') as f:
+        write_archive(motion_path, f, chunk_size, codec)
+
+
+def is_archive(f: BinaryIO) -> bool:
+    """ Check the magic number of an open file without moving its position. """
+    position = f.tell()
+    magic = f.read(len(archive_magic))
+    f.seek(position)
+    return magic == archive_magic
+
+
+def read_header(header: bytes) -> Tuple[int, int, int, int]:
+    """
+        Parse and validate a header.
+    :return: Tuple (codec, flags, samples per chunk, sample count).
+    """
+    magic, version, codec, flags, chunk_size, count, names = struct.unpack(header_format, header[:header_size])
+    if magic != archive_magic or version != archive_version:
+        raise ValueError(f'Not a motion archive (version {archive_version}): {magic!r} v{version}')
+    if names.rstrip(b'\0').decode().split(',') != motor_names[1:]:
+        raise ValueError(f'Motion archive joint order {names!r} does not match {motor_names[1:]}.')
+    if codec >= len(codecs):
+        raise ValueError(f'Unknown motion archive codec {codec}.')
+    return codec, flags, chunk_size, count
+
+
+def iter_archive(f: BinaryIO) -> Iterator[MotionPath]:
+    """
+        Decode an archive chunk by chunk from a stream. Only one chunk is held in memory at a time
+        and the chunk index at the end is not needed, so this also works on pipes.
+    :param f: File opened for binary reading, positioned at the start of the archive.
+    :return: Iterator of MotionPaths, one per chunk.
+    """
+    codec, flags, _chunk_size, count = read_header(f.read(header_size))
+    decoded = 0
+    while decoded < count:
+        header = f.read(chunk_header_size)
+        if len(header) < chunk_header_size:
+            raise ValueError(f'Motion archive ends after {decoded} of {count} samples.')
+        magic, samples, length = struct.unpack(chunk_header_format, header)
+        if magic != chunk_magic:
+            raise ValueError(f'Corrupt motion archive chunk after {decoded} samples.')
+        yield decode_chunk(f.read(length), samples, flags, codec)
+        decoded += samples
+
+
+def read_archive(f: BinaryIO) -> MotionPath:
+    """ Decode a whole archive from a stream into memory. """
+    chunks = list(iter_archive(f))
+    if not chunks:
+        return MotionPath(np.zeros((0, joint_count), dtype=np.float32))
+    timestamps = None if chunks[0].timestamps is None else np.concatenate([chunk.timestamps for chunk in chunks])
+    durations = None if chunks[0].durations is None else np.concatenate([chunk.durations for chunk in chunks])
+    return MotionPath(np.concatenate([chunk.joints for chunk in chunks]), timestamps, durations)
+
+
+def load_recording(filename: str, mmap: bool = True) -> MotionPath:
+    """ Load a motion path in any format: compressed archive, binary or legacy pickle. """
+    with open(filename, 'rb') as f:
+        if is_archive(f):
+            return read_archive(f)
+    return MotionPath.load_any(filename, mmap)
+
+
+class MotionArchive:
+    """ Random access to the chunks of a compressed motion path file. """
+
+    def __init__(self, filename: str) -> None:
+        self.file: BinaryIO = open(filename, 'rb')
+        try:
+            self.codec, self.flags, self.chunk_size, self.count = read_header(self.file.read(header_size))
+
+            self.file.seek(-footer_size, 2)
+            index_offset, chunks, magic = struct.unpack(footer_format, self.file.read(footer_size))
+            if magic != index_magic:
+                raise ValueError(f'{filename} has no chunk index. Decode it as a stream with iter_archive.')
+            self.file.seek(index_offset)
+            self.offsets: np.ndarray = np.frombuffer(self.file.read(chunks * 8), dtype='<u8')
+        except BaseException:
+            self.file.close()
+            raise
+
+    def __enter__(self) -> 'MotionArchive':
+        return self
+
+    def __exit__(self, *_args: object) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.count
+
+    @property
+    def chunks(self) -> int:
+        return len(self.offsets)
+
+    def read_chunk(self, index: int) -> MotionPath:
+        """ Decode one chunk without touching the others. """
+        self.file.seek(int(self.offsets[index]))
+        magic, samples, length = struct.unpack(chunk_header_format, self.file.read(chunk_header_size))
+        if magic != chunk_magic:
+            raise ValueError(f'Corrupt motion archive chunk {index}.')
+        return decode_chunk(self.file.read(length), samples, self.flags, self.codec)
+
+    def iter_chunks(self, start: int = 0) -> Iterator[MotionPath]:
+        """
+            Decode chunks lazily from the one holding sample start.
+        :param start: Index of the first sample wanted. The first chunk is trimmed to begin there.
+        :return: Iterator of MotionPaths.
+        """
+        first = start // self.chunk_size
+        for index in range(first, self.chunks):
+            chunk = self.read_chunk(index)
+            if index == first and start % self.chunk_size:
+                skip = slice(start % self.chunk_size, None)
+                chunk = MotionPath(chunk.joints[skip],
+                                   None if chunk.timestamps is None else chunk.timestamps[skip],
+                                   None if chunk.durations is None else chunk.durations[skip])
+            yield chunk
+
+    def to_motion_path(self) -> MotionPath:
+        self.file.seek(0)
+        return read_archive(self.file)
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def main() -> None:  # pragma: no cover
+    logging.basicConfig(level=logging.INFO,
+                        format=f'[%(levelname)s] {path.basename(__file__)} %(funcName)s: \n%(message)s')
+
+    parser = argparse.ArgumentParser(description='Compress motion paths, or extract compressed ones.')
+    parser.add_argument('source', type=str, help='Motion path to compress, or archive to extract.')
+    parser.add_argument('destination', type=str, help='Filename to write.')
+    parser.add_argument('-x', '--extract', action='store_true', help='Extract an archive into a motion path.')
+    parser.add_argument('--codec', type=str, choices=codecs, default='zlib', help='Compression codec.')
+    parser.add_argument('--chunk', type=int, default=1024, help='Samples per independently decodable chunk.')
+    arguments = parser.parse_args()
+
+    if arguments.extract:
+        with open(arguments.source, 'rb') as f:
+            motion_path = read_archive(f)
+        motion_path.save(arguments.destination)
+    else:
+        motion_path = load_recording(arguments.source, mmap=False)
+        save_archive(motion_path, arguments.destination, arguments.chunk, arguments.codec)
+    sizes: List[int] = [path.getsize(arguments.source), path.getsize(arguments.destination)]
+    log.info(f'Wrote {len(motion_path)} samples to {arguments.destination} ({sizes[0]} -> {sizes[1]} bytes).')
+
+
+if __name__ == '__main__':
+    main()
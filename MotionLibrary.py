@@ -0,0 +1,182 @@
+import os
+import json
+import hashlib
+import logging
+import numpy as np
+from os import path
+from fnmatch import fnmatch
+from typing import Any, Dict, List, Optional, Sequence
+
+from MotionPath import MotionPath
+from MotionArchive import load_recording
+from CollisionChecker import CollisionChecker
+from RobotState import joints_safe
+from definitions import motor_names
+from robot_kinematics import forward_kinematics
+
+log = logging.getLogger('MotionLibrary')
+
+index_name = '.index.json'
+index_version = 1
+# Files in a motion path directory which are not recordings.
+ignored_suffixes = ('.log', '.json', '.tmp')
+
+
+def file_hash(filename: str, block_size: int = 1 << 20) -> str:
+    """ SHA-256 of a file, read in blocks. """
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def describe(motion_path: MotionPath, collision_checker: Optional[CollisionChecker] = None) -> Dict[str, Any]:
+    """
+        Summarize a motion path for the catalogue.
+    :param motion_path: Motion path to describe.
+    :param collision_checker: Checker for collisions. (Defaults to the joint limits alone.)
+    :return: Dict of poses, duration, joint bounds, Cartesian bounding box and safety status.
+    """
+    joints = np.asarray(motion_path.joints, dtype=np.float64)
+    entry: Dict[str, Any] = {
+        'poses': len(joints),
+        'timed': motion_path.durations is not None,
+        'duration_s': None if motion_path.durations is None else float(np.sum(motion_path.durations)) / 1000,
+        'joint_min': None, 'joint_max': None, 'box_min': None, 'box_max': None,
+        'safe': True, 'first_unsafe': None,
+    }
+    if not len(joints):
+        return entry
+
+    points = forward_kinematics(joints).reshape(-1, 3)
+    unsafe = np.flatnonzero(~joints_safe(joints))
+    collision = None if collision_checker is None else collision_checker.first_collision(joints)
+    candidates = ([int(unsafe[0])] if len(unsafe) else []) + ([collision] if collision is not None else [])
+    first_unsafe = min(candidates) if candidates else None
+    entry.update({
+        'joint_min': dict(zip(motor_names[1:], joints.min(axis=0).tolist())),
+        'joint_max': dict(zip(motor_names[1:], joints.max(axis=0).tolist())),
+        'box_min': points.min(axis=0).tolist(),
+        'box_max': points.max(axis=0).tolist(),
+        'safe': first_unsafe is None,
+        'first_unsafe': first_unsafe,
+    })
+    return entry
+
+
+class MotionLibrary:
+    """ Persistent catalogue of the motion paths in a directory, queried without opening the recordings. """
+
+    def __init__(self, directory: str, collision_checker: Optional[CollisionChecker] = None) -> None:
+        self.directory: str = directory
+        self.index_file: str = path.join(directory, index_name)
+        self.collision_checker: Optional[CollisionChecker] = collision_checker
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        # Size and modification time of the files which could not be read, so they are not retried until they change.
+        self.failures: Dict[str, Dict[str, Any]] = {}
+        self.load()
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def load(self) -> None:
+        try:
+            with open(self.index_file) as f:
+                index = json.load(f)
+            if index.get('version') == index_version:
+                self.entries = index['entries']
+                self.failures = index.get('failures', {})
+        except (OSError, ValueError):
+            self.entries, self.failures = {}, {}
+
+    def save(self) -> None:
+        """ Write the index atomically, so a crash never leaves a truncated catalogue. """
+        temporary = self.index_file + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'version': index_version, 'entries': self.entries, 'failures': self.failures},
+                      f, indent=1, sort_keys=True)
+        os.replace(temporary, self.index_file)
+
+    def update(self, name: str, save: bool = True) -> Dict[str, Any]:
+        """
+            Analyze one recording and store its entry.
+        :param name: Filename of the recording within the directory.
+        :param save: Write the index afterwards.
+        :return: The new entry.
+        """
+        filename = path.join(self.directory, name)
+        stat = os.stat(filename)
+        entry = describe(load_recording(filename), self.collision_checker)
+        entry.update({'name': name, 'size': stat.st_size, 'mtime': stat.st_mtime, 'hash': file_hash(filename)})
+        self.entries[name] = entry
+        self.failures.pop(name, None)
+        if save:
+            self.save()
+        return entry
+
+    def refresh(self) -> List[str]:
+        """
+            Bring the index up to date with the directory. Only new or modified files are opened, and files
+            which failed to load are only retried once they change.
+        :return: Names of the recordings which were (re)analyzed.
+        """
+        names = [name for name in os.listdir(self.directory)
+                 if not name.startswith('.') and not name.endswith(ignored_suffixes)
+                 and path.isfile(path.join(self.directory, name))]
+        updated: List[str] = []
+        failed: List[str] = []
+        for name in names:
+            stat = os.stat(path.join(self.directory, name))
+            entry = self.entries.get(name, self.failures.get(name))
+            if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+                continue
+            try:
+                self.update(name, save=False)
+                updated.append(name)
+            except Exception as error:
+                # One unreadable file must not keep the rest of the directory out of the index.
+                log.warning(f'Skipping {name}: {error!r}')
+                self.entries.pop(name, None)
+                self.failures[name] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'error': repr(error)}
+                failed.append(name)
+
+        removed = (set(self.entries) | set(self.failures)) - set(names)
+        for name in removed:
+            self.entries.pop(name, None)
+            self.failures.pop(name, None)
+        if updated or failed or removed:
+            self.save()
+        return updated
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [self.entries[name] for name in sorted(self.entries)]
+
+    def search(self, pattern: str = '*', min_poses: int = 0, max_duration_s: Optional[float] = None,
+               safe: Optional[bool] = None, within: Optional[Sequence[Sequence[float]]] = None) -> List[Dict[str, Any]]:
+        """
+            Query the catalogue.
+        :param pattern: Shell-style pattern on the name.
+        :param min_poses: Minimum number of poses.
+        :param max_duration_s: Maximum duration of timed recordings.
+        :param safe: Only recordings which passed (True) or failed (False) the safety check.
+        :param within: ((x, y, z) lower corner, (x, y, z) upper corner) the Cartesian bounding box must fit inside.
+        :return: Matching entries sorted by name.
+        """
+        results = []
+        for entry in self.list():
+            if not fnmatch(entry['name'], pattern) or entry['poses'] < min_poses:
+                continue
+            if max_duration_s is not None and (entry['duration_s'] is None or entry['duration_s'] > max_duration_s):
+                continue
+            if safe is not None and entry['safe'] != safe:
+                continue
+            if within is not None and entry['box_min'] is not None and \
+                    not (np.all(np.asarray(within[0]) <= entry['box_min']) and
+                         np.all(np.asarray(entry['box_max']) <= within[1])):
+                continue
+            results.append(entry)
+        return results
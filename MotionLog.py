@@ -0,0 +1,198 @@
+import os
+import zlib
+import struct
+import logging
+import numpy as np
+from time import monotonic
+from typing import BinaryIO, Callable, Iterator, Sequence, Union
+
+from MotionPath import MotionPath, has_durations, has_timestamps
+from definitions import motor_names
+
+log = logging.getLogger('MotionLog')
+
+log_magic = b'XAML'
+log_version = 1
+# magic, version, comma-separated joint names
+file_header_format = '<4sB3x56s'
+file_header_size = struct.calcsize(file_header_format)
+# chunk magic, sample count, CRC-32 of the samples
+chunk_header_format = '<4sII'
+chunk_header_size = struct.calcsize(chunk_header_format)
+chunk_magic = b'CHNK'
+
+sample_dtype = np.dtype([('timestamp', '<f8'), ('duration', '<f4'), ('joints', '<f4', (len(motor_names) - 1,))])
+
+
+def recover(f: BinaryIO) -> int:
+    """
+        Find the end of the last complete chunk of a log. A partial or corrupt final chunk is ignored.
+    :param f: Log file opened for binary reading, positioned anywhere.
+    :return: Length in bytes of the valid prefix of the log.
+    """
+    f.seek(0)
+    header = f.read(file_header_size)
+    if len(header) < file_header_size:
+        return 0
+    magic, version, names = struct.unpack(file_header_format, header)
+    if magic != log_magic or version != log_version:
+        raise ValueError(f'Not a motion log (version {log_version}): {magic!r} v{version}')
+    if names.rstrip(b'\0').decode().split(',') != motor_names[1:]:
+        raise ValueError(f'Motion log joint order {names!r} does not match {motor_names[1:]}.')
+
+    valid = file_header_size
+    for _samples in iter_chunks(f):
+        valid = f.tell()
+    return valid
+
+
+def iter_chunks(f: BinaryIO) -> Iterator[np.ndarray]:
+    """
+        Yield the complete chunks of a log one at a time, stopping at the first partial or corrupt chunk.
+    :param f: Log file opened for binary reading, positioned after the file header.
+    :return: Iterator of structured arrays of sample_dtype.
+    """
+    while True:
+        header = f.read(chunk_header_size)
+        if len(header) < chunk_header_size:
+            return
+        magic, count, checksum = struct.unpack(chunk_header_format, header)
+        payload = f.read(count * sample_dtype.itemsize)
+        if magic != chunk_magic or len(payload) < count * sample_dtype.itemsize or zlib.crc32(payload) != checksum:
+            log.warning(f'Ignoring partial chunk at the end of the motion log ({len(payload)} bytes).')
+            return
+        yield np.frombuffer(payload, dtype=sample_dtype)
+
+
+class MotionLog:
+    """ Append-only on-disk log of recorded samples, written in checksummed chunks. """
+
+    def __init__(self, filename: str, chunk_size: int = 64, flush_interval_s: float = 1.0,
+                 fsync: bool = True, clock: Callable[[], float] = monotonic) -> None:
+        """
+            Open a log for appending. An existing log is recovered: a partial final chunk is truncated.
+        :param filename: Path of the log.
+        :param chunk_size: Samples held in memory before they are written.
+        :param flush_interval_s: Age after which pending samples are written by append or flush_if_due.
+        :param fsync: Force each chunk onto the disk rather than the OS cache.
+        :param clock: Monotonic clock in seconds.
+        """
+        self.filename: str = filename
+        self.flush_interval: float = flush_interval_s
+        self.fsync: bool = fsync
+        self.clock: Callable[[], float] = clock
+
+        # Preallocated once so memory use does not grow with the length of the session.
+        self.pending: np.ndarray = np.zeros(chunk_size, dtype=sample_dtype)
+        self.pending_count: int = 0
+        self.last_flush: float = clock()
+        self.samples: int = 0
+
+        self.file: BinaryIO = open(filename, 'a+b')
+        valid = recover(self.file)
+        if valid == 0:
+            self.file.truncate(0)
+            self.file.write(struct.pack(file_header_format, log_magic, log_version, ','.join(motor_names[1:]).encode()))
+        else:
+            self.file.truncate(valid)
+            self.file.seek(file_header_size)
+            self.samples = sum(len(chunk) for chunk in iter_chunks(self.file))
+            log.info(f'Recovered {self.samples} samples from {filename}.')
+        self.file.seek(0, os.SEEK_END)
+
+    def __enter__(self) -> 'MotionLog':
+        return self
+
+    def __exit__(self, *_args: object) -> None:
+        self.close()
+
+    def append(self, joints: Union[Sequence[float], np.ndarray], timestamp: float,
+               duration_ms: float = float('nan')) -> None:
+        """
+            Append a sample. It reaches the disk once chunk_size samples are pending, or flush_interval_s
+            after the last flush at the next append or flush_if_due. There is no timer thread: an owner
+            which may stop appending for a while calls flush_if_due from its loop.
+        :param joints: Joint angles in motor_names[1:] order.
+        :param timestamp: Time of the sample in seconds.
+        :param duration_ms: Duration of the move to this sample in milliseconds, if known.
+        """
+        sample = self.pending[self.pending_count]
+        sample['timestamp'] = timestamp
+        sample['duration'] = duration_ms
+        sample['joints'] = joints
+        self.pending_count += 1
+        self.samples += 1
+        if self.pending_count == len(self.pending):
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self) -> None:
+        """ Write the pending samples if flush_interval_s has passed since the last flush. """
+        if self.pending_count and self.clock() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        """ Write the pending samples as one chunk. """
+        self.last_flush = self.clock()
+        if not self.pending_count:
+            return
+        payload = self.pending[:self.pending_count].tobytes()
+        self.file.write(struct.pack(chunk_header_format, chunk_magic, self.pending_count, zlib.crc32(payload)))
+        self.file.write(payload)
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        self.pending_count = 0
+
+    def close(self) -> None:
+        if not self.file.closed:
+            self.flush()
+            self.file.close()
+
+
+def read_log(filename: str) -> MotionPath:
+    """
+        Read every complete chunk of a log into a MotionPath. Durations are omitted if none were recorded.
+    :param filename: Path of the log.
+    :return: MotionPath with timestamps.
+    """
+    with open(filename, 'rb') as f:
+        recover(f)
+        f.seek(file_header_size)
+        chunks = list(iter_chunks(f))
+    samples = np.concatenate(chunks) if chunks else np.zeros(0, dtype=sample_dtype)
+    durations = samples['duration']
+    return MotionPath(samples['joints'], samples['timestamp'], None if np.all(np.isnan(durations)) else durations)
+
+
+def convert_log(filename: str, destination: str) -> int:
+    """
+        Write every complete chunk of a log into a motion path file. Only one chunk is held in memory
+        at a time: the log is read once per column of the motion path format.
+    :param filename: Path of the log.
+    :param destination: Path of the motion path file to write. Durations are omitted if none were recorded.
+    :return: Number of samples written.
+    """
+    def chunks() -> Iterator[np.ndarray]:
+        with open(filename, 'rb') as f:
+            recover(f)
+            f.seek(file_header_size)
+            yield from iter_chunks(f)
+
+    count, timed = 0, False
+    for samples in chunks():
+        count += len(samples)
+        timed = timed or not np.all(np.isnan(samples['duration']))
+
+    with open(destination, 'wb') as f:
+        MotionPath.write_header(f, sample_dtype['joints'].base.itemsize,
+                                has_timestamps | (has_durations if timed else 0), count)
+        for samples in chunks():
+            f.write(np.ascontiguousarray(samples['joints']).tobytes())
+        for samples in chunks():
+            f.write(np.ascontiguousarray(samples['timestamp']).tobytes())
+        if timed:
+            for samples in chunks():
+                f.write(np.ascontiguousarray(samples['duration']).tobytes())
+    return count
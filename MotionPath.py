@@ -0,0 +1,196 @@
+#! /usr/bin/env python3
+import pickle
+import struct
+import logging
+import argparse
+import numpy as np
+from os import path
+from typing import Any, BinaryIO, List, Optional, Sequence, Tuple
+
+from RobotState import RobotState
+from definitions import motor_names
+
+log = logging.getLogger('MotionPath')
+
+path_magic = b'XAMP'
+path_version = 1
+# magic, version, bytes per joint value, flags, sample count, comma-separated joint names
+header_format = '<4sBBBxQ80s'
+header_size = struct.calcsize(header_format)
+has_timestamps, has_durations = 0x01, 0x02
+
+
+class RobotStateUnpickler(pickle.Unpickler):
+    """ Unpickler for legacy motion paths which refuses anything but RobotState objects. """
+
+    def find_class(self, module: str, name: str) -> Any:
+        if name == 'RobotState':
+            return RobotState
+        raise pickle.UnpicklingError(f'Refusing to load {module}.{name} from a motion path.')
+
+
+class MotionPath:
+    """
+        Columnar motion path: an (N, 6) matrix of joint angles in motor_names[1:] order,
+        with optional per-sample timestamps (seconds) and move durations (milliseconds).
+    """
+
+    def __init__(self, joints: np.ndarray,
+                 timestamps: Optional[np.ndarray] = None,
+                 durations: Optional[np.ndarray] = None) -> None:
+        self.joints: np.ndarray = np.asarray(joints).reshape(-1, len(motor_names) - 1)
+        self.timestamps: Optional[np.ndarray] = timestamps
+        self.durations: Optional[np.ndarray] = durations
+
+    def __len__(self) -> int:
+        return len(self.joints)
+
+    def __getitem__(self, index: int) -> RobotState:
+        return RobotState(dict(zip(motor_names[1:], (float(angle) for angle in self.joints[index]))))
+
+    def __repr__(self) -> str:
+        return (f'MotionPath({len(self)} samples, dtype={self.joints.dtype}, '
+                f'timestamps={self.timestamps is not None}, durations={self.durations is not None})')
+
+    @classmethod
+    def from_states(cls, states: Sequence[RobotState],
+                    timestamps: Optional[Sequence[float]] = None,
+                    durations: Optional[Sequence[float]] = None) -> 'MotionPath':
+        """ Build a motion path from a sequence of RobotStates. """
+        joints = np.array([[state[motor] for motor in motor_names[1:]] for state in states], dtype=np.float64)
+        return cls(joints,
+                   None if timestamps is None else np.asarray(timestamps, dtype=np.float64),
+                   None if durations is None else np.asarray(durations, dtype=np.float32))
+
+    def to_states(self) -> List[RobotState]:
+        return [self[index] for index in range(len(self))]
+
+    def write(self, f: BinaryIO, dtype: Any = np.float32) -> None:
+        """
+            Write the motion path to a binary file object.
+        :param f: File opened for binary writing.
+        :param dtype: np.float32 or np.float64 for the joint matrix.
+        """
+        joints = np.ascontiguousarray(self.joints, dtype=dtype)
+        flags = (has_timestamps if self.timestamps is not None else 0) | \
+                (has_durations if self.durations is not None else 0)
+        self.write_header(f, joints.itemsize, flags, len(joints))
+        f.write(joints.tobytes())
+        if self.timestamps is not None:
+            f.write(np.ascontiguousarray(self.timestamps, dtype='<f8').tobytes())
+        if self.durations is not None:
+            f.write(np.ascontiguousarray(self.durations, dtype='<f4').tobytes())
+
+    @staticmethod
+    def write_header(f: BinaryIO, itemsize: int, flags: int, count: int) -> None:
+        """ Write a header. The joint matrix, then the timestamps and durations flagged, must follow it. """
+        names = ','.join(motor_names[1:]).encode()
+        f.write(struct.pack(header_format, path_magic, path_version, itemsize, flags, count, names))
+
+    def save(self, filename: str, dtype: Any = np.float32) -> None:
+        with open(filename, 'wb') as f:
+            self.write(f, dtype)
+
+    @staticmethod
+    def read_header(header: bytes) -> Tuple[np.dtype, int, int]:
+        """
+            Parse and validate a header.
+        :return: Tuple (joint dtype, flags, sample count).
+        """
+        magic, version, itemsize, flags, count, names = struct.unpack(header_format, header[:header_size])
+        if magic != path_magic or version != path_version:
+            raise ValueError(f'Not a motion path (version {path_version}): {magic!r} v{version}')
+        if names.rstrip(b'\0').decode().split(',') != motor_names[1:]:
+            raise ValueError(f'Motion path joint order {names!r} does not match {motor_names[1:]}.')
+        return np.dtype(f'<f{itemsize}'), flags, count
+
+    @classmethod
+    def read(cls, f: BinaryIO) -> 'MotionPath':
+        """ Read a motion path from a binary file object into memory. """
+        dtype, flags, count = cls.read_header(f.read(header_size))
+        joints = np.frombuffer(f.read(count * 6 * dtype.itemsize), dtype=dtype).reshape(count, 6)
+        timestamps = np.frombuffer(f.read(count * 8), dtype='<f8') if flags & has_timestamps else None
+        durations = np.frombuffer(f.read(count * 4), dtype='<f4') if flags & has_durations else None
+        return cls(joints, timestamps, durations)
+
+    @classmethod
+    def load(cls, filename: str, mmap: bool = True) -> 'MotionPath':
+        """
+            Load a motion path file.
+        :param filename: Path of the file.
+        :param mmap: Map the columns read-only instead of reading them into memory.
+        :return: MotionPath whose columns are views of the file.
+        """
+        if not mmap:
+            with open(filename, 'rb') as f:
+                return cls.read(f)
+
+        with open(filename, 'rb') as f:
+            dtype, flags, count = cls.read_header(f.read(header_size))
+
+        buffer = np.memmap(filename, dtype=np.uint8, mode='r')
+        offset = header_size
+        joints = buffer[offset:offset + count * 6 * dtype.itemsize].view(dtype).reshape(count, 6)
+        offset += count * 6 * dtype.itemsize
+        timestamps = durations = None
+        if flags & has_timestamps:
+            timestamps = buffer[offset:offset + count * 8].view('<f8')
+            offset += count * 8
+        if flags & has_durations:
+            durations = buffer[offset:offset + count * 4].view('<f4')
+        return cls(joints, timestamps, durations)
+
+    @staticmethod
+    def is_motion_path(f: BinaryIO) -> bool:
+        """ Check the magic number of an open file without moving its position. """
+        position = f.tell()
+        magic = f.read(len(path_magic))
+        f.seek(position)
+        return magic == path_magic
+
+    @classmethod
+    def load_any(cls, filename: str, mmap: bool = True) -> 'MotionPath':
+        """ Load a motion path file, falling back to the legacy pickle format. """
+        with open(filename, 'rb') as f:
+            if not cls.is_motion_path(f):
+                log.warning(f'{filename} is a legacy pickled motion path. Convert it with MotionPath.py.')
+                return cls.read_pickle(f)
+        return cls.load(filename, mmap)
+
+    @classmethod
+    def read_pickle(cls, f: BinaryIO) -> 'MotionPath':
+        """ Read a legacy pickled list of RobotStates. Only RobotState objects are unpickled. """
+        return cls.from_states(RobotStateUnpickler(f).load())
+
+
+def convert_pickle(source: str, destination: str, dtype: Any = np.float32) -> MotionPath:
+    """
+        Convert a legacy pickled motion path into the binary format.
+    :param source: Path of the pickled list of RobotStates.
+    :param destination: Path of the binary motion path to write.
+    :param dtype: np.float32 or np.float64 for the joint matrix.
+    :return: The converted MotionPath.
+    """
+    with open(source, 'rb') as f:
+        motion_path = MotionPath.read_pickle(f)
+    motion_path.save(destination, dtype)
+    return motion_path
+
+
+def main() -> None:  # pragma: no cover
+    logging.basicConfig(level=logging.INFO,
+                        format=f'[%(levelname)s] {path.basename(__file__)} %(funcName)s: \n%(message)s')
+
+    parser = argparse.ArgumentParser(description='Convert pickled motion paths into the binary format.')
+    parser.add_argument('source', type=str, help='Pickled motion path.')
+    parser.add_argument('destination', type=str, help='Filename of the binary motion path.')
+    parser.add_argument('-d', '--double', action='store_true', help='Store joint angles as float64.')
+    arguments = parser.parse_args()
+
+    motion_path = convert_pickle(arguments.source, arguments.destination,
+                                 np.float64 if arguments.double else np.float32)
+    log.info(f'Converted {motion_path} to {arguments.destination}.')
+
+
+if __name__ == '__main__':
+    main()
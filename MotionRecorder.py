@@ -1,18 +1,26 @@
 #! /usr/bin/env python3
-import pickle
 import logging
 import argparse
-from typing import List
-from copy import deepcopy
-from time import sleep, time
-from os import listdir, path
+import numpy as np
+from typing import Dict, Generator, Iterator, List, Optional, Tuple
+from time import monotonic, sleep, time
+from os import path, remove
 
 import packetmaker as pk
 from RobotArm import RobotArm
 from RobotState import RobotState
+from definitions import motor_names
+from MotionPath import MotionPath
+from MotionLog import MotionLog, convert_log
+from MotionArchive import MotionArchive, is_archive, load_recording
+from MotionLibrary import MotionLibrary
+from ChangeDetector import ChangeDetector
+from PlaybackScheduler import PlaybackScheduler
+from trajectory import resample_path, servo_resolution_deg, simplify_path, speed_limits
 
 threshold_save_s = 5
 motionpath_dir = 'motionpaths'
+log_suffix = '.log'
 
 
 class MotionRecorder:
@@ -26,56 +34,214 @@ class MotionRecorder:
         sleep(0.1)
         self.xArm.receive_serial()
 
+    def poll_state(self, timeout_s: float = 0.1, poll_s: float = 0.0005) -> bool:
+        """
+            Request positions and wait only as long as the reply takes.
+        :param timeout_s: Maximum time to wait for the reply.
+        :param poll_s: Interval between reads of the serial port.
+        :return: Whether the state was updated.
+        """
+        updates = self.xArm.position_updates
+        deadline = monotonic() + timeout_s
+        self.xArm.request_positions()
+        while self.xArm.position_updates == updates:
+            if monotonic() >= deadline:
+                return False
+            sleep(poll_s)
+            self.xArm.receive_serial()
+        return True
+
+    def load_motion_path(self, filename: str, mmap: bool = False) -> MotionPath:
+        return load_recording(path.join(motionpath_dir, filename), mmap)
+
     def load_pose_queue(self, filename: str) -> None:
-        with open(path.join(motionpath_dir, filename), 'rb') as f:
-            self.pose_queue = pickle.load(f)
-    
+        self.pose_queue = self.load_motion_path(filename).to_states()
+
     def save_pose_queue(self, filename: str) -> None:
         with open(path.join(motionpath_dir, filename), 'wb') as f:
-            pickle.dump(self.pose_queue, f)
-
-    def playback_from_file(self, filename: str, time_ms: float = 1000.0) -> None:  # pragma: no cover
-        self.load_pose_queue(filename)
-        while True:
-            try:
-                for state in self.pose_queue:
-                    self.xArm.send(pk.write_servo_move(vars(state), time_ms=int(time_ms)))
-                    sleep(time_ms / 1000)
-            except KeyboardInterrupt:
-                break
+            MotionPath.from_states(self.pose_queue).write(f)
+
+    def playback_from_file(self, filename: str, time_ms: float = 1000.0, spin_s: float = 0.0,
+                           tolerance: Optional[float] = None, speed: float = 1.0,
+                           rate_hz: Optional[float] = None) -> None:  # pragma: no cover
+        if tolerance is None and rate_hz is None:
+            # The recording is mapped or decompressed chunk by chunk, never read whole:
+            # frames are decoded and encoded just ahead of their deadlines.
+            def recording() -> Iterator[Tuple[np.ndarray, float]]:
+                return iter_recording(path.join(motionpath_dir, filename))
+        else:
+            motion_path = self.load_motion_path(filename, mmap=True)
+            if tolerance is not None:
+                motion_path = simplify_path(motion_path, tolerance)
+            if rate_hz is not None:
+                # Resampling applies the speed factor itself, within the joint speed limits.
+                motion_path = resample_path(motion_path, rate_hz, speed, time_ms)
+                speed = 1.0
+
+            def recording() -> Iterator[Tuple[np.ndarray, float]]:
+                return iter_samples(motion_path)
+
+        scheduler = PlaybackScheduler(spin_s)
+        scheduler.start()
+        loop_start = 0.0
+        try:
+            while True:
+                samples = scale_speed(recording(), speed)
+                loop_end = scheduler.stream(iter_schedule(samples, time_ms, loop_start), self.xArm.send)
+                if loop_end == loop_start:
+                    self.log.error(f'{filename} holds no poses.')
+                    return
+                loop_start = loop_end
+        except KeyboardInterrupt:
+            pass
         self.xArm.unlock_servos()
-        self.log.info("Done.")
- 
+        self.log.info(f'Done. Frame lateness (ms): {scheduler.stats()}')
+
     def run_recorder(self, filename: str) -> None:  # pragma: no cover
         for i in range(3):
             self.xArm.unlock_servos()
             sleep(0.1)
 
-        time_last_state_change = time()
-        last_state = deepcopy(self.xArm.State)
-
-        while True:
-            try:
-                self.try_update_state()
-                curr_time = time()
-
-                if self.xArm.State == last_state:
-                    last_state = deepcopy(self.xArm.State)
-                    time_last_state_change = curr_time
-                    self.log.debug("State Changed.")
-
-                if curr_time - time_last_state_change > threshold_save_s:
-                    self.pose_queue.append(last_state)
-                    time_last_state_change = curr_time
-                    last_state = deepcopy(self.xArm.State)
-                    self.xArm.send_beep()
-                    self.log.info("State Saved.")
-            except KeyboardInterrupt:
-                break
-
-        self.save_pose_queue(filename)
+        # Saved states stream to an append-only log, so a crash loses at most the last unflushed chunk.
+        # Recording again under the same name resumes a log left behind by a crash.
+        log_filename = path.join(motionpath_dir, filename + log_suffix)
+        detector = ChangeDetector(dwell_s=threshold_save_s)
+        with MotionLog(log_filename) as motion_log:
+            while True:
+                try:
+                    self.try_update_state()
+                    curr_time = time()
+                    if detector.update(self.xArm.State, curr_time):
+                        motion_log.append(detector.keyframe, curr_time)
+                        self.xArm.send_beep()
+                        self.log.info("State Saved.")
+                    motion_log.flush_if_due()
+                except KeyboardInterrupt:
+                    break
+
+        self.finalize_log(filename)
         self.xArm.unlock_servos()
-        self.log.info(f'Saved your sweet motion path to {path.join(motionpath_dir + filename)}')
+        self.log.info(f'Saved your sweet motion path to {path.join(motionpath_dir, filename)}')
+
+    def run_continuous_recorder(self, filename: str) -> None:  # pragma: no cover
+        for i in range(3):
+            self.xArm.unlock_servos()
+            sleep(0.1)
+
+        log_filename = path.join(motionpath_dir, filename + log_suffix)
+        with MotionLog(log_filename) as motion_log:
+            last_update = None
+            while True:
+                try:
+                    if not self.poll_state():
+                        motion_log.flush_if_due()
+                        continue
+                    # The duration of each sample is the time since the previous one, so playback keeps the timing.
+                    duration_ms = 0.0 if last_update is None else 1000 * (self.xArm.last_update - last_update)
+                    last_update = self.xArm.last_update
+                    motion_log.append([self.xArm.State[joint] for joint in motor_names[1:]], last_update, duration_ms)
+                except KeyboardInterrupt:
+                    break
+
+        motion_path = self.finalize_log(filename)
+        self.xArm.unlock_servos()
+        self.log.info(f'Saved {len(motion_path)} samples to {path.join(motionpath_dir, filename)}')
+
+    def finalize_log(self, filename: str) -> MotionPath:
+        """ Stream the recording log of filename into a motion path file, remove the log and map the result. """
+        log_filename = path.join(motionpath_dir, filename + log_suffix)
+        convert_log(log_filename, path.join(motionpath_dir, filename))
+        remove(log_filename)
+        MotionLibrary(motionpath_dir).update(filename)
+        return MotionPath.load(path.join(motionpath_dir, filename))
+
+
+def iter_samples(motion_path: MotionPath, chunk_size: int = 1024) -> Iterator[Tuple[np.ndarray, float]]:
+    """
+        Decode a motion path lazily, one chunk of its (possibly mapped) columns at a time.
+    :param motion_path: Motion path to decode.
+    :param chunk_size: Samples decoded at once.
+    :return: Iterator of (joint angles, duration in ms or NaN for keyframes).
+    """
+    for start in range(0, len(motion_path), chunk_size):
+        joints = np.asarray(motion_path.joints[start:start + chunk_size], dtype=np.float64)
+        if motion_path.durations is None:
+            durations = np.full(len(joints), np.nan)
+        else:
+            durations = np.asarray(motion_path.durations[start:start + chunk_size], dtype=np.float64)
+        yield from zip(joints, durations)
+
+
+def iter_recording(filename: str, chunk_size: int = 1024) -> Iterator[Tuple[np.ndarray, float]]:
+    """
+        Decode a recording lazily from disk. Compressed archives are decompressed one chunk at a time
+        and binary motion paths are mapped, so memory use does not grow with the length of the recording.
+    :param filename: Path of the recording, in any format.
+    :param chunk_size: Samples of a binary motion path decoded at once.
+    :return: Iterator of (joint angles, duration in ms or NaN for keyframes).
+    """
+    with open(filename, 'rb') as f:
+        archive = is_archive(f)
+    if not archive:
+        yield from iter_samples(MotionPath.load_any(filename), chunk_size)
+        return
+    with MotionArchive(filename) as motion_archive:
+        for chunk in motion_archive.iter_chunks():
+            yield from iter_samples(chunk, chunk_size)
+
+
+def scale_speed(samples: Iterator[Tuple[np.ndarray, float]], speed: float = 1.0,
+                limits: Optional[Dict[str, float]] = None) -> Iterator[Tuple[np.ndarray, float]]:
+    """
+        Play timed samples speed times faster, stretching any move which would exceed the joint speed limits.
+        Keyframes keep their fixed duration.
+    :param samples: Iterator of (joint angles, duration in ms or NaN for keyframes).
+    :param speed: Speed factor.
+    :param limits: Joint speed limits, see trajectory.clamp_velocity.
+    :return: Iterator of (joint angles, new duration in ms).
+    :raises ValueError: If the speed factor is not positive.
+    """
+    if not speed > 0:
+        raise ValueError(f'Speed factors must be positive, got {speed}.')
+    speeds = speed_limits(limits)
+
+    def scaled() -> Iterator[Tuple[np.ndarray, float]]:
+        previous = None
+        for joints, duration in samples:
+            duration = duration / speed
+            if previous is not None and not np.isnan(duration):
+                duration = max(duration, 1000 * float(np.max(np.abs(joints - previous) / speeds)))
+            previous = joints
+            yield joints, duration
+    return scaled()
+
+
+def positive_float(text: str) -> float:
+    """ Argparse type of a number above zero. """
+    value = float(text)
+    if not value > 0:
+        raise argparse.ArgumentTypeError(f'{text} is not above zero')
+    return value
+
+
+def iter_schedule(samples: Iterator[Tuple[np.ndarray, float]], time_ms: float = 1000.0,
+                  start: float = 0.0) -> Generator[Tuple[float, bytes], None, float]:
+    """
+        Encode samples into servo frames with their offsets from the start of playback.
+        Keyframes move to each pose in time_ms. Timed samples keep their durations,
+        and only the move to the first pose takes time_ms.
+    :param samples: Iterator of (joint angles, duration in ms or NaN).
+    :param time_ms: Duration of each keyframe move, or of the lead-in move of a timed recording.
+    :param start: Offset of the first frame in seconds.
+    :return: Generator of (offset, frame). Its return value is the offset at which the last move ends.
+    """
+    offset = start
+    for index, (joints, duration) in enumerate(samples):
+        if index == 0 or duration != duration:
+            duration = time_ms
+        yield offset, pk.write_servo_move(dict(zip(motor_names[1:], map(float, joints))), int(round(duration)))
+        offset += duration / 1000
+    return offset
 
 
 def main() -> None:
@@ -84,16 +250,44 @@ def main() -> None:
 
     parser = argparse.ArgumentParser(description='Record and playback motion paths.')
     group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('-l', '--list', type=str, nargs='?', const='*', default=None, metavar='PATTERN',
+                       help='List the catalogued motion paths, optionally matching a shell-style pattern.')
     group.add_argument('-r', '--record', type=str, help='Filename to save your recorded motion path.')
-    group.add_argument('-p', '--play', type=str, choices=listdir(motionpath_dir),
-                       help='Filename to replay a motion path from.')
+    group.add_argument('-c', '--continuous', type=str,
+                       help='Filename to save a continuous, timestamped recording of your motion path.')
+    group.add_argument('-p', '--play', type=str, help='Filename to replay a motion path from.')
     parser.add_argument('-t', '--time', type=float, default=1000.0, help='Time interval for each motion to take in ms.')
+    parser.add_argument('-s', '--spin', type=float, default=0.0,
+                        help='Busy-wait this many seconds before each frame for sub-millisecond timing.')
+    parser.add_argument('--speed', type=positive_float, default=1.0, help='Speed factor for timed recordings.')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='Resample to this many frames per second, clamping joint speeds to their limits.')
+    parser.add_argument('--simplify', type=float, nargs='?', const=servo_resolution_deg, default=None,
+                        help='Drop samples reproducible within this many degrees. (Defaults to one servo count.)')
+    parser.add_argument('--safe', action='store_true', help='Only list motion paths which pass the safety check.')
+    parser.add_argument('--max-duration', type=float, default=None, help='Only list recordings at most this long in s.')
     arguments = parser.parse_args()
 
-    if arguments.record is not None:
+    # Only new or modified recordings are opened; everything else comes from the index.
+    library = MotionLibrary(motionpath_dir)
+    if arguments.list is not None or arguments.play is not None:
+        library.refresh()
+
+    if arguments.list is not None:
+        for entry in library.search(arguments.list, max_duration_s=arguments.max_duration,
+                                    safe=True if arguments.safe else None):
+            duration = 'keyframes' if entry['duration_s'] is None else f"{entry['duration_s']:.1f} s"
+            status = 'safe' if entry['safe'] else f"unsafe at pose {entry['first_unsafe']}"
+            print(f"{entry['name']}: {entry['poses']} poses, {duration}, {status}")
+    elif arguments.play is not None and arguments.play not in library:
+        parser.error(f"argument -p/--play: invalid choice: '{arguments.play}' (choose from {sorted(library.entries)})")
+    elif arguments.record is not None:
         MotionRecorder().run_recorder(arguments.record)
+    elif arguments.continuous is not None:
+        MotionRecorder().run_continuous_recorder(arguments.continuous)
     elif arguments.play is not None:
-        MotionRecorder().playback_from_file(arguments.play, arguments.time)
+        MotionRecorder().playback_from_file(arguments.play, arguments.time, arguments.spin,
+                                           arguments.simplify, arguments.speed, arguments.rate)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,163 @@
+#! /usr/bin/env python3
+import struct
+import logging
+import argparse
+from os import path
+from time import monotonic
+from threading import Lock
+from typing import BinaryIO, Callable, Dict, List, NamedTuple
+
+from definitions import commands, motor_ids
+from robot_utils import rotation_to_degrees
+
+log = logging.getLogger('PacketTrace')
+
+trace_magic = b'XAPT'
+trace_version = 1
+# magic, version, slot size, number of records
+file_header_format = '<4sBxHI'
+file_header_size = struct.calcsize(file_header_format)
+# monotonic timestamp, direction, frame length (before truncation to the slot size)
+record_header = struct.Struct('<dBxH')
+
+outgoing, incoming = 0, 1
+direction_names = {outgoing: '->', incoming: '<-'}
+
+command_names: Dict[int, str] = {}
+for _name, _code in commands.items():
+    command_names[_code] = f'{command_names[_code]}/{_name}' if _code in command_names else _name
+motor_names_by_id: Dict[int, str] = {motor_id: motor for motor, motor_id in motor_ids.items()}
+
+
+class TraceRecord(NamedTuple):
+    timestamp: float
+    direction: int
+    length: int
+    frame: bytes
+
+
+class PacketTrace:
+    """ Ring buffer of the most recent serial frames, in one preallocated block of fixed-size slots. """
+
+    def __init__(self, capacity: int = 4096, slot_size: int = 64, clock: Callable[[], float] = monotonic) -> None:
+        """
+            Initialize the trace.
+        :param capacity: Number of frames kept.
+        :param slot_size: Bytes kept of each frame. Longer frames are truncated.
+        :param clock: Monotonic clock in seconds.
+        """
+        self.capacity: int = capacity
+        self.slot_size: int = slot_size
+        self.record_size: int = record_header.size + slot_size
+        self.clock: Callable[[], float] = clock
+        self.buffer: bytearray = bytearray(capacity * self.record_size)
+        self.count: int = 0
+        self.lock: Lock = Lock()
+
+    def record(self, direction: int, frame: bytes) -> None:
+        """ Copy a frame into the next slot, overwriting the oldest. """
+        length = len(frame)
+        kept = min(length, self.slot_size)
+        with self.lock:
+            offset = (self.count % self.capacity) * self.record_size
+            record_header.pack_into(self.buffer, offset, self.clock(), direction, length)
+            start = offset + record_header.size
+            self.buffer[start:start + kept] = frame[:kept]
+            self.count += 1
+
+    def records(self) -> List[TraceRecord]:
+        """ The frames held, oldest first. """
+        with self.lock:
+            held = min(self.count, self.capacity)
+            first = self.count - held
+            snapshot = bytes(self.buffer)
+        return [self.unpack(snapshot, (index % self.capacity) * self.record_size)
+                for index in range(first, first + held)]
+
+    def unpack(self, buffer: bytes, offset: int) -> TraceRecord:
+        timestamp, direction, length = record_header.unpack_from(buffer, offset)
+        start = offset + record_header.size
+        return TraceRecord(timestamp, direction, length, buffer[start:start + min(length, self.slot_size)])
+
+    def write(self, f: BinaryIO) -> int:
+        """
+            Write the frames held, oldest first, to a binary file object.
+        :return: Number of records written.
+        """
+        records = self.records()
+        f.write(struct.pack(file_header_format, trace_magic, trace_version, self.slot_size, len(records)))
+        for record in records:
+            f.write(record_header.pack(record.timestamp, record.direction, record.length))
+            f.write(record.frame.ljust(self.slot_size, b'\0'))
+        return len(records)
+
+    def dump(self, filename: str) -> int:
+        with open(filename, 'wb') as f:
+            return self.write(f)
+
+
+def read_trace(f: BinaryIO) -> List[TraceRecord]:
+    """ Read the records of a trace file. """
+    magic, version, slot_size, count = struct.unpack(file_header_format, f.read(file_header_size))
+    if magic != trace_magic or version != trace_version:
+        raise ValueError(f'Not a packet trace (version {trace_version}): {magic!r} v{version}')
+    reader = PacketTrace(capacity=1, slot_size=slot_size)
+    data = f.read(count * reader.record_size)
+    return [reader.unpack(data, index * reader.record_size) for index in range(len(data) // reader.record_size)]
+
+
+def decode_frame(frame: bytes, direction: int = outgoing) -> str:
+    """
+        Describe a frame of the servo controller protocol: [0x55, 0x55, length, command, parameters...].
+    :param frame: Raw bytes of the frame.
+    :param direction: outgoing or incoming. Position requests and replies share a command code.
+    :return: Human readable description.
+    """
+    if len(frame) < 4 or frame[:2] != b'\x55\x55':
+        return f'raw {frame.hex()}'
+    length, command, parameters = frame[2], frame[3], frame[4:]
+    name = command_names.get(command, f'command {command}')
+    if len(parameters) != length - 2:
+        return f'{name} (truncated or malformed) {frame.hex()}'
+
+    def motor(motor_id: int) -> str:
+        return motor_names_by_id.get(motor_id, f'servo {motor_id}')
+
+    def angles(data: bytes) -> str:
+        return ', '.join(f'{motor(data[index])} {rotation_to_degrees(data[index + 1] | (data[index + 2] << 8)):+.2f}'
+                         for index in range(0, len(data) - 2, 3))
+
+    if command == commands.move_servo:
+        return f'{name} in {parameters[1] | (parameters[2] << 8)} ms: {angles(parameters[3:])}'
+    if command == commands.read_multiple_servo_positions and direction == incoming:
+        return f'{name} reply: {angles(parameters[1:])}'
+    if command in (commands.read_multiple_servo_positions, commands.unload_multiple_servo):
+        return f'{name}: {", ".join(motor(motor_id) for motor_id in parameters[1:])}'
+    if command == commands.run_action_group:
+        return f'{name} {parameters[0]} x{parameters[1] | (parameters[2] << 8)}'
+    if command == commands.action_speed and direction == outgoing:
+        return f'{name} group {parameters[0]} at {parameters[1] | (parameters[2] << 8)}%'
+    return f'{name} {parameters.hex()}'.rstrip()
+
+
+def format_trace(records: List[TraceRecord]) -> str:
+    """ One line per record: time relative to the first record, direction and decoded frame. """
+    start = records[0].timestamp if records else 0.0
+    return '\n'.join(f'{1000 * (record.timestamp - start):10.3f} ms {direction_names.get(record.direction, "??")} '
+                     f'{decode_frame(record.frame, record.direction)}' for record in records)
+
+
+def main() -> None:  # pragma: no cover
+    logging.basicConfig(level=logging.INFO,
+                        format=f'[%(levelname)s] {path.basename(__file__)} %(funcName)s: \n%(message)s')
+
+    parser = argparse.ArgumentParser(description='Decode a packet trace dumped by RobotArm.')
+    parser.add_argument('trace', type=str, help='Packet trace file.')
+    arguments = parser.parse_args()
+
+    with open(arguments.trace, 'rb') as f:
+        print(format_trace(read_trace(f)))
+
+
+if __name__ == '__main__':
+    main()
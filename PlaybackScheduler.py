@@ -0,0 +1,105 @@
+import logging
+import numpy as np
+from time import monotonic, sleep
+from typing import Any, Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+log = logging.getLogger('PlaybackScheduler')
+
+
+class PlaybackScheduler:
+    """ Waits for absolute deadlines measured from a monotonic start time, so timing errors never accumulate. """
+
+    def __init__(self, spin_s: float = 0.0, capacity: int = 4096,
+                 clock: Callable[[], float] = monotonic, wait: Callable[[float], None] = sleep) -> None:
+        """
+            Initialize the scheduler.
+        :param spin_s: Final stretch before each deadline spent busy-waiting instead of sleeping.
+        :param capacity: Number of recent lateness measurements kept for percentiles.
+        :param clock: Monotonic clock in seconds.
+        :param wait: Function which sleeps for a number of seconds.
+        """
+        self.spin_s: float = spin_s
+        self.clock: Callable[[], float] = clock
+        self.wait: Callable[[float], None] = wait
+        self.origin: float = clock()
+
+        self.lateness: np.ndarray = np.zeros(capacity)
+        self.count: int = 0
+        self.total_lateness: float = 0.0
+        self.max_lateness: float = 0.0
+
+    def start(self, origin: Optional[float] = None) -> None:
+        """ Reset the start time that deadlines are measured from. (Defaults to now.) """
+        self.origin = self.clock() if origin is None else origin
+
+    def wait_until(self, deadline: float) -> float:
+        """
+            Sleep until origin + deadline and record how late the wake-up was.
+        :param deadline: Seconds after the start time.
+        :return: Lateness in seconds.
+        """
+        target = self.origin + deadline
+        remaining = target - self.clock() - self.spin_s
+        if remaining > 0:
+            self.wait(remaining)
+        while self.spin_s and self.clock() < target:
+            pass
+
+        lateness = max(0.0, self.clock() - target)
+        self.lateness[self.count % len(self.lateness)] = lateness
+        self.count += 1
+        self.total_lateness += lateness
+        self.max_lateness = max(self.max_lateness, lateness)
+        return lateness
+
+    def run(self, schedule: Sequence[Tuple[float, bytes]], send: Callable[[bytes], None],
+            loop_s: Optional[float] = None, loops: Optional[int] = 1, origin: Optional[float] = None) -> None:
+        """
+            Send frames at their offsets, optionally repeating the whole schedule.
+        :param schedule: Sequence of (seconds from the start of the loop, frame).
+        :param send: Function which writes a frame to the arm.
+        :param loop_s: Duration of one loop, including the move of its last frame. Required to repeat.
+        :param loops: Number of loops. None repeats until interrupted.
+        :param origin: Clock time of the start, shared by schedulers which must start together. (Defaults to now.)
+        :raises ValueError: If the schedule repeats without a loop duration above zero.
+        """
+        if not schedule:
+            return
+        if loops != 1 and (loop_s is None or loop_s <= 0):
+            # Only the caller knows how long the last move takes; the next loop must not cut it off.
+            raise ValueError(f'Repeated playback needs a loop duration above zero, got {loop_s}.')
+        loop_s = loop_s or 0.0
+        self.start(origin)
+        loop = 0
+        while loops is None or loop < loops:
+            # Deadlines are computed from the loop index, never accumulated.
+            for offset, frame in schedule:
+                self.wait_until(loop * loop_s + offset)
+                send(frame)
+            loop += 1
+
+    def stream(self, frames: Iterator[Tuple[float, bytes]], send: Callable[[bytes], None]) -> Any:
+        """
+            Send frames from an iterator as it produces them, without materializing the schedule.
+        :param frames: Iterator of (seconds from the start time, frame).
+        :param send: Function which writes a frame to the arm.
+        :return: Return value of the frames generator, if any.
+        """
+        while True:
+            try:
+                offset, frame = next(frames)
+            except StopIteration as stop:
+                return stop.value
+            self.wait_until(offset)
+            send(frame)
+
+    def stats(self) -> Dict[str, float]:
+        """ Per-frame lateness statistics in milliseconds. """
+        result: Dict[str, float] = {'frames': float(self.count)}
+        if self.count:
+            recent = self.lateness[:min(self.count, len(self.lateness))]
+            result['lateness_mean_ms'] = 1000 * self.total_lateness / self.count
+            result['lateness_max_ms'] = 1000 * self.max_lateness
+            for percentile in (50, 90, 99):
+                result[f'lateness_p{percentile}_ms'] = 1000 * float(np.percentile(recent, percentile))
+        return result
@@ -0,0 +1,122 @@
+import pstats
+import logging
+import cProfile
+from os import makedirs, path
+from typing import Dict, List, Optional, Tuple
+
+log = logging.getLogger('Profiler')
+
+# pstats function key: (filename, line number, function name)
+Function = Tuple[str, int, str]
+
+
+def frame_name(function: Function) -> str:
+    """ Stack frame label of a function, without the separators of the collapsed format. """
+    filename, line, name = function
+    if filename == '~':
+        return name.replace(';', ',').replace(' ', '_')
+    return f'{path.basename(filename)}:{name}:{line}'
+
+
+def collapsed_stacks(stats: pstats.Stats, min_us: float = 1.0) -> Dict[str, float]:
+    """
+        Rebuild call stacks from a deterministic profile, for flame graphs.
+        A profile only keeps caller-callee pairs, so the time of a function is split between
+        its callers in proportion to the time spent under each of them.
+    :param stats: Profile statistics.
+    :param min_us: Stacks shorter than this many microseconds are dropped.
+    :return: Dict of 'root;caller;function' to the time spent in the function itself, in microseconds.
+    """
+    entries = stats.stats  # type: ignore
+    callees: Dict[Function, Dict[Function, float]] = {}
+    for function, (_cc, _nc, _tt, _ct, callers) in entries.items():
+        for caller, (_ccc, _cnc, _ctt, caller_ct) in callers.items():
+            callees.setdefault(caller, {})[function] = caller_ct
+
+    stacks: Dict[str, float] = {}
+
+    def walk(function: Function, stack: List[Function], cumulative: float) -> None:
+        total = entries[function][3]
+        share = cumulative / total if total > 0 else 0.0
+        own = entries[function][2] * share
+        frames = stack + [function]
+        if own * 1e6 >= min_us:
+            key = ';'.join(frame_name(frame) for frame in frames)
+            stacks[key] = stacks.get(key, 0.0) + own * 1e6
+        for callee, callee_ct in callees.get(function, {}).items():
+            # Recursive calls are already counted in the cumulative time of the outer call.
+            if callee not in frames and callee in entries and callee_ct * share * 1e6 >= min_us:
+                walk(callee, frames, callee_ct * share)
+
+    roots = [function for function, entry in entries.items() if not any(caller in entries for caller in entry[4])]
+    for root in roots:
+        walk(root, [], entries[root][3])
+    return stacks
+
+
+class CommandProfiler:
+    """ One cProfile profile per command name, accumulated over every run of the command. """
+
+    def __init__(self) -> None:
+        self.enabled: bool = False
+        self.profiles: Dict[str, cProfile.Profile] = {}
+        self.runs: Dict[str, int] = {}
+        self.active: Optional[cProfile.Profile] = None
+
+    def start(self, command: str) -> None:
+        """ Profile until stop is called, if enabled and no other command is being profiled. """
+        if not self.enabled or self.active is not None:
+            return
+        self.active = self.profiles.setdefault(command, cProfile.Profile())
+        self.runs[command] = self.runs.get(command, 0) + 1
+        self.active.enable()
+
+    def stop(self) -> None:
+        if self.active is not None:
+            self.active.disable()
+            self.active = None
+
+    def reset(self) -> None:
+        self.stop()
+        self.profiles.clear()
+        self.runs.clear()
+
+    def stats(self, command: str) -> pstats.Stats:
+        return pstats.Stats(self.profiles[command])
+
+    def dump(self, directory: str) -> List[str]:
+        """
+            Write a pstats file (<command>.prof) and a collapsed stack file (<command>.folded)
+            of each profiled command. The latter is the input of flamegraph.pl and speedscope.
+        :param directory: Output directory, created if needed.
+        :return: Paths written.
+        """
+        makedirs(directory, exist_ok=True)
+        written = []
+        for command in sorted(self.profiles):
+            if self.profiles[command] is self.active:
+                continue
+            stats = self.stats(command)
+            filename = path.join(directory, f'{command}.prof')
+            stats.dump_stats(filename)
+            written.append(filename)
+
+            filename = path.join(directory, f'{command}.folded')
+            with open(filename, 'w') as f:
+                for stack, microseconds in sorted(collapsed_stacks(stats).items()):
+                    f.write(f'{stack} {int(round(microseconds))}\n')
+            written.append(filename)
+        return written
+
+    def summary(self, limit: int = 5) -> str:
+        """ The functions with the most time of their own, per command. """
+        lines = []
+        for command in sorted(self.profiles):
+            if self.profiles[command] is self.active:
+                continue
+            entries = self.stats(command).stats  # type: ignore
+            total = sum(entry[2] for entry in entries.values())
+            lines.append(f'{command}: {self.runs[command]} runs, {1000 * total:.1f} ms profiled')
+            for function, entry in sorted(entries.items(), key=lambda item: -item[1][2])[:limit]:
+                lines.append(f'  {1000 * entry[2]:9.2f} ms {entry[1]:8d} calls  {frame_name(function)}')
+        return '\n'.join(lines)
@@ -1,26 +1,44 @@
 import logging
+from threading import Lock, RLock
 from functools import wraps
 from itertools import count
-from serial import Serial
-from serial.serialutil import SerialException
-from typing import Callable, Dict, Iterator, Optional, Union
-from time import sleep
+from typing import Callable, Dict, Iterator, Optional, Union, TYPE_CHECKING
+from os import makedirs, path
+from time import monotonic, sleep, strftime
 
 from Point import Point
 from RobotState import RobotState
+from CollisionChecker import CollisionChecker
+from Telemetry import Telemetry
+from Metrics import timed, count as count_metric
+from PacketTrace import PacketTrace, incoming, outgoing
+
+if TYPE_CHECKING:  # pragma: no cover
+    from serial import Serial
+    from StateMemory import StatePublisher
 
 import packetmaker as pk
 from definitions import commands, motor_names
 from robot_kinematics import get_pose_for_target_analytical, approach_point_from_angle
 from robot_utils import rotation_to_degrees
 
+serial_port = '/dev/serial0'
+baud_rate = 9600
+trace_dir = 'traces'
+
+
+def open_serial(port: str, baud: int) -> 'Serial':
+    """ Open a serial port. pyserial is imported here rather than at startup, as most runs never open one. """
+    from serial import Serial
+    return Serial(port, baud)
+
 
 def ensure_serial_connection(func: Callable[..., None]) -> Callable:
     """ Ensure that a serial connection is established. Raises runtime error. """
     @wraps(func)
     def decorator(self, *args, **kwargs) -> None:  # type: ignore
-        if not hasattr(self, 'Ser'):
-            self.log.error('Serial connection was not established at initialization. '
+        if not self.ensure_serial():
+            self.log.error('Serial connection could not be established. '
                            'Cannot send nor receive data.')
             raise RuntimeError
         return func(self, *args, **kwargs)
@@ -29,22 +47,72 @@ def ensure_serial_connection(func: Callable[..., None]) -> Callable:
 
 class RobotArm:
     counter: Iterator = count(0)
+    # Numbers the automatic trace dumps, so that dumps within the same second do not overwrite each other.
+    dump_counter: Iterator = count(0)
+    # Set by ensure_serial once the port is open.
+    Ser: 'Serial'
 
-    def __init__(self) -> None:
+    def __init__(self, collision_checker: Optional[CollisionChecker] = None, port: Optional[str] = None) -> None:
         self.log = logging.getLogger(f'RobotArm{next(self.counter)}')
+        self.port: str = serial_port if port is None else port
         self.State: RobotState = RobotState()
+        self.collision_checker: Optional[CollisionChecker] = collision_checker
+        self.position_updates: int = 0
+        self.last_update: float = 0.0
+        self.telemetry: Optional[Telemetry] = None
+        self.publisher: Optional['StatePublisher'] = None
+        # Every frame sent or received, for post-mortem analysis. Dumped when the serial link fails.
+        self.trace: PacketTrace = PacketTrace()
 
-        try:
-            self.Ser: Serial = Serial('/dev/serial0', 9600)
-        except SerialException:
-            self.log.warning('Failed to establish Serial connection.')
+        # The port is opened on first use, so that creating an arm never waits for the device.
+        self.serial_factory: Callable[[str, int], 'Serial'] = open_serial
+        self.serial_lock: Lock = Lock()
+        self.serial_attempted: bool = False
+        # Held for each write and each read of the port, so that frames of concurrent callers never interleave.
+        self.io_lock: RLock = RLock()
 
+    def ensure_serial(self) -> bool:
+        """
+            Open the serial connection on first use. A failed attempt is not repeated.
+        :return: Whether self.Ser is open.
+        """
+        if hasattr(self, 'Ser'):
+            return True
+        with self.serial_lock:
+            if not hasattr(self, 'Ser') and not self.serial_attempted:
+                self.serial_attempted = True
+                from serial import SerialException
+                try:
+                    self.Ser = self.serial_factory(self.port, baud_rate)
+                except SerialException:
+                    self.log.warning(f'Failed to establish Serial connection on {self.port}.')
+        return hasattr(self, 'Ser')
+
+    @timed('arm.send')
     @ensure_serial_connection
     def send(self, byte_packet: bytes) -> None:
-        self.Ser.write(byte_packet)
+        with self.io_lock:
+            self.trace.record(outgoing, byte_packet)
+            try:
+                self.Ser.write(byte_packet)
+            except OSError:
+                # SerialException is an OSError. Other errors are bugs of the caller, not of the link.
+                self.dump_trace()
+                raise
+        count_metric('arm.bytes_sent', len(byte_packet))
 
+    @timed('arm.receive_serial')
     @ensure_serial_connection
     def receive_serial(self) -> None:
+        with self.io_lock:
+            try:
+                self.read_packets()
+            except OSError:
+                # Bad frames raise NotImplementedError, IndexError or ValueError, which Telemetry skips.
+                self.dump_trace()
+                raise
+
+    def read_packets(self) -> None:
         header = (0, 0)
         while self.Ser.inWaiting():
             header = header[1], self.Ser.read()[0]
@@ -55,19 +123,35 @@ class RobotArm:
             packet_length = self.Ser.read()[0]
             packet_command = self.Ser.read()[0]
             packet_message = self.Ser.read(packet_length - 2)
+            self.trace.record(incoming, bytes((0x55, 0x55, packet_length, packet_command)) + packet_message)
 
             # Send to message handler.
+            count_metric('arm.frames_received')
             self.handle_packet(packet_command, packet_message)
 
             # Reset for future messages.
             header = (0, 0)
 
+    def dump_trace(self, filename: Optional[str] = None) -> str:
+        """
+            Write the packet trace to a file. Decode it with PacketTrace.py.
+        :param filename: Path of the dump. (Defaults to a timestamped file in trace_dir.)
+        :return: Path of the dump.
+        """
+        if filename is None:
+            makedirs(trace_dir, exist_ok=True)
+            filename = path.join(trace_dir, f'packet_trace_{strftime("%Y%m%d_%H%M%S")}_{next(self.dump_counter)}.xapt')
+        records = self.trace.dump(filename)
+        self.log.warning(f'Dumped the last {records} serial frames to {filename}.')
+        return filename
+
     def handle_packet(self, command_code: int, packet_data: bytes) -> None:
         if command_code == commands.read_multiple_servo_positions:
             self.handle_position_packet(packet_data)
         else:
             raise NotImplementedError(f'Command code not recognized: {command_code}')
 
+    @timed('arm.handle_position_packet')
     def handle_position_packet(self, packet_data: bytes) -> None:
         """
             Parse a packet of position information and update the state of the robot arm.
@@ -82,9 +166,18 @@ class RobotArm:
                 {motor_names[motor_id]: rotation_to_degrees(angle_byte_1 | (angle_byte_2 << 8))
                  for motor_id, angle_byte_1, angle_byte_2 in zip(*[iter(position_data)] * 3)}
             self.State.update_state(position_dict)
+            self.last_update = monotonic()
+            self.position_updates += 1
+            self.publish_state()
         except AssertionError:
             self.log.error('Invalid packet -- Wrong size: {packet_data}. Skipping state update.')
 
+    def collides(self, target_state: RobotState) -> bool:
+        """ Check the path from the current state to target_state against the collision checker, if any. """
+        if self.collision_checker is None:
+            return False
+        return self.collision_checker.check_move(self.State, target_state) is not None
+
     def send_beep(self) -> None:
         self.send(b'\x55\x00')
 
@@ -101,10 +194,13 @@ class RobotArm:
 	
         if (computed_state is None) or (not computed_state.is_state_safe()):
             self.log.error('Commanded solution is not safe. Not sending.')
+        elif self.collides(computed_state):
+            self.log.error('Commanded motion collides with its surroundings. Not sending.')
         else:
             degrees_dict: Dict[str, float] = vars(computed_state)
             self.send(pk.write_servo_move(degrees_dict, time_ms))
             self.State.update_state(degrees_dict)
+            self.publish_state()
         return computed_state
 
     def approach_from_angle(self, point: Point, angle: Union[int, float], time_ms: int, offset: float=0.0, finger_position: float=None, hand_position: float=None) -> RobotState:
@@ -117,9 +213,12 @@ class RobotArm:
 
         if (computed_state is None) or (not computed_state.is_state_safe()):
             self.log.error('Commanded solution is not safe. Not sending.')
+        elif self.collides(computed_state):
+            self.log.error('Commanded motion collides with its surroundings. Not sending.')
         else:
             self.send(pk.write_servo_move(vars(computed_state), time_ms))
             self.State = computed_state
+            self.publish_state()
         return self.State
 
     def pick_at_point(self, point: Point, time_ms: int, finger_position: float):
@@ -169,3 +268,57 @@ class RobotArm:
 
     def request_positions(self) -> None:
         self.send(pk.write_request_positions())
+
+    def start_publishing(self, name: Optional[str] = None) -> 'StatePublisher':
+        """
+            Publish every state update to a shared memory block, for StateReaders in other processes.
+            StateMemory is imported here rather than at startup: it needs Python 3.8 and most runs never publish.
+        :param name: Name of the shared memory block. (Defaults to StateMemory.state_memory_name.)
+        :return: The publisher.
+        """
+        from StateMemory import StatePublisher, state_memory_name
+        self.stop_publishing()
+        self.publisher = StatePublisher(state_memory_name if name is None else name)
+        self.publish_state()
+        return self.publisher
+
+    def stop_publishing(self) -> None:
+        if self.publisher is not None:
+            self.publisher.close()
+            self.publisher = None
+
+    def publish_state(self) -> None:
+        """ Write the current state to shared memory, if publishing. Call after changing self.State. """
+        if self.publisher is not None:
+            self.publisher.publish(self.State, monotonic(), self.position_updates)
+
+    def start_telemetry(self, rate_hz: float = 20.0, capacity: int = 4096) -> Telemetry:
+        """
+            Start requesting positions at a fixed rate on a background thread.
+            While telemetry runs, read self.State or the telemetry buffer instead of calling receive_serial.
+        :param rate_hz: Request rate in hertz.
+        :param capacity: Number of samples kept in the ring buffer.
+        :return: The running Telemetry.
+        """
+        self.stop_telemetry()
+        self.telemetry = Telemetry(self, rate_hz, capacity)
+        self.telemetry.start()
+        return self.telemetry
+
+    def stop_telemetry(self) -> None:
+        if self.telemetry is not None:
+            self.telemetry.stop()
+
+    def run_action_group(self, group: int, times: int = 1, speed_percent: Optional[int] = None) -> None:
+        """
+            Run an action group stored on the controller. The controller drives every frame itself.
+        :param group: Number of the action group.
+        :param times: Number of repetitions. (Zero repeats until stopped.)
+        :param speed_percent: Playback speed in percent of the recorded speed. (Defaults to the last speed set.)
+        """
+        if speed_percent is not None:
+            self.send(pk.write_action_speed(group, speed_percent))
+        self.send(pk.write_run_action_group(group, times))
+
+    def stop_action(self) -> None:
+        self.send(pk.write_stop_action())
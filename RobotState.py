@@ -18,6 +18,17 @@ safe_ranges = \
     }
 
 
+def joints_safe(joints: np.ndarray) -> np.ndarray:
+    """
+        Vectorized is_state_safe for a batch of joint vectors in motor_names[1:] order.
+    :param joints: Array of shape (N, 6).
+    :return: Boolean array of shape (N,).
+    """
+    lower, upper = np.array([safe_ranges[motor] for motor in motor_names[1:]], dtype=np.float64).T
+    joints = np.atleast_2d(joints)
+    return np.all((lower <= joints) & (joints <= upper), axis=1)
+
+
 class RobotState:
     radius = shoulder_to_elbow + elbow_to_wrist + wrist_to_fingers
 
@@ -0,0 +1,176 @@
+import sys
+import logging
+import numpy as np
+from multiprocessing import resource_tracker, shared_memory
+from threading import Lock
+from time import monotonic, sleep
+from typing import Dict, Set, Tuple, TYPE_CHECKING
+
+from definitions import motor_names
+
+if TYPE_CHECKING:  # pragma: no cover
+    from RobotState import RobotState
+
+log = logging.getLogger('StateMemory')
+
+state_memory_name = 'xarm_state'
+state_magic = 0x54534158  # b'XAST'
+state_version = 1
+
+# Layout: magic (u4), version (u4), sequence (u8), then float64 values:
+# joint angles in motor_names[1:] order, Cartesian tip position, monotonic time of the last update, update count.
+joints_slice, cartesian_slice, timestamp_index, updates_index = slice(0, 6), slice(6, 9), 9, 10
+value_count = 11
+header_size = 16
+state_memory_size = header_size + 8 * value_count
+
+# Blocks created by this process. Readers of these must leave the resource tracker registration alone.
+published_names: Set[str] = set()
+
+
+def views(memory: shared_memory.SharedMemory) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """ Header, sequence and value arrays over the shared block, without copying. """
+    buffer = memory.buf
+    assert buffer is not None, f'Shared memory block {memory.name} is closed.'
+    header: np.ndarray = np.ndarray((2,), dtype=np.uint32, buffer=buffer)
+    sequence: np.ndarray = np.ndarray((1,), dtype=np.uint64, buffer=buffer, offset=8)
+    values: np.ndarray = np.ndarray((value_count,), dtype=np.float64, buffer=buffer, offset=header_size)
+    return header, sequence, values
+
+
+class StatePublisher:
+    """
+        Owns a shared memory block holding the latest state of an arm. Writes follow a seqlock:
+        the sequence is odd while the values change, and readers retry until they see the same
+        even sequence before and after copying.
+    """
+
+    def __init__(self, name: str = state_memory_name) -> None:
+        """
+            Create the block, replacing one left behind by a process which did not close it.
+        :param name: Name of the shared memory block.
+        """
+        try:
+            self.memory: shared_memory.SharedMemory = \
+                shared_memory.SharedMemory(name, create=True, size=state_memory_size)
+        except FileExistsError:
+            log.warning(f'Replacing the stale shared memory block {name}.')
+            stale = shared_memory.SharedMemory(name)
+            stale.close()
+            stale.unlink()
+            self.memory = shared_memory.SharedMemory(name, create=True, size=state_memory_size)
+        published_names.add(self.memory.name)
+        self.header, self.sequence, self.values = views(self.memory)
+        self.values[:] = np.nan
+        self.values[updates_index] = 0
+        self.header[:] = (state_magic, state_version)
+        self.staging: np.ndarray = np.empty(value_count)
+        # Telemetry, server handlers and fleet workers all publish. Two writers at once would break the seqlock.
+        self.lock: Lock = Lock()
+
+    @property
+    def name(self) -> str:
+        return self.memory.name
+
+    def publish(self, state: 'RobotState', timestamp: float, updates: int) -> None:
+        """
+            Write one state. Writes from several threads are serialized.
+        :param state: Joint angles to publish.
+        :param timestamp: Monotonic time of the update. The monotonic clock is shared by every process of the host.
+        :param updates: Number of updates so far.
+        """
+        # Everything that takes time is computed before the sequence goes odd, so the write window stays short.
+        joints = [state[joint] for joint in motor_names[1:]]
+        cartesian = state.get_cartesian()
+        with self.lock:
+            staging = self.staging
+            staging[joints_slice] = joints
+            staging[cartesian_slice] = cartesian
+            staging[timestamp_index] = timestamp
+            staging[updates_index] = updates
+            self.sequence[0] += 1
+            self.values[:] = staging
+            self.sequence[0] += 1
+
+    def close(self) -> None:
+        """ Release and remove the block. Readers still attached keep their mapping. """
+        del self.header, self.sequence, self.values
+        published_names.discard(self.memory.name)
+        self.memory.close()
+        self.memory.unlink()
+
+
+class StateReader:
+    """ Reads the latest state published by another process, straight from shared memory. """
+
+    def __init__(self, name: str = state_memory_name) -> None:
+        """
+            Attach to a published block.
+        :param name: Name of the shared memory block.
+        :raises FileNotFoundError: If no arm publishes under that name.
+        """
+        if sys.version_info >= (3, 13):
+            self.memory: shared_memory.SharedMemory = shared_memory.SharedMemory(name, track=False)
+        else:
+            self.memory = shared_memory.SharedMemory(name)
+            # Before 3.13 attaching registers the block, and the tracker would unlink it when this process exits.
+            if self.memory.name not in published_names:
+                resource_tracker.unregister(self.memory._name, 'shared_memory')  # type: ignore
+        self.header, self.sequence, self.values = views(self.memory)
+        if tuple(self.header) != (state_magic, state_version):
+            self.close()
+            raise ValueError(f'{name} is not an arm state block (version {state_version}).')
+        self.latest: np.ndarray = np.empty(value_count)
+        self.retries: int = 0
+
+    def read(self, spins: int = 100, timeout_s: float = 1.0) -> int:
+        """
+            Copy a consistent state into self.latest. No memory is allocated.
+        :param spins: Retries before yielding the processor to the writer.
+        :param timeout_s: Time to keep retrying. A write never takes this long unless its writer died mid-write.
+        :return: Sequence number of the state read. Unchanged sequence numbers mean no new state.
+        :raises TimeoutError: If no consistent state could be read within timeout_s.
+        """
+        attempt = 0
+        deadline = None
+        while True:
+            before = int(self.sequence[0])
+            if not before & 1:
+                np.copyto(self.latest, self.values)
+                if int(self.sequence[0]) == before:
+                    return before
+            self.retries += 1
+            attempt += 1
+            if attempt % spins == 0:
+                now = monotonic()
+                if deadline is None:
+                    deadline = now + timeout_s
+                elif now >= deadline:
+                    raise TimeoutError(f'No consistent state in {self.memory.name} after {timeout_s} s.')
+                sleep(0)
+
+    @property
+    def joints(self) -> np.ndarray:
+        """ Joint angles of the last read, in motor_names[1:] order. A view of self.latest. """
+        return self.latest[joints_slice]
+
+    @property
+    def cartesian(self) -> np.ndarray:
+        return self.latest[cartesian_slice]
+
+    @property
+    def timestamp(self) -> float:
+        return float(self.latest[timestamp_index])
+
+    @property
+    def updates(self) -> int:
+        return int(self.latest[updates_index])
+
+    def get(self) -> Dict[str, float]:
+        """ Read and return the joint angles as a dict, like RobotState.items. """
+        self.read()
+        return dict(zip(motor_names[1:], self.joints.tolist()))
+
+    def close(self) -> None:
+        del self.header, self.sequence, self.values
+        self.memory.close()
@@ -0,0 +1,149 @@
+import logging
+import numpy as np
+from math import floor
+from threading import Event, Lock, Thread
+from time import monotonic, sleep
+from typing import Callable, Dict, Optional, TYPE_CHECKING
+
+from definitions import motor_names
+
+if TYPE_CHECKING:  # pragma: no cover
+    from RobotArm import RobotArm
+
+log = logging.getLogger('Telemetry')
+
+# Columns of a telemetry sample.
+request_time, reply_time = 0, 1
+joint_columns = slice(2, 8)
+
+
+class Telemetry:
+    """ Requests positions at a fixed rate and keeps the timestamped replies in a ring buffer. """
+
+    def __init__(self, arm: 'RobotArm', rate_hz: float = 20.0, capacity: int = 4096,
+                 clock: Callable[[], float] = monotonic, wait: Callable[[float], None] = sleep,
+                 poll_s: float = 0.0005, timeout_s: Optional[float] = None) -> None:
+        """
+            Initialize the telemetry loop of an arm.
+        :param arm: RobotArm to poll.
+        :param rate_hz: Request rate in hertz.
+        :param capacity: Number of samples kept in the ring buffer.
+        :param clock: Monotonic clock in seconds.
+        :param wait: Function which sleeps for a number of seconds.
+        :param poll_s: Interval between reads of the serial port while waiting for a reply.
+        :param timeout_s: Time to wait for a reply. (Defaults to one period.)
+        """
+        self.arm: 'RobotArm' = arm
+        self.period: float = 1 / rate_hz
+        self.clock: Callable[[], float] = clock
+        self.wait: Callable[[float], None] = wait
+        self.poll_s: float = poll_s
+        self.timeout: float = self.period if timeout_s is None else timeout_s
+
+        # Rows: (request time, reply time, joint angles in motor_names[1:] order). Preallocated once.
+        self.buffer: np.ndarray = np.full((capacity, 8), np.nan)
+        self.count: int = 0
+        self.overruns: int = 0
+        self.timeouts: int = 0
+        self.bad_frames: int = 0
+        self.lock: Lock = Lock()
+        self.stopped: Event = Event()
+        self.thread: Optional[Thread] = None
+
+    def start(self) -> None:
+        self.stopped.clear()
+        self.thread = Thread(target=self.run, name='Telemetry', daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self, cycles: Optional[int] = None) -> None:
+        """
+            Request positions on absolute deadlines until stopped.
+        :param cycles: Number of periods to run. (Defaults to running until stop is called.)
+        """
+        start = self.clock()
+        period_index = 0
+        while not self.stopped.is_set() and (cycles is None or period_index < cycles):
+            next_deadline = start + (period_index + 1) * self.period
+            try:
+                replied = self.sample()
+            except (RuntimeError, OSError) as error:
+                # No serial connection, or the port failed: there is nothing left to sample.
+                log.error(f'{error!r}: Stopping telemetry.')
+                break
+
+            period_index += 1
+            now = self.clock()
+            if replied and now > next_deadline:
+                # Realign to the next period boundary rather than bursting to catch up.
+                self.overruns += 1
+                period_index = int(floor((now - start) / self.period)) + 1
+            remaining = start + period_index * self.period - now
+            if remaining > 0:
+                self.wait(remaining)
+
+    def sample(self) -> bool:
+        """ Send one position request and record the reply if it arrives within the timeout. """
+        updates = self.arm.position_updates
+        requested = self.clock()
+        self.arm.request_positions()
+
+        while self.arm.position_updates == updates:
+            if self.clock() >= requested + self.timeout:
+                self.timeouts += 1
+                return False
+            self.wait(self.poll_s)
+            self.receive()
+        replied = self.clock()
+
+        with self.lock:
+            row = self.buffer[self.count % len(self.buffer)]
+            row[request_time] = requested
+            row[reply_time] = replied
+            row[joint_columns] = [self.arm.State[joint] for joint in motor_names[1:]]
+            self.count += 1
+        return True
+
+    def receive(self) -> None:
+        """ Read pending replies. A malformed or unknown frame is counted and skipped, sampling goes on. """
+        try:
+            self.arm.receive_serial()
+        except NotImplementedError as error:
+            self.bad_frames += 1
+            log.warning(f'Skipped an unknown frame: {error!r}')
+        except (IndexError, ValueError) as error:
+            self.bad_frames += 1
+            log.warning(f'Skipped a malformed frame: {error!r}')
+
+    def latest(self, samples: Optional[int] = None) -> np.ndarray:
+        """
+            Copy of the most recent samples in chronological order.
+        :param samples: Number of samples. (Defaults to every sample held in the buffer.)
+        :return: Array of shape (samples, 8).
+        """
+        with self.lock:
+            held = min(self.count, len(self.buffer))
+            samples = held if samples is None else min(samples, held)
+            indices = np.arange(self.count - samples, self.count) % len(self.buffer)
+            return self.buffer[indices].copy()
+
+    def stats(self) -> Dict[str, float]:
+        """ Achieved rate, loop overruns, timeouts and reply-latency percentiles in milliseconds. """
+        samples = self.latest()
+        result: Dict[str, float] = {'samples': float(self.count), 'overruns': float(self.overruns),
+                                    'timeouts': float(self.timeouts), 'bad_frames': float(self.bad_frames),
+                                    'rate_hz': 0.0}
+        if len(samples) > 1:
+            span = samples[-1, request_time] - samples[0, request_time]
+            result['rate_hz'] = (len(samples) - 1) / span if span > 0 else 0.0
+        if len(samples):
+            latency_ms = 1000 * (samples[:, reply_time] - samples[:, request_time])
+            for percentile in (50, 90, 99):
+                result[f'latency_p{percentile}_ms'] = float(np.percentile(latency_ms, percentile))
+            result['latency_max_ms'] = float(latency_ms.max())
+        return result
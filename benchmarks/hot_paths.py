@@ -0,0 +1,188 @@
+#! /usr/bin/env python3
+import sys
+import json
+import logging
+import platform
+import argparse
+from io import BytesIO
+from os import path
+from timeit import Timer
+from statistics import mean, median, stdev
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+ROOT_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+import packetmaker as pk  # noqa: E402
+from Point import Point  # noqa: E402
+from RobotArm import RobotArm  # noqa: E402
+from RobotState import RobotState  # noqa: E402
+from definitions import commands, motor_ids  # noqa: E402
+from robot_kinematics import approach_point_from_angle, get_pose_for_target_analytical  # noqa: E402
+from robot_utils import degrees_to_rotation  # noqa: E402
+
+log = logging.getLogger('HotPathBenchmark')
+
+pose = {'base': 10.0, 'shoulder': -30.0, 'elbow': 60.0, 'wrist': 45.0, 'hand': 0.0, 'fingers': -60.0}
+target = Point(spherical=(25.0, 90.0, 30.0))
+
+
+class FakeSerial:
+    """ Replays a fixed byte stream, from the start after each rewind. """
+
+    def __init__(self, stream: bytes) -> None:
+        self.buffer: BytesIO = BytesIO(stream)
+        self.length: int = len(stream)
+
+    def rewind(self) -> None:
+        self.buffer.seek(0)
+
+    def inWaiting(self) -> int:
+        return self.length - self.buffer.tell()
+
+    def read(self, n: int = 1) -> bytes:
+        return self.buffer.read(n)
+
+
+def position_stream(replies: int = 10) -> bytes:
+    """ Replies to write_request_positions for every joint, with a few bytes of line noise in between. """
+    data = bytes([len(pose)]) + b''.join(
+        bytes([motor_ids[motor]]) + degrees_to_rotation(angle).to_bytes(2, 'little') for motor, angle in pose.items())
+    reply = bytes([0x55, 0x55, len(data) + 2, commands.read_multiple_servo_positions]) + data
+    return (reply + b'\x00\x55\x13') * replies
+
+
+def parse_positions() -> Callable[[], None]:
+    """ RobotArm.receive_serial on ten position replies. """
+    serial = FakeSerial(position_stream())
+    arm = RobotArm()
+    arm.serial_factory = lambda *_args: serial
+
+    def run() -> None:
+        serial.rewind()
+        arm.receive_serial()
+    return run
+
+
+def cases() -> Dict[str, Callable[[], Any]]:
+    """ The benchmarked functions, each taking no arguments. """
+    state = RobotState(pose)
+    return {
+        'point.cartesian': lambda: Point(cartesian=(10.0, 12.0, 20.0)),
+        'point.spherical': lambda: Point(spherical=(25.0, 90.0, 30.0)),
+        'point.cart2sphere': lambda: Point.cart2sphere(10.0, 12.0, 20.0),
+        'point.sphere2cyl': lambda: Point.sphere2cyl(25.0, 90.0, 30.0),
+        'kinematics.get_pose_for_target_analytical': lambda: get_pose_for_target_analytical(target),
+        'kinematics.approach_point_from_angle': lambda: approach_point_from_angle(target, 45.0),
+        'state.get_cartesian': state.get_cartesian,
+        'state.get_cylindrical': state.get_cylindrical,
+        'state.get_spherical': state.get_spherical,
+        'state.is_state_safe': state.is_state_safe,
+        'packetmaker.write_servo_move': lambda: pk.write_servo_move(pose, 1000),
+        'packetmaker.write_request_positions': pk.write_request_positions,
+        'packetmaker.write_servo_unlock': pk.write_servo_unlock,
+        'arm.parse_position_packets': parse_positions(),
+    }
+
+
+def measure(func: Callable[[], Any], repeats: int = 15, min_time: float = 0.02) -> List[float]:
+    """
+        Time a function after a warm-up.
+    :param func: Function to time.
+    :param repeats: Number of timed batches.
+    :param min_time: Smallest duration of a batch in seconds. Calls per batch are chosen to reach it.
+    :return: Mean time per call of each batch, in seconds.
+    """
+    timer = Timer(func)
+    number = 1
+    # Warm-up, which also calibrates the batch size.
+    while timer.timeit(number) < min_time:
+        number *= 2
+    return [batch / number for batch in timer.repeat(repeats, number)]
+
+
+def summarize(times: List[float]) -> Dict[str, float]:
+    """ Statistics of per-call times, in microseconds. """
+    microseconds = sorted(1e6 * time for time in times)
+    return {
+        'median_us': median(microseconds),
+        'mean_us': mean(microseconds),
+        'stdev_us': stdev(microseconds) if len(microseconds) > 1 else 0.0,
+        'min_us': microseconds[0],
+        'max_us': microseconds[-1],
+        'repeats': len(microseconds),
+    }
+
+
+def run_suite(selected: Optional[List[str]] = None, repeats: int = 15) -> Dict[str, Any]:
+    """
+        Run the benchmarks.
+    :param selected: Substrings of the benchmark names to run. (Defaults to running all.)
+    :param repeats: Timed batches per benchmark.
+    :return: Results with the interpreter and machine they were measured on.
+    """
+    results = {}
+    for name, func in cases().items():
+        if selected and not any(pattern in name for pattern in selected):
+            continue
+        results[name] = summarize(measure(func, repeats))
+        log.info(f"{name:<44s} median {results[name]['median_us']:9.2f} us  "
+                 f"stdev {results[name]['stdev_us']:7.2f} us")
+    return {'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any],
+            threshold: float = 0.1) -> List[Tuple[str, float]]:
+    """
+        Find the benchmarks whose median slowed down.
+    :param baseline: Results of run_suite saved earlier.
+    :param current: Results of run_suite.
+    :param threshold: Allowed relative slowdown, e.g. 0.1 for 10 %.
+    :return: List of (name, current median / baseline median) beyond the threshold.
+    """
+    regressions = []
+    for name, result in current['results'].items():
+        reference = baseline['results'].get(name)
+        if reference is None or reference['median_us'] <= 0:
+            continue
+        ratio = result['median_us'] / reference['median_us']
+        if ratio > 1 + threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main() -> None:  # pragma: no cover
+    logging.basicConfig(level=logging.INFO,
+                        format=f'[%(levelname)s] {path.basename(__file__)} %(funcName)s: \n%(message)s')
+
+    parser = argparse.ArgumentParser(description='Benchmark the kinematics, coordinate, encoding and parsing paths.')
+    parser.add_argument('-k', '--select', type=str, nargs='+', default=None,
+                        help='Only run benchmarks whose name contains one of these.')
+    parser.add_argument('-n', '--repeats', type=int, default=15, help='Timed batches per benchmark.')
+    parser.add_argument('-s', '--save', type=str, default=None, help='Write the results to a JSON baseline.')
+    parser.add_argument('-c', '--compare', type=str, default=None, help='JSON baseline to compare against.')
+    parser.add_argument('-t', '--threshold', type=float, default=0.1,
+                        help='Relative slowdown of the median flagged as a regression.')
+    arguments = parser.parse_args()
+
+    current = run_suite(arguments.select, arguments.repeats)
+    if arguments.save is not None:
+        with open(arguments.save, 'w') as f:
+            json.dump(current, f, indent=1, sort_keys=True)
+        log.info(f'Baseline written to {arguments.save}.')
+
+    if arguments.compare is not None:
+        with open(arguments.compare) as f:
+            baseline = json.load(f)
+        if baseline.get('python') != current['python'] or baseline.get('machine') != current['machine']:
+            log.warning(f"Baseline is from Python {baseline.get('python')} on {baseline.get('machine')}.")
+        regressions = compare(baseline, current, arguments.threshold)
+        for name, ratio in regressions:
+            log.error(f'{name} is {100 * (ratio - 1):.0f} % slower than the baseline.')
+        if regressions:
+            sys.exit(1)
+        log.info(f'No regression beyond {100 * arguments.threshold:.0f} %.')
+
+
+if __name__ == '__main__':
+    main()
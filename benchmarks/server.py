@@ -0,0 +1,100 @@
+#! /usr/bin/env python3
+import sys
+import logging
+import argparse
+import tempfile
+import numpy as np
+from os import path
+from threading import Barrier, Thread
+from time import perf_counter
+from typing import Dict, List
+
+ROOT_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from ArmServer import Address, ArmClient, ArmServer  # noqa: E402
+from RobotArm import RobotArm  # noqa: E402
+
+log = logging.getLogger('ServerBenchmark')
+
+
+class NullSerial:
+    """ Serial port which accepts every write and never replies. """
+
+    def write(self, _data: bytes) -> None:
+        pass
+
+    def inWaiting(self) -> int:
+        return 0
+
+
+def run_clients(address: Address, clients: int, requests: int, moves: bool) -> Dict[str, float]:
+    """
+        Send requests from several client threads at once.
+    :param address: Address of the running server.
+    :param clients: Number of concurrent connections.
+    :param requests: Requests per client.
+    :param moves: Send joint moves, which the server serializes, instead of state queries.
+    :return: Aggregate request rate and latency percentiles in microseconds.
+    """
+    latencies: List[np.ndarray] = []
+    barrier = Barrier(clients + 1)
+
+    def client_loop() -> None:
+        times = np.empty(requests)
+        with ArmClient(address) as client:
+            barrier.wait()
+            for index in range(requests):
+                start = perf_counter()
+                if moves:
+                    client.move({'base': float(index % 2)}, 100)
+                else:
+                    client.state()
+                times[index] = perf_counter() - start
+        latencies.append(times)
+
+    threads = [Thread(target=client_loop) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+
+    microseconds = 1e6 * np.concatenate(latencies)
+    return {'rate_hz': clients * requests / elapsed,
+            'p50_us': float(np.percentile(microseconds, 50)),
+            'p99_us': float(np.percentile(microseconds, 99)),
+            'max_us': float(microseconds.max())}
+
+
+def main() -> None:  # pragma: no cover
+    logging.basicConfig(level=logging.INFO,
+                        format=f'[%(levelname)s] {path.basename(__file__)} %(funcName)s: \n%(message)s')
+
+    parser = argparse.ArgumentParser(description='Measure the request rate and latency of the arm server.')
+    parser.add_argument('-c', '--clients', type=int, nargs='+', default=[1, 4, 16], help='Concurrent clients.')
+    parser.add_argument('-n', '--requests', type=int, default=2000, help='Requests per client.')
+    parser.add_argument('--tcp', action='store_true', help='Serve on localhost TCP instead of a Unix socket.')
+    arguments = parser.parse_args()
+
+    arm = RobotArm()
+    arm.serial_factory = lambda *_args: NullSerial()
+    with tempfile.TemporaryDirectory() as directory:
+        address: Address = ('127.0.0.1', 0) if arguments.tcp else path.join(directory, 'arm.sock')
+        server = ArmServer(arm, address, telemetry_hz=0)
+        server.start()
+        try:
+            for moves in (False, True):
+                for clients in arguments.clients:
+                    result = run_clients(server.address, clients, arguments.requests, moves)
+                    log.info(f"{'move' if moves else 'state':<6s}{clients:3d} clients  "
+                             f"{result['rate_hz']:9.0f} requests/s  p50 {result['p50_us']:7.1f} us  "
+                             f"p99 {result['p99_us']:7.1f} us  max {result['max_us']:8.1f} us")
+        finally:
+            server.stop()
+
+
+if __name__ == '__main__':
+    main()
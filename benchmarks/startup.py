@@ -0,0 +1,70 @@
+#! /usr/bin/env python3
+import os
+import sys
+import logging
+import argparse
+import subprocess
+from os import path
+from time import perf_counter
+from statistics import median
+from typing import Dict, List
+
+ROOT_DIR = path.dirname(path.dirname(path.abspath(__file__)))
+
+log = logging.getLogger('StartupBenchmark')
+
+# Each entry point is imported and constructed, but never runs its loop. No serial device is needed:
+# the port is only opened on first use.
+entry_points: Dict[str, str] = {
+    'interpreter': 'pass',
+    'robot_session': 'from robot_session import RobotSession; RobotSession()',
+    'MotionRecorder': 'from MotionRecorder import MotionRecorder; MotionRecorder()',
+}
+
+
+def time_startup(code: str, repeats: int = 5) -> List[float]:
+    """
+        Time fresh interpreters running code from the repository root.
+    :param code: Python source to run.
+    :param repeats: Number of interpreters to start.
+    :return: Wall-clock time of each run in seconds.
+    """
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT_DIR, environment.get('PYTHONPATH')]))
+    times = []
+    for _ in range(repeats):
+        start = perf_counter()
+        subprocess.run([sys.executable, '-c', code], cwd=ROOT_DIR, env=environment, check=True,
+                       stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        times.append(perf_counter() - start)
+    return times
+
+
+def main() -> None:  # pragma: no cover
+    logging.basicConfig(level=logging.INFO,
+                        format=f'[%(levelname)s] {path.basename(__file__)} %(funcName)s: \n%(message)s')
+
+    parser = argparse.ArgumentParser(description='Measure the startup time of the entry points against a budget.')
+    parser.add_argument('-n', '--repeats', type=int, default=5, help='Interpreters started per entry point.')
+    parser.add_argument('-b', '--budget', type=float, default=1.5,
+                        help='Largest allowed median startup time in seconds, interpreter included.')
+    arguments = parser.parse_args()
+
+    # One untimed run per entry point, so compiling the bytecode is not counted.
+    for code in entry_points.values():
+        time_startup(code, 1)
+
+    over_budget = []
+    for name, code in entry_points.items():
+        times = time_startup(code, arguments.repeats)
+        log.info(f'{name:<16s} median {1000 * median(times):7.1f} ms  min {1000 * min(times):7.1f} ms')
+        if median(times) > arguments.budget:
+            over_budget.append(name)
+
+    if over_budget:
+        log.error(f'Over the {arguments.budget} s budget: {", ".join(over_budget)}')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -21,3 +21,8 @@ motor_names = ['', ] + [name for name, _ in sorted(motor_ids.items(), key=lambda
 shoulder_to_elbow: float = 9.8
 elbow_to_wrist: float = 9.8
 wrist_to_fingers: float = 16.3
+
+# Table and base geometry, relative to the shoulder pivot (same units as the link lengths).
+# Estimates, not yet measured on the arm: collision checking stays opt-in until they are.
+shoulder_height: float = 7.0
+base_radius: float = 5.0
@@ -0,0 +1,261 @@
+#! /usr/bin/env python3
+import json
+import struct
+import hashlib
+import logging
+import argparse
+from functools import lru_cache
+from os import path, makedirs
+from time import monotonic, sleep
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import packetmaker as pk
+import robot_kinematics
+from Point import Point
+from PlaybackScheduler import PlaybackScheduler
+from RobotState import RobotState, safe_ranges
+from definitions import motor_names, shoulder_to_elbow, elbow_to_wrist, wrist_to_fingers
+from robot_kinematics import get_pose_for_target_analytical, approach_point_from_angle
+
+log = logging.getLogger('MotionCompiler')
+
+compiled_magic = b'XACM'
+compiled_version = 1
+header_format = '<4sBI32s'    # magic, version, frame count, program hash
+frame_format = '<IB'           # timestamp in ms, frame length
+
+
+class MotionStep(NamedTuple):
+    """ A single instruction of a motion program. """
+    kind: str                                   # One of 'point', 'approach' or 'joints'.
+    target: Tuple[float, ...]                   # Cartesian point, or the angles of the joints named in motors.
+    time_ms: int
+    angle: float = 0.0
+    offset: float = 0.0
+    fingers: Optional[float] = None
+    hand: Optional[float] = None
+    motors: Tuple[str, ...] = ()                # Joints moved by a 'joints' step, in motor_names[1:] order.
+
+    @classmethod
+    def point(cls, point: Point, time_ms: int,
+              fingers: Optional[float] = None, hand: Optional[float] = None) -> 'MotionStep':
+        """ Move the fingers to a point in space. """
+        return cls('point', tuple(float(value) for value in point.cartesian), int(time_ms), fingers=fingers, hand=hand)
+
+    @classmethod
+    def approach(cls, point: Point, angle: float, time_ms: int, offset: float = 0.0,
+                 fingers: Optional[float] = None, hand: Optional[float] = None) -> 'MotionStep':
+        """ Approach a point in space from an angle with respect to the horizontal plane. """
+        return cls('approach', tuple(float(value) for value in point.cartesian), int(time_ms),
+                   angle=float(angle), offset=float(offset), fingers=fingers, hand=hand)
+
+    @classmethod
+    def joints(cls, degrees_dict: Dict[str, float], time_ms: int) -> 'MotionStep':
+        """ Move to explicit joint angles. Motors missing from degrees_dict hold their position. """
+        motors = tuple(motor for motor in motor_names[1:] if motor in degrees_dict)
+        return cls('joints', tuple(float(degrees_dict[motor]) for motor in motors), int(time_ms), motors=motors)
+
+
+class CompiledMotion:
+    """ Pre-encoded servo frames with their offsets from the start of the motion. """
+
+    def __init__(self, frames: Sequence[Tuple[int, bytes]], program_hash: bytes = bytes(32)) -> None:
+        self.frames: List[Tuple[int, bytes]] = list(frames)
+        self.program_hash: bytes = program_hash
+        # Deadlines are precomputed so playback does nothing but wait and write.
+        self.schedule: List[Tuple[float, bytes]] = [(timestamp_ms / 1000, frame) for timestamp_ms, frame in self.frames]
+
+    def __len__(self) -> int:
+        return len(self.frames)
+
+    def __eq__(self, other) -> bool:  # type: ignore
+        return self.frames == other.frames and self.program_hash == other.program_hash
+
+    @property
+    def duration_ms(self) -> int:
+        """ Timestamp of the last frame. The final move itself lasts a further step duration. """
+        return self.frames[-1][0] if self.frames else 0
+
+    def to_bytes(self) -> bytes:
+        """ Serialize the compiled frames into the binary artefact format. """
+        chunks = [struct.pack(header_format, compiled_magic, compiled_version, len(self.frames), self.program_hash)]
+        for timestamp_ms, frame in self.frames:
+            chunks.append(struct.pack(frame_format, timestamp_ms, len(frame)))
+            chunks.append(frame)
+        return b''.join(chunks)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'CompiledMotion':
+        """ Deserialize a binary artefact produced by to_bytes. """
+        magic, version, frame_count, program_hash = struct.unpack_from(header_format, data)
+        if magic != compiled_magic or version != compiled_version:
+            raise ValueError(f'Not a compiled motion (version {compiled_version}): {magic!r} v{version}')
+
+        frames: List[Tuple[int, bytes]] = []
+        cursor = struct.calcsize(header_format)
+        for _ in range(frame_count):
+            timestamp_ms, frame_length = struct.unpack_from(frame_format, data, cursor)
+            cursor += struct.calcsize(frame_format)
+            frames.append((timestamp_ms, bytes(data[cursor:cursor + frame_length])))
+            cursor += frame_length
+        return cls(frames, program_hash)
+
+    def save(self, filename: str) -> None:
+        with open(filename, 'wb') as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, filename: str) -> 'CompiledMotion':
+        with open(filename, 'rb') as f:
+            return cls.from_bytes(f.read())
+
+
+@lru_cache(maxsize=1)
+def compiler_token() -> str:
+    """ Digest of the source of the code that solves and encodes steps, so cached programs follow its changes. """
+    digest = hashlib.sha256()
+    for module_file in (__file__, robot_kinematics.__file__, pk.__file__):
+        with open(module_file, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def hash_program(program: Sequence[MotionStep], initial_state: RobotState) -> bytes:
+    """
+        Hash a program together with everything the compiled frames depend on.
+    :param program: Sequence of motion steps.
+    :param initial_state: State of the arm at the start of the program.
+    :return: SHA-256 digest.
+    """
+    description = repr((compiled_version, compiler_token(), [tuple(step) for step in program],
+                        sorted(vars(initial_state).items()), sorted(safe_ranges.items()),
+                        shoulder_to_elbow, elbow_to_wrist, wrist_to_fingers))
+    return hashlib.sha256(description.encode()).digest()
+
+
+def solve_step(step: MotionStep, current_state: RobotState) -> Optional[RobotState]:
+    """
+        Run the inverse kinematics of a single step.
+    :param step: Motion step to solve.
+    :param current_state: State the arm is in before the step. Supplies the defaults for hand and fingers.
+    :return: Computed RobotState, or None if there is no solution.
+    """
+    fingers = current_state['fingers'] if step.fingers is None else step.fingers
+    hand = current_state['hand'] if step.hand is None else step.hand
+
+    if step.kind == 'point':
+        computed_state = get_pose_for_target_analytical(Point(cartesian=step.target))
+        if computed_state is not None:
+            vars(computed_state).update(fingers=fingers, hand=hand)
+        return computed_state
+    elif step.kind == 'approach':
+        return approach_point_from_angle(Point(cartesian=step.target), step.angle, step.offset, fingers, hand)
+    elif step.kind == 'joints':
+        degrees_dict = dict(vars(current_state))
+        degrees_dict.update(zip(step.motors, step.target))
+        return RobotState(degrees_dict)
+    raise ValueError(f'Motion step kind not recognized: {step.kind}')
+
+
+def compile_program(program: Sequence[MotionStep], initial_state: Optional[RobotState] = None,
+                    cache_dir: Optional[str] = None) -> CompiledMotion:
+    """
+        Solve, check and encode a whole motion program ahead of time.
+    :param program: Sequence of motion steps.
+    :param initial_state: State of the arm at the start of the program. (Defaults to the upright position.)
+    :param cache_dir: Directory of previously compiled programs, keyed by program hash.
+    :return: CompiledMotion holding one frame per step.
+    """
+    current_state = RobotState(dict(vars(initial_state))) if initial_state is not None else RobotState()
+    program_hash = hash_program(program, current_state)
+
+    cache_file = path.join(cache_dir, program_hash.hex() + '.xacm') if cache_dir else None
+    if cache_file and path.isfile(cache_file):
+        log.debug(f'Loaded compiled program from cache: {cache_file}')
+        return CompiledMotion.load(cache_file)
+
+    frames: List[Tuple[int, bytes]] = []
+    timestamp_ms = 0
+    for index, step in enumerate(program):
+        computed_state = solve_step(step, current_state)
+        if (computed_state is None) or (not computed_state.is_state_safe()):
+            raise ValueError(f'Step {index} of the motion program has no safe solution: {step}')
+        frames.append((timestamp_ms, pk.write_servo_move(vars(computed_state), step.time_ms)))
+        timestamp_ms += step.time_ms
+        current_state = computed_state
+
+    compiled = CompiledMotion(frames, program_hash)
+    if cache_file and cache_dir:
+        makedirs(cache_dir, exist_ok=True)
+        compiled.save(cache_file)
+    return compiled
+
+
+def play_compiled(send: Callable[[bytes], None], compiled: CompiledMotion,
+                  clock: Callable[[], float] = monotonic, wait: Callable[[float], None] = sleep,
+                  spin_s: float = 0.0, origin: Optional[float] = None) -> PlaybackScheduler:
+    """
+        Emit pre-encoded frames at their offsets from a monotonic start time.
+    :param send: Function which writes a frame to the arm. (Usually RobotArm.send)
+    :param compiled: Compiled motion to play.
+    :param clock: Monotonic clock in seconds.
+    :param wait: Function which sleeps for a number of seconds.
+    :param spin_s: Final stretch before each frame spent busy-waiting.
+    :param origin: Clock time of the start. (Defaults to now.)
+    :return: The scheduler, holding the lateness statistics of the playback.
+    """
+    scheduler = PlaybackScheduler(spin_s, clock=clock, wait=wait)
+    scheduler.run(compiled.schedule, send, origin=origin)
+    return scheduler
+
+
+def load_program(filename: str) -> List[MotionStep]:
+    """
+        Read a motion program from a JSON file: a list of objects such as
+            {"point": [x, y, z], "time": 1000, "fingers": 20}
+            {"approach": [x, y, z], "angle": 30, "offset": 2, "time": 1000}
+            {"joints": {"base": 10, "elbow": 45}, "time": 500}
+    :param filename: Path of the program file.
+    :return: List of motion steps.
+    """
+    with open(filename) as f:
+        entries: List[Dict[str, Any]] = json.load(f)
+
+    program: List[MotionStep] = []
+    for entry in entries:
+        time_ms = int(entry.get('time', 1000))
+        if 'point' in entry:
+            program.append(MotionStep.point(Point(cartesian=entry['point']), time_ms,
+                                            entry.get('fingers'), entry.get('hand')))
+        elif 'approach' in entry:
+            program.append(MotionStep.approach(Point(cartesian=entry['approach']), entry.get('angle', 0.0), time_ms,
+                                               entry.get('offset', 0.0), entry.get('fingers'), entry.get('hand')))
+        elif 'joints' in entry:
+            program.append(MotionStep.joints(entry['joints'], time_ms))
+        else:
+            raise ValueError(f'Motion program entry not recognized: {entry}')
+    return program
+
+
+def main() -> None:  # pragma: no cover
+    logging.basicConfig(level=logging.INFO,
+                        format=f'[%(levelname)s] {path.basename(__file__)} %(funcName)s: \n%(message)s')
+
+    parser = argparse.ArgumentParser(description='Compile motion programs into pre-encoded frames.')
+    parser.add_argument('program', type=str, help='JSON motion program to compile.')
+    parser.add_argument('-o', '--output', type=str, default=None, help='Filename of the compiled motion.')
+    parser.add_argument('-c', '--cache', type=str, default=None, help='Directory of cached compiled programs.')
+    parser.add_argument('-p', '--play', action='store_true', help='Play the compiled motion on the arm.')
+    arguments = parser.parse_args()
+
+    compiled = compile_program(load_program(arguments.program), cache_dir=arguments.cache)
+    log.info(f'Compiled {len(compiled)} frames lasting {compiled.duration_ms} ms.')
+    if arguments.output is not None:
+        compiled.save(arguments.output)
+    if arguments.play:
+        from RobotArm import RobotArm
+        play_compiled(RobotArm().send, compiled)
+
+
+if __name__ == '__main__':
+    main()
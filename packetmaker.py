@@ -1,6 +1,7 @@
 from functools import wraps
 from typing import Any, Callable, Dict, List
 
+from Metrics import timed
 from definitions import commands, motor_ids, motor_names
 from robot_utils import *
 
@@ -15,6 +16,7 @@ def with_header(func: Callable[..., bytes]) -> Callable:
     return decorator
 
 
+@timed('packetmaker.write_servo_move')
 @with_header
 def write_servo_move(degree_dict: Dict[str, float], time_ms: int) -> bytes:
     """
@@ -33,6 +35,7 @@ def write_servo_move(degree_dict: Dict[str, float], time_ms: int) -> bytes:
     return bytes(command)
 
 
+@timed('packetmaker.write_servo_unlock')
 @with_header
 def write_servo_unlock(joint_list: List[str] = motor_names[1:]) -> bytes:
     """
@@ -45,6 +48,7 @@ def write_servo_unlock(joint_list: List[str] = motor_names[1:]) -> bytes:
     return bytes(command)
 
 
+@timed('packetmaker.write_request_positions')
 @with_header
 def write_request_positions(joint_list: List[str] = motor_names[1:]) -> bytes:
     """
@@ -55,3 +59,37 @@ def write_request_positions(joint_list: List[str] = motor_names[1:]) -> bytes:
     command = [len(joint_list) + 3, commands.read_multiple_servo_positions, len(joint_list)]
     command += [motor_ids[joint] for joint in joint_list]
     return bytes(command)
+
+
+@with_header
+def write_run_action_group(group: int, times: int = 1) -> bytes:
+    """
+        Writes the command which runs an action group stored on the controller.
+    :param group: Number of the action group.
+    :param times: Number of repetitions. (Zero repeats until stopped.)
+    :return: String of bytes.
+    """
+    command = [5, commands.run_action_group, group, get_low_bits(times), get_high_bits(times)]
+    return bytes(command)
+
+
+@with_header
+def write_stop_action() -> bytes:
+    """
+        Writes the command which stops the running action group.
+    :return: String of bytes.
+    """
+    command = [2, commands.stop_action]
+    return bytes(command)
+
+
+@with_header
+def write_action_speed(group: int, speed_percent: int) -> bytes:
+    """
+        Writes the command which scales the playback speed of an action group.
+    :param group: Number of the action group. (0xFF applies to all groups.)
+    :param speed_percent: Playback speed in percent of the recorded speed.
+    :return: String of bytes.
+    """
+    command = [5, commands.action_speed, group, get_low_bits(speed_percent), get_high_bits(speed_percent)]
+    return bytes(command)
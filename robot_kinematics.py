@@ -3,8 +3,9 @@ from typing import Optional, Union
 import numpy as np
 
 from Point import Point
+from Metrics import timed
 from RobotState import RobotState
-from definitions import shoulder_to_elbow, wrist_to_fingers
+from definitions import motor_names, shoulder_to_elbow, elbow_to_wrist, wrist_to_fingers
 
 
 log = logging.getLogger('RobotKinematics')
@@ -15,6 +16,7 @@ def reachable(_target_point: Point) -> bool:
     return True
 
 
+@timed('kinematics.get_pose_for_target_analytical')
 def get_pose_for_target_analytical(target_point: Point) -> Optional[RobotState]:
     """
         This function returns a RobotState that will move the center of the closed
@@ -90,6 +92,7 @@ def get_pose_for_target_analytical(target_point: Point) -> Optional[RobotState]:
     return RobotState(degrees_dict)
 
 
+@timed('kinematics.approach_point_from_angle')
 def approach_point_from_angle(target_point: Point, approach_angle: Union[int, float], offset: float=0.0, finger_position: float=0.0, hand_position: float=None) -> Optional[RobotState]:
     """
         Calculates the robot state based upon the target target_point and the angle of approach.
@@ -132,6 +135,31 @@ def approach_point_from_angle(target_point: Point, approach_angle: Union[int, fl
     return RobotState(degrees_dict)
 
 
+def forward_kinematics(joints: np.ndarray) -> np.ndarray:
+    """
+        Computes the Cartesian position of every link endpoint for a batch of joint vectors.
+        Joint vectors hold degrees in motor_names[1:] order (the order of iterating over a RobotState).
+        Unlike RobotState.get_cartesian, heights below the shoulder pivot keep their sign.
+    :param joints: Array of shape (N, 6) or (6,).
+    :return: Array of shape (N, 4, 3): (x, y, z) of the shoulder pivot, elbow, wrist and finger tip.
+    """
+    joints = np.atleast_2d(np.asarray(joints, dtype=np.float64))
+    lengths = np.array([shoulder_to_elbow, elbow_to_wrist, wrist_to_fingers])
+    columns = [motor_names.index(motor) - 1 for motor in ('shoulder', 'elbow', 'wrist')]
+
+    # Link angles measured from upwards, accumulated along the chain.
+    radians = np.cumsum(np.deg2rad(joints[:, columns]), axis=1)
+    horizontal = np.cumsum(lengths * np.sin(radians), axis=1)
+    vertical = np.cumsum(lengths * np.cos(radians), axis=1)
+    polar = np.deg2rad(joints[:, motor_names.index('base') - 1] + 45)[:, np.newaxis]
+
+    endpoints = np.zeros((len(joints), 4, 3))
+    endpoints[:, 1:, 0] = horizontal * np.cos(polar)
+    endpoints[:, 1:, 1] = horizontal * np.sin(polar)
+    endpoints[:, 1:, 2] = vertical
+    return endpoints
+
+
 if __name__ == '__main__':
     print(approach_point_from_angle(Point(cartesian=(10, 10, 10)), 0.0))
     print(approach_point_from_angle(Point(cartesian=(-10, -10, 10)), 0.0))
@@ -1,20 +1,42 @@
 #! /usr/bin/env python3
 import sys
-import cmd2
+# cmd2 imports IPython, when installed, only to offer the ipy command, which RobotSession leaves disabled.
+# That import alone takes most of the startup time, so it is blocked while cmd2 loads, unless something
+# already loaded IPython. The block is lifted afterwards, so the rest of the process can still import it.
+ipython_blocked = 'IPython' not in sys.modules
+if ipython_blocked:
+    sys.modules['IPython'] = None  # type: ignore
+try:
+    import cmd2
+finally:
+    if ipython_blocked:
+        del sys.modules['IPython']
+import shlex
 import argparse
 import logging
 from os import path
 from time import sleep
-from typing import Any, Dict, IO, List, Union
-from cmd2 import Statement, with_argparser, with_category
+from typing import Any, Dict, IO, List, Optional, Tuple, Union, TYPE_CHECKING
+from cmd2 import Statement, plugin, with_argparser, with_category
 from argparse import ArgumentParser, Namespace
 
 from Point import Point
 from RobotArm import RobotArm
+from CollisionChecker import CollisionChecker
 
+from Monitor import Monitor
+from Metrics import registry
+from RobotState import RobotState
 from definitions import motor_names
 import packetmaker as pk
 
+if TYPE_CHECKING:  # pragma: no cover
+    from Profiler import CommandProfiler
+    from motion_compiler import CompiledMotion, MotionStep
+
+# Commands a batch script may contain.
+script_commands = ['move', 'move2point', 'approach', 'pick', 'place', 'unlock']
+
 
 class CreatePoint(argparse.Action):  # pragma: no cover
     def __init__(self, option_strings: str, dest: str, **kwargs: Any):
@@ -32,6 +54,60 @@ class CreatePoint(argparse.Action):  # pragma: no cover
             raise TypeError(f'Flag not recognized: {self.dest}')
 
 
+def expand_command(command: str, arguments: Namespace, state: RobotState) -> List['MotionStep']:
+    """
+        Translate a parsed session command into motion steps, following the moves RobotArm makes for it.
+    :param command: One of script_commands except unlock.
+    :param arguments: Arguments parsed by the command's parser.
+    :param state: State of the arm before the command.
+    :return: List of motion steps.
+    """
+    # The motion compiler is only needed by batch scripts, so it is imported on first use.
+    from motion_compiler import MotionStep
+    if command == 'move':
+        motors = {motor: getattr(arguments, motor) for motor in motor_names[1:]
+                  if getattr(arguments, motor) is not None}
+        if getattr(arguments, 'return'):
+            motors = {motor: 0.0 for motor in motor_names[1:]}
+        return [MotionStep.joints(motors, arguments.time)]
+    if command == 'move2point':
+        return [MotionStep.point(arguments.point, arguments.time, arguments.fingers, arguments.hand)]
+    if command == 'approach':
+        return [MotionStep.approach(arguments.point, arguments.angle, arguments.time, arguments.offset,
+                                    arguments.fingers, arguments.hand)]
+
+    # Same sequences as RobotArm.pick_at_point and RobotArm.place_at_point, whose pauses match the move times.
+    x, y, z = arguments.point.cartesian
+    above = Point(cartesian=[x, y, z + 2])
+    if command == 'pick':
+        start_x, start_y, start_z = state.get_cartesian()
+        fingers = state['fingers'] if arguments.fingers is None else arguments.fingers
+        return [MotionStep.point(Point(cartesian=[start_x, start_y, max(start_z, 5)]), 1000, hand=90),
+                MotionStep.point(above, 1000, fingers - 40, 90),
+                MotionStep.point(arguments.point, arguments.time, fingers - 40, 90),
+                MotionStep.point(arguments.point, 1000, fingers, 90),
+                MotionStep.point(above, 1000)]
+    if command == 'place':
+        return [MotionStep.point(above, arguments.time, hand=90),
+                MotionStep.point(arguments.point, 1000, hand=90),
+                MotionStep.point(arguments.point, 1000, state['fingers'] - 40, 90),
+                MotionStep.point(above, 1000)]
+    raise ValueError(f'Command not allowed in a script: {command}')
+
+
+def format_metrics(snapshot: Dict[str, Any], enabled: bool = True) -> str:
+    """ Render a metrics snapshot as a table. """
+    lines = [f'Metrics recording is {"on" if enabled else "off"}.']
+    if snapshot['histograms']:
+        lines.append(f'{"":<44s}{"count":>9s}{"mean":>10s}{"p50":>10s}{"p90":>10s}{"p99":>10s}{"max":>10s}  (us)')
+    for name, histogram in snapshot['histograms'].items():
+        lines.append(f'{name:<44s}{histogram["count"]:>9.0f}' + ''.join(
+            f'{histogram[key]:>10.1f}' for key in ('mean_us', 'p50_us', 'p90_us', 'p99_us', 'max_us')))
+    for name, value in snapshot['counters'].items():
+        lines.append(f'{name:<44s}{value:>9d}')
+    return '\n'.join(lines)
+
+
 class RobotSession(cmd2.Cmd):
     intro: str = 'xArm Session initiated. Enter <help> or <?> to list commands. \n'
     prompt: str = ' (xArm) '
@@ -61,16 +137,56 @@ class RobotSession(cmd2.Cmd):
     point_parser.add_argument('-f', '--fingers', nargs='?', type=float, default=None, help='Finger Position in degrees')
     point_parser.add_argument('--hand', nargs='?', type=float, default=None, help='Hand Position in degrees')
 
+    action_parser: ArgumentParser = ArgumentParser()
+    action_parser.add_argument('group', nargs='?', type=int, default=None, help='Number of the action group to run.')
+    action_parser.add_argument('-n', '--times', nargs='?', type=int, default=1, help='Repetitions. Zero loops forever.')
+    action_parser.add_argument('-s', '--speed', nargs='?', type=int, default=None, help='Speed in percent.')
+    action_parser.add_argument('--stop', action='store_true', help='Stop the running action group.')
+
+    batch_parser: ArgumentParser = ArgumentParser()
+    batch_parser.add_argument('script', type=str, help='File of session commands, one per line.')
+    batch_parser.add_argument('-n', '--dry-run', action='store_true', help='Report time and bytes without sending.')
+    batch_parser.add_argument('-s', '--spin', nargs='?', type=float, default=0.0,
+                              help='Busy-wait this many seconds before each frame for sub-millisecond timing.')
+
+    monitor_parser: ArgumentParser = ArgumentParser()
+    monitor_parser.add_argument('state', nargs='?', choices=['on', 'off'], default='on', help='Start or stop.')
+    monitor_parser.add_argument('-r', '--rate', nargs='?', type=float, default=20.0, help='Samples per second.')
+    monitor_parser.add_argument('--refresh', nargs='?', type=float, default=2.0, help='Screen updates per second.')
+
+    stats_parser: ArgumentParser = ArgumentParser()
+    stats_parser.add_argument('state', nargs='?', choices=['show', 'on', 'off', 'reset'], default='show',
+                              help='Show the metrics, enable or disable recording, or clear them.')
+
+    profile_parser: ArgumentParser = ArgumentParser()
+    profile_parser.add_argument('state', nargs='?', choices=['show', 'on', 'off', 'dump', 'reset'], default='show',
+                                help='Summarize, enable or disable profiling, write the profiles, or clear them.')
+    profile_parser.add_argument('-o', '--output', nargs='?', type=str, default='profiles',
+                                help='Directory the profiles are dumped to.')
+
     # ----------------------------------------------- Argument Parsers ----------------------------------------------- #
 
-    def __init__(self, stdin: IO = sys.stdin, stdout: IO = sys.stdout):
-        self.arm: RobotArm = RobotArm()
+    def __init__(self, stdin: IO = sys.stdin, stdout: IO = sys.stdout,
+                 collision_checker: Optional[CollisionChecker] = None):
+        self.arm: RobotArm = RobotArm(collision_checker=collision_checker)
         super().__init__(stdin=stdin, stdout=stdout)
         self.log: logging.Logger = logging.getLogger("RobotSession")
+        self.monitor: Optional[Monitor] = None
+        # Created by the first profile command, so cProfile is only imported once profiling is used.
+        self.profiler: Optional['CommandProfiler'] = None
+        self.register_precmd_hook(self.start_profile)
+        self.register_cmdfinalization_hook(self.stop_profile)
+
+    def postloop(self) -> None:  # pragma: no cover
+        self.stop_monitor()
 
     @with_category('xArm Commands')
     def do_poll(self, _statement: Statement) -> None:
         """ Poll the position of each motor. """
+        if self.monitor is not None:
+            # Telemetry owns the serial replies while the monitor runs, and keeps the state current.
+            print(self.arm.State)
+            return
         try:
             self.arm.request_positions()
             sleep(0.1)
@@ -95,6 +211,7 @@ class RobotSession(cmd2.Cmd):
 
         try:
             self.arm.send(pk.write_servo_move(degrees_dict, interval))
+            self.arm.publish_state()
         except RuntimeError:
             self.log.error('RuntimeError: Skipping move_to_point command.')
 
@@ -167,6 +284,242 @@ class RobotSession(cmd2.Cmd):
               f'  ({", ".join(motor_names[1:])})\n'
               f'The default is all motors.')
 
+    @with_category('xArm Commands')
+    @with_argparser(action_parser)
+    def do_action(self, arguments: Namespace) -> None:
+        """ Run or stop an action group stored on the controller. """
+        try:
+            if arguments.stop:
+                self.arm.stop_action()
+            elif arguments.group is not None:
+                self.arm.run_action_group(arguments.group, arguments.times, arguments.speed)
+            else:
+                self.log.error('Provide an action group number or --stop.')
+        except RuntimeError:
+            self.log.error('RuntimeError: Skipping action command.')
+
+    @staticmethod
+    def help_action() -> None:  # pragma: no cover
+        print(f'Run an action group stored on the controller. \n'
+              f'  First argument should be the number of the action group: \n'
+              f'    * GROUP \n'
+              f'  Optional arguments are repetitions (zero loops forever) and speed in percent: \n'
+              f'    * -n TIMES \n'
+              f'    * -s SPEED \n'
+              f'  Stop the running action group with: \n'
+              f'    * --stop')
+
+    @with_category('xArm Commands')
+    @with_argparser(batch_parser)
+    def do_batch(self, arguments: Namespace) -> None:
+        """ Run a script of session commands, validated and solved before anything is sent. """
+        try:
+            with open(arguments.script) as f:
+                steps = self.parse_script(f.read().splitlines())
+            compiled, final_state, duration_ms = self.compile_script(steps)
+        except (OSError, ValueError) as error:
+            self.log.error(f'Batch script rejected. Nothing was sent.\n{error}')
+            return
+
+        serial_bytes = sum(len(frame) for _timestamp, frame in compiled.frames)
+        print(f'{len(compiled)} frames, {duration_ms / 1000:.2f} s, {serial_bytes} serial bytes.')
+        if arguments.dry_run:
+            return
+
+        from motion_compiler import play_compiled
+        try:
+            scheduler = play_compiled(self.arm.send, compiled, spin_s=arguments.spin)
+            # Updated in place: a running monitor's telemetry holds the same State.
+            self.arm.State.update_state(vars(final_state))
+            self.log.info(f'Frame lateness (ms): {scheduler.stats()}')
+        except RuntimeError:
+            self.log.error('RuntimeError: Skipping batch command.')
+
+    @staticmethod
+    def help_batch() -> None:  # pragma: no cover
+        print(f'Run a script of session commands without stopping between them. \n'
+              f'  First argument should be the script, one command per line ("#" starts a comment): \n'
+              f'    * SCRIPT \n'
+              f'  Allowed commands: {", ".join(script_commands)} \n'
+              f'  Report the estimated time and serial bytes without moving: \n'
+              f'    * -n')
+
+    def parse_script(self, lines: List[str]) -> List[Tuple[int, str, Namespace]]:
+        """
+            Parse every line of a script with the parser of its command.
+        :param lines: Lines of the script.
+        :return: List of (line number, command, parsed arguments).
+        :raises ValueError: Listing every line that does not parse.
+        """
+        parsers = {'move': self.motor_parser, 'move2point': self.point_parser, 'approach': self.point_parser,
+                   'pick': self.point_parser, 'place': self.point_parser}
+        commands: List[Tuple[int, str, Namespace]] = []
+        errors: List[str] = []
+        for number, line in enumerate(lines, 1):
+            words = shlex.split(line, comments=True)
+            if not words:
+                continue
+            command, args = words[0], words[1:]
+            if command not in script_commands:
+                errors.append(f'Line {number}: command <{command}> not allowed in a script.')
+            elif command == 'unlock':
+                if not all(motor in motor_names[1:] for motor in args):
+                    errors.append(f'Line {number}: unlock takes motors among {motor_names[1:]}.')
+                commands.append((number, command, Namespace(motors=args or motor_names[1:])))
+            else:
+                try:
+                    arguments = parsers[command].parse_args(args)
+                except SystemExit:
+                    errors.append(f'Line {number}: invalid arguments: {line.strip()}')
+                    continue
+                if command != 'move' and getattr(arguments, 'point', None) is None:
+                    errors.append(f'Line {number}: {command} needs --cart, --cyl or --sphere.')
+                    continue
+                commands.append((number, command, arguments))
+        if errors:
+            raise ValueError('\n'.join(errors))
+        return commands
+
+    def compile_script(self, commands: List[Tuple[int, str, Namespace]]) -> Tuple['CompiledMotion', RobotState, int]:
+        """
+            Solve the inverse kinematics of the whole script, check every pose and move, and encode the frames.
+        :param commands: Output of parse_script.
+        :return: Tuple (frames scheduled back to back, state of the arm at the end, total time in ms).
+        :raises ValueError: Listing every unsafe or colliding step.
+        """
+        from motion_compiler import CompiledMotion, solve_step
+        state = RobotState(dict(vars(self.arm.State)))
+        frames: List[Tuple[int, bytes]] = []
+        errors: List[str] = []
+        timestamp_ms = 0
+        for number, command, arguments in commands:
+            if command == 'unlock':
+                frames.append((timestamp_ms, pk.write_servo_unlock(arguments.motors)))
+                continue
+            for step in expand_command(command, arguments, state):
+                computed_state = solve_step(step, state)
+                if computed_state is None or not computed_state.is_state_safe():
+                    errors.append(f'Line {number}: {command} has no safe solution.')
+                    break
+                if self.arm.collision_checker is not None and \
+                        self.arm.collision_checker.check_move(state, computed_state) is not None:
+                    errors.append(f'Line {number}: {command} collides with its surroundings.')
+                    break
+                frames.append((timestamp_ms, pk.write_servo_move(vars(computed_state), step.time_ms)))
+                timestamp_ms += step.time_ms
+                state = computed_state
+        if errors:
+            raise ValueError('\n'.join(errors))
+        return CompiledMotion(frames), state, timestamp_ms
+
+    @with_category('xArm Commands')
+    @with_argparser(monitor_parser)
+    def do_monitor(self, arguments: Namespace) -> None:
+        """
+            Stream joint angles and the tip position in the background while the prompt stays usable.
+            Commands keep writing to the port meanwhile: RobotArm.io_lock keeps their frames whole, and
+            poll reads the state telemetry keeps current instead of reading replies itself.
+        """
+        self.stop_monitor()
+        if arguments.state == 'off':
+            return
+        self.monitor = Monitor(self.arm.start_telemetry(arguments.rate), self.render_monitor, arguments.refresh)
+        self.monitor.start()
+
+    @staticmethod
+    def help_monitor() -> None:  # pragma: no cover
+        print(f'Stream joint angles, tip position, sample rate and reply latency above the prompt. \n'
+              f'  First argument starts or stops the monitor: \n'
+              f'    * on | off \n'
+              f'  Optional arguments are samples per second and screen updates per second: \n'
+              f'    * -r RATE \n'
+              f'    * --refresh RATE')
+
+    def render_monitor(self, text: str) -> bool:
+        """ Print text above the prompt. Skipped while a command holds the terminal. """
+        if not self.terminal_lock.acquire(blocking=False):
+            return False
+        try:
+            self.async_alert(text)
+        finally:
+            self.terminal_lock.release()
+        return True
+
+    def stop_monitor(self) -> None:
+        if self.monitor is None:
+            return
+        self.monitor.stop()
+        self.arm.stop_telemetry()
+        self.log.info(f'Monitor stopped. Telemetry: {self.monitor.telemetry.stats()}')
+        self.monitor = None
+
+    @with_category('xArm Commands')
+    @with_argparser(stats_parser)
+    def do_stats(self, arguments: Namespace) -> None:
+        """ Show call latencies and counters of the serial link, packet encoding and kinematics. """
+        if arguments.state == 'on':
+            registry.enabled = True
+        elif arguments.state == 'off':
+            registry.enabled = False
+        elif arguments.state == 'reset':
+            registry.reset()
+        else:
+            print(format_metrics(registry.snapshot(), registry.enabled))
+
+    @staticmethod
+    def help_stats() -> None:  # pragma: no cover
+        print(f'Show latency histograms and counters of the arm. \n'
+              f'  Recording is off until enabled: \n'
+              f'    * stats on | off \n'
+              f'  Clear every metric with: \n'
+              f'    * stats reset')
+
+    @with_category('xArm Commands')
+    @with_argparser(profile_parser)
+    def do_profile(self, arguments: Namespace) -> None:
+        """ Profile each command while on, accumulating over every run of the same command. """
+        if self.profiler is None:
+            from Profiler import CommandProfiler
+            self.profiler = CommandProfiler()
+        if arguments.state == 'on':
+            self.profiler.enabled = True
+        elif arguments.state == 'off':
+            self.profiler.enabled = False
+        elif arguments.state == 'reset':
+            self.profiler.reset()
+        elif arguments.state == 'dump':
+            for filename in self.profiler.dump(arguments.output):
+                print(f'Wrote {filename}.')
+        else:
+            print(f'Profiling is {"on" if self.profiler.enabled else "off"}.\n{self.profiler.summary()}'.rstrip())
+
+    @staticmethod
+    def help_profile() -> None:  # pragma: no cover
+        print(f'Profile every command run while profiling is on. \n'
+              f'    * profile on | off \n'
+              f'  Show the slowest functions of each command: \n'
+              f'    * profile \n'
+              f'  Write <command>.prof for pstats and snakeviz, and <command>.folded for flamegraph.pl: \n'
+              f'    * profile dump [-o DIRECTORY] \n'
+              f'  Clear the profiles with: \n'
+              f'    * profile reset')
+
+    def start_profile(self, data: plugin.PrecommandData) -> plugin.PrecommandData:
+        if self.profiler is not None and data.statement.command != 'profile':
+            self.profiler.start(data.statement.command)
+        return data
+
+    def stop_profile(self, data: plugin.CommandFinalizationData) -> plugin.CommandFinalizationData:
+        if self.profiler is not None:
+            self.profiler.stop()
+        return data
+
+    @with_category('xArm Commands')
+    def do_trace(self, statement: Statement) -> None:
+        """ Dump the recent serial frames to a file. Decode it with PacketTrace.py. """
+        filename = self.arm.dump_trace(statement.args.strip() or None)
+        print(f'Packet trace written to {filename}.')
+
     def do_eof(self, _statement: Statement) -> bool:  # pragma: no cover
         """ Exit CLI. """
         print()
@@ -221,8 +574,16 @@ class RobotSession(cmd2.Cmd):
 def main() -> None:  # pragma: no cover
     logging.basicConfig(level=logging.INFO,
                         format=f'[%(levelname)s] {path.basename(__file__)} %(funcName)s: \n%(message)s')
+
+    parser = argparse.ArgumentParser(description='Interactive xArm session.')
+    parser.add_argument('-c', '--collisions', action='store_true',
+                        help='Reject moves which hit the table or the base. Uses the estimated geometry of definitions.')
+    arguments, commands = parser.parse_known_args()
+    # Any other arguments are left for cmd2, which runs them as commands at startup.
+    sys.argv = sys.argv[:1] + commands
+
     try:
-        RobotSession().cmdloop()
+        RobotSession(collision_checker=CollisionChecker() if arguments.collisions else None).cmdloop()
     except KeyboardInterrupt:
         print()
 
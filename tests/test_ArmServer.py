@@ -0,0 +1,143 @@
+import os
+import math
+import mock
+import tempfile
+import unittest
+from threading import Thread
+
+import packetmaker as pk
+from ArmServer import ArmClient, ArmServer, error, ok, opcodes, parse_address, request_formats, state_format
+from Point import Point
+from RobotArm import RobotArm
+from CollisionChecker import CollisionChecker
+
+
+class RecordingSerial:
+    def __init__(self, _port, _baud_rate):
+        self.writes = []
+
+    def write(self, data):
+        self.writes.append(data)
+
+    def inWaiting(self):
+        return 0
+
+
+@mock.patch('RobotArm.open_serial', side_effect=RecordingSerial)
+class TestArmServer(unittest.TestCase):
+    def test_dispatch(self, _mocked_serial):
+        """ Test that requests are decoded, checked and answered with the state or an error. """
+        # Arrange
+        server = ArmServer(RobotArm(), '/unused', telemetry_hz=0)
+        move = request_formats[opcodes.move]
+
+        # Act
+        status, reply = server.dispatch(opcodes.move, move.pack(0b000010, 0, 25.0, 0, 0, 0, 0, 500))
+        unsafe_status, unsafe_reply = server.dispatch(opcodes.move, move.pack(0b001000, 0, 0, 0, 119.0, 0, 0, 500))
+        unknown_status, _ = server.dispatch(99, b'')
+        short_status, short_reply = server.dispatch(opcodes.move, b'\x00')
+
+        # Assert
+        self.assertEqual(ok, status)
+        joints = state_format.unpack(reply)[:6]
+        self.assertEqual([0.0, 25.0, 0.0, 0.0, 0.0, 0.0], list(joints))
+        self.assertTrue(math.isnan(state_format.unpack(reply)[6]))
+        self.assertEqual([pk.write_servo_move(dict(server.arm.State.items()), 500)], server.arm.Ser.writes)
+        self.assertEqual((error, b'Target is unsafe or collides. Not sending.'), (unsafe_status, unsafe_reply))
+        self.assertEqual(error, unknown_status)
+        self.assertEqual((error, b'Opcode 2 takes 29 bytes, got 1.'), (short_status, short_reply))
+        self.assertEqual(4, server.requests)
+
+    def test_clients(self, _mocked_serial):
+        """ Test that concurrent clients on a Unix socket are all served, with motion commands in sequence. """
+        # Arrange
+        directory = tempfile.TemporaryDirectory()
+        address = os.path.join(directory.name, 'arm.sock')
+        server = ArmServer(RobotArm(), address, telemetry_hz=0)
+        server.start()
+        states = []
+
+        def client_session():
+            with ArmClient(address) as client:
+                for _ in range(50):
+                    states.append(client.state())
+                client.unlock(['base'])
+
+        # Act
+        threads = [Thread(target=client_session) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with ArmClient(address) as client:
+            client.ping()
+            client.move({'elbow': 30.0}, 200)
+            with self.assertRaises(RuntimeError):
+                client.approach(Point(cartesian=(-10, -10, -5)), 0.0, 200)
+            final = client.state()
+        server.stop()
+        directory.cleanup()
+
+        # Assert
+        self.assertEqual(200, len(states))
+        self.assertEqual(0.0, states[0]['joints']['base'])
+        self.assertIsNone(states[0]['age_s'])
+        writes = server.arm.Ser.writes
+        self.assertEqual([pk.write_servo_unlock(['base'])] * 4, writes[:4])
+        self.assertEqual(30.0, final['joints']['elbow'])
+        self.assertFalse(os.path.exists(address))
+
+    def test_rejected_targets(self, _mocked_serial):
+        """ Test that reachable targets which are unsafe or collide are answered with an error and not sent. """
+        # Arrange
+        checker = CollisionChecker()
+        checker.add_box([9, 9, 4], [11, 11, 6])
+        server = ArmServer(RobotArm(checker), '/unused', telemetry_hz=0)
+        move2point, approach = request_formats[opcodes.move2point], request_formats[opcodes.approach]
+        nan = float('nan')
+
+        # Act
+        colliding = server.dispatch(opcodes.move2point, move2point.pack(10, 10, 5, 500, nan, nan))
+        unsafe = server.dispatch(opcodes.approach, approach.pack(-10, -10, -5, 0, 500, 0, nan, nan))
+        checker.boxes.clear()
+        status, reply = server.dispatch(opcodes.move2point, move2point.pack(10, 10, 5, 500, nan, nan))
+
+        # Assert
+        self.assertEqual((error, b'Target is unsafe or collides. Not sending.'), colliding)
+        self.assertEqual((error, b'Target is unsafe or collides. Not sending.'), unsafe)
+        self.assertEqual(ok, status)
+        self.assertEqual(1, len(server.arm.Ser.writes))
+        for expect, coordinate in zip((10, 10, 5), server.arm.State.get_cartesian()):
+            self.assertAlmostEqual(expect, coordinate, places=3)
+
+    def test_pick_and_place(self, _mocked_serial):
+        """ Test that pick and place send every waypoint without holding the motion lock between moves,
+            and that a rejected waypoint is answered with an error before anything is sent. """
+        # Arrange
+        server = ArmServer(RobotArm(), '/unused', telemetry_hz=0)
+        pick, place = request_formats[opcodes.pick], request_formats[opcodes.place]
+        # Straight up, the arm is at the edge of its reach, where the start of a pick has no solution.
+        server.dispatch(opcodes.move2point, request_formats[opcodes.move2point].pack(5, 5, 10, 500, 0, 0))
+        locked_while_waiting = []
+
+        # Act
+        def wait(_seconds):
+            locked_while_waiting.append(server.motion_lock.locked())
+
+        with mock.patch('ArmServer.sleep', side_effect=wait):
+            unreachable = server.dispatch(opcodes.pick, pick.pack(100, 100, 5, 500, 0))
+            picked, _ = server.dispatch(opcodes.pick, pick.pack(10, 10, 5, 500, 20))
+            placed, _ = server.dispatch(opcodes.place, place.pack(10, 10, 5, 500))
+
+        # Assert
+        self.assertEqual((error, b'No pose reaches the target. Not sending.'), unreachable)
+        self.assertEqual((ok, ok), (picked, placed))
+        self.assertEqual(10, len(server.arm.Ser.writes))
+        self.assertEqual([False] * 7, locked_while_waiting)
+        self.assertEqual(-20.0, server.arm.State['fingers'])
+
+    def test_parse_address(self, _mocked_serial):
+        """ Test that HOST:PORT selects TCP and anything else a Unix socket. """
+        self.assertEqual(('localhost', 5000), parse_address(':5000'))
+        self.assertEqual(('127.0.0.1', 5000), parse_address('127.0.0.1:5000'))
+        self.assertEqual('/tmp/xarm.sock', parse_address('/tmp/xarm.sock'))
@@ -0,0 +1,65 @@
+import unittest
+import tracemalloc
+
+from ChangeDetector import ChangeDetector
+from RobotState import RobotState
+from definitions import motor_names
+
+
+class TestChangeDetector(unittest.TestCase):
+    @staticmethod
+    def make_state(shoulder: float) -> RobotState:
+        state = RobotState()
+        state.update_state({'shoulder': shoulder})
+        return state
+
+    def test_commits_after_dwell(self):
+        """ Test that a keyframe is committed once, after the joints hold still for the dwell time. """
+        # Arrange
+        detector = ChangeDetector(deadbands=2.0, dwell_s=1.0)
+        state = self.make_state(10.0)
+
+        # Act
+        results = [detector.update(state, now) for now in (0.0, 0.5, 1.0, 1.5)]
+
+        # Assert
+        self.assertEqual([False, False, True, False], results)
+        self.assertEqual(10.0, detector.keyframe[motor_names.index('shoulder') - 1])
+        self.assertEqual(1, detector.keyframes)
+
+    def test_deadbands(self):
+        """ Test that motion within a joint's deadband keeps the dwell timer running and motion beyond restarts it. """
+        # Arrange
+        detector = ChangeDetector(deadbands={'shoulder': 5.0}, dwell_s=1.0)
+
+        # Act
+        detector.update(self.make_state(10.0), 0.0)
+        within = detector.update(self.make_state(14.0), 1.0)
+        detector.update(self.make_state(20.0), 1.5)
+        early = detector.update(self.make_state(20.0), 2.0)
+        settled = detector.update(self.make_state(20.0), 2.5)
+
+        # Assert
+        self.assertTrue(within)
+        self.assertFalse(early)
+        self.assertTrue(settled)
+        self.assertEqual(20.0, detector.keyframe[motor_names.index('shoulder') - 1])
+
+    def test_no_allocation(self):
+        """ Test that updates do not accumulate memory. """
+        # Arrange
+        detector = ChangeDetector(dwell_s=1.0)
+        states = [self.make_state(10.0), self.make_state(30.0)]
+        detector.update(states[0], 0.0)
+
+        # Act
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for sample in range(10000):
+            detector.update(states[sample // 100 % 2], sample * 0.02)
+        after = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        # Assert
+        growth = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+        self.assertLess(growth, 4096)
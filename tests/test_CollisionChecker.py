@@ -0,0 +1,76 @@
+import unittest
+import numpy as np
+
+from RobotState import RobotState
+from definitions import motor_names
+from CollisionChecker import CollisionChecker, interpolate_states
+
+
+def joints(**degrees):
+    """ Joint vector in motor_names[1:] order, zero for motors not given. """
+    return np.array([degrees.get(motor, 0.0) for motor in motor_names[1:]])
+
+
+class TestCollisionChecker(unittest.TestCase):
+    checker = CollisionChecker()
+
+    def test_upright_is_clear(self):
+        """ Test that the upright position collides with nothing. """
+        # Arrange, Act & Assert
+        self.assertIsNone(self.checker.first_collision(joints()))
+
+    def test_ground_collision(self):
+        """ Test that reaching below the table is detected. """
+        # Arrange
+        reaching_down = joints(shoulder=90.0, elbow=45.0, wrist=45.0)
+
+        # Act & Assert
+        self.assertEqual(0, self.checker.first_collision(reaching_down))
+
+    def test_base_collision(self):
+        """ Test that folding the fingers into the base is detected. """
+        # Arrange
+        folded = joints(shoulder=0.0, elbow=120.0, wrist=60.0)
+
+        # Act & Assert
+        self.assertTrue(self.checker.collisions(folded[np.newaxis])[0])
+
+    def test_box_collision(self):
+        """ Test that user-defined boxes are detected and that the first offending sample is returned. """
+        # Arrange
+        checker = CollisionChecker()
+        checker.add_box((-100, -100, 34), (100, 100, 40))
+        trajectory = np.array([joints(shoulder=angle) for angle in (60.0, 30.0, 0.0, 30.0)])
+
+        # Act & Assert
+        self.assertEqual(2, checker.first_collision(trajectory))
+        self.assertIsNone(CollisionChecker().first_collision(trajectory))
+
+    def test_check_move(self):
+        """ Test that check_move samples the path between states rather than only its ends. """
+        # Arrange
+        start = RobotState(dict(zip(motor_names[1:], joints(base=-90.0, shoulder=60.0))))
+        end = RobotState(dict(zip(motor_names[1:], joints(base=90.0, shoulder=60.0))))
+        checker = CollisionChecker()
+        checker.add_box((19, 19, 15), (25, 25, 21))
+
+        # Act
+        index = checker.check_move(start, end, samples=21)
+
+        # Assert
+        self.assertEqual(10, index)
+        self.assertIsNone(checker.first_collision(np.array([list(start), list(end)])))
+
+    def test_interpolate_states(self):
+        """ Test that interpolate_states includes both ends of the move. """
+        # Arrange
+        start = RobotState()
+        end = RobotState(dict(zip(motor_names[1:], joints(base=10.0))))
+
+        # Act
+        path = interpolate_states(start, end, 11)
+
+        # Assert
+        self.assertEqual((11, 6), path.shape)
+        np.testing.assert_allclose(np.array(list(start)), path[0])
+        np.testing.assert_allclose(np.array(list(end)), path[-1])
@@ -0,0 +1,137 @@
+import mock
+import unittest
+from io import BytesIO
+from threading import Barrier
+from time import monotonic, sleep
+
+import packetmaker as pk
+from Fleet import Fleet
+from RobotArm import RobotArm
+from definitions import commands, motor_ids
+from motion_compiler import CompiledMotion
+from robot_utils import degrees_to_rotation
+
+ports = ['/dev/ttyUSB0', '/dev/ttyUSB1', '/dev/ttyUSB2', '/dev/ttyUSB3']
+
+
+class FakeSerial:
+    """ Serial port whose writes block like a slow link, and which replies to position requests. """
+    write_s = 0.0
+    # Barrier every write waits at, set to check that several arms write at the same time.
+    barrier = None
+
+    def __init__(self, port, _baud_rate):
+        self.port = port
+        self.opened = monotonic()
+        self.writes = []
+        self.buffer = BytesIO()
+
+    def write(self, data):
+        sleep(self.write_s)
+        if self.barrier is not None:
+            self.barrier.wait()
+        self.writes.append((monotonic(), data))
+        if data[3:4] == bytes([commands.read_multiple_servo_positions]):
+            angle = 10.0 * ports.index(self.port)
+            reply = bytes([1, motor_ids['base']]) + degrees_to_rotation(angle).to_bytes(2, 'little')
+            self.buffer = BytesIO(bytes([0x55, 0x55, len(reply) + 2, commands.read_multiple_servo_positions]) + reply)
+
+    def inWaiting(self):
+        return len(self.buffer.getbuffer()) - self.buffer.tell()
+
+    def read(self, n=1):
+        return self.buffer.read(n)
+
+
+@mock.patch('RobotArm.open_serial', side_effect=FakeSerial)
+class TestFleet(unittest.TestCase):
+    def test_broadcast(self, _mocked_serial):
+        """ Test that a broadcast reaches every arm on its own port, with every write in progress at once. """
+        # Arrange
+        fleet = Fleet(ports)
+        fleet.broadcast(RobotArm.ensure_serial)
+        # Only passable if all the arms write concurrently. Serialized writes break it after the timeout.
+        barrier = Barrier(len(ports), timeout=5.0)
+        for arm in fleet.arms.values():
+            arm.Ser.barrier = barrier
+
+        # Act
+        fleet.broadcast(RobotArm.unlock_servos)
+        fleet.close()
+
+        # Assert
+        self.assertFalse(barrier.broken)
+        for port, arm in fleet.arms.items():
+            self.assertEqual(port, arm.Ser.port)
+            self.assertEqual([pk.write_servo_unlock()], [data for _, data in arm.Ser.writes])
+
+    def test_run(self, _mocked_serial):
+        """ Test that commands to one arm run in order on that arm only. """
+        # Arrange
+        fleet = Fleet(ports[:2])
+
+        # Act
+        fleet.submit(ports[0], RobotArm.send_beep)
+        result = fleet.run(ports[0], RobotArm.unlock_servos)
+        fleet.close()
+
+        # Assert
+        self.assertIsNone(result)
+        self.assertEqual([b'\x55\x00', pk.write_servo_unlock()], [data for _, data in fleet.arms[ports[0]].Ser.writes])
+        self.assertNotIn('Ser', vars(fleet.arms[ports[1]]))
+
+    def test_play(self, _mocked_serial):
+        """ Test that compiled motions on several arms share one start, after every port is open. """
+        # Arrange
+        fleet = Fleet(ports)
+        motions = {port: CompiledMotion([(0, b'\x55\x00'), (50, b'\x55\x01')]) for port in ports}
+
+        # Act
+        schedulers = fleet.play(motions, lead_s=0.05)
+        fleet.close()
+
+        # Assert
+        self.assertEqual(set(ports), set(schedulers))
+        origins = {scheduler.origin for scheduler in schedulers.values()}
+        self.assertEqual(1, len(origins))
+        origin = origins.pop()
+        for port, arm in fleet.arms.items():
+            self.assertLess(arm.Ser.opened, origin)
+            self.assertEqual([b'\x55\x00', b'\x55\x01'], [data for _, data in arm.Ser.writes])
+            self.assertEqual(2, schedulers[port].count)
+
+    def test_move(self, _mocked_serial):
+        """ Test that a coordinated move is checked for every arm before any is sent. """
+        # Arrange
+        fleet = Fleet(ports[:2])
+
+        # Act
+        with self.assertRaises(ValueError):
+            fleet.move({ports[0]: {'base': 10.0}, ports[1]: {'shoulder': 119.0}}, 500)
+        with self.assertRaises(ValueError):
+            fleet.move({ports[0]: {'bass': 10.0}}, 500)
+        fleet.move({ports[0]: {'base': 10.0}, ports[1]: {'base': -10.0}}, 500)
+        fleet.close()
+
+        # Assert
+        for port, angle in zip(ports, [10.0, -10.0]):
+            arm = fleet.arms[port]
+            self.assertEqual(1, len(arm.Ser.writes))
+            self.assertEqual(angle, arm.State.base)
+            self.assertEqual(pk.write_servo_move(vars(arm.State), 500), arm.Ser.writes[0][1])
+
+    def test_poll(self, _mocked_serial):
+        """ Test that poll returns the state of every arm. """
+        # Arrange
+        fleet = Fleet(ports[:3])
+
+        # Act
+        snapshot = fleet.poll(wait_s=0.0)
+        fleet.close()
+
+        # Assert
+        self.assertEqual(ports[:3], list(snapshot))
+        for index, port in enumerate(ports[:3]):
+            self.assertAlmostEqual(10.0 * index, snapshot[port]['joints']['base'], delta=0.24)
+            self.assertEqual(1, snapshot[port]['updates'])
+            self.assertGreaterEqual(snapshot[port]['age_s'], 0.0)
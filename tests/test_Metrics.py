@@ -0,0 +1,59 @@
+import unittest
+
+from Metrics import MetricsRegistry, bucket_count, bucket_index, bucket_value, count, registry, timed
+
+
+class TestMetrics(unittest.TestCase):
+    def tearDown(self):
+        registry.enabled = False
+        registry.reset()
+
+    def test_buckets(self):
+        """ Test that every value falls in the bucket whose range holds it, within the histogram precision. """
+        for value in [0, 1, 31, 32, 33, 63, 64, 1000, 123456, 10 ** 9, 2 ** 63 - 1]:
+            # Act
+            index = bucket_index(value)
+
+            # Assert
+            self.assertLess(index, bucket_count)
+            self.assertLessEqual(bucket_value(index), value)
+            self.assertLess(value, bucket_value(index + 1))
+            self.assertLessEqual(value - bucket_value(index), value / 16)
+
+    def test_histogram(self):
+        """ Test that histogram percentiles come from the bucket of the ranked value. """
+        # Arrange
+        histogram = MetricsRegistry().histogram('latency')
+
+        # Act
+        for value in range(1, 1001):
+            histogram.record(value * 1000)
+        snapshot = histogram.snapshot()
+
+        # Assert
+        self.assertEqual(1000, snapshot['count'])
+        self.assertAlmostEqual(500.5, snapshot['mean_us'])
+        self.assertAlmostEqual(500, snapshot['p50_us'], delta=500 / 16)
+        self.assertAlmostEqual(990, snapshot['p99_us'], delta=990 / 16)
+        self.assertAlmostEqual(1000, snapshot['max_us'], delta=1000 / 16)
+
+    def test_timed(self):
+        """ Test that calls are only recorded while the registry is enabled. """
+        # Arrange
+        @timed('test.function')
+        def function(value):
+            count('test.calls')
+            return value * 2
+
+        # Act
+        disabled_result = function(1)
+        disabled_snapshot = registry.snapshot()
+        registry.enabled = True
+        enabled_result = function(2)
+        snapshot = registry.snapshot()
+
+        # Assert
+        self.assertEqual((2, 4), (disabled_result, enabled_result))
+        self.assertNotIn('test.function', disabled_snapshot['histograms'])
+        self.assertEqual(1, snapshot['histograms']['test.function']['count'])
+        self.assertEqual({'test.calls': 1}, snapshot['counters'])
@@ -0,0 +1,57 @@
+import unittest
+
+from Monitor import Monitor, format_sample
+from Telemetry import Telemetry
+from test_Telemetry import FakeArm
+
+
+class TestMonitor(unittest.TestCase):
+    def create(self):
+        current_time = [0.0]
+
+        def clock():
+            return current_time[0]
+
+        def wait(seconds):
+            current_time[0] += seconds
+
+        return Telemetry(FakeArm(clock, 0.004), 10.0, 16, clock, wait, poll_s=0.001)
+
+    def test_format_sample(self):
+        """ Test that a status line shows joints, tip position, rate and latency. """
+        # Arrange
+        telemetry = self.create()
+        telemetry.run(cycles=3)
+
+        # Act
+        text = format_sample(telemetry.latest(1)[0], telemetry.stats())
+
+        # Assert
+        self.assertIn('base   +2.00', text)
+        self.assertIn('tip (', text)
+        self.assertIn('10.0 Hz', text)
+        self.assertIn('latency p50 4.0 ms', text)
+
+    def test_refresh_throttled(self):
+        """ Test that only new samples are rendered and a busy terminal skips the render. """
+        # Arrange
+        telemetry = self.create()
+        rendered = []
+        terminal_free = [True]
+        monitor = Monitor(telemetry, lambda text: terminal_free[0] and not rendered.append(text))
+
+        # Act
+        nothing_yet = monitor.refresh()
+        telemetry.run(cycles=2)
+        first = monitor.refresh()
+        repeated = monitor.refresh()
+        telemetry.run(cycles=1)
+        terminal_free[0] = False
+        busy = monitor.refresh()
+        terminal_free[0] = True
+        retried = monitor.refresh()
+
+        # Assert
+        self.assertEqual([False, True, False, False, True], [nothing_yet, first, repeated, busy, retried])
+        self.assertEqual(2, monitor.renders)
+        self.assertEqual(2, len(rendered))
@@ -0,0 +1,103 @@
+import mock
+import unittest
+import numpy as np
+from io import BytesIO
+from os import path
+from tempfile import TemporaryDirectory
+
+from MotionArchive import MotionArchive, dequantize, iter_archive, load_recording, quantize, read_archive, \
+    save_archive, write_archive
+from MotionPath import MotionPath
+from robot_utils import degrees_to_rotation
+
+
+class TestMotionArchive(unittest.TestCase):
+    test_times = np.arange(2500) / 50
+    test_joints = 40 * np.sin(np.outer(test_times, 1 / np.arange(1, 7)))
+    test_path = MotionPath(test_joints, 1000 + test_times, np.full(2500, 20, dtype=np.float32))
+
+    def test_quantize(self):
+        """ Test that quantize matches degrees_to_rotation, clamping included. """
+        # Arrange
+        angles = np.array([-130.0, -120.0, -0.1, 0.0, 33.3, 120.0, 125.0])
+
+        # Act & Assert
+        self.assertEqual([degrees_to_rotation(angle) for angle in angles], quantize(angles).tolist())
+        np.testing.assert_allclose([-120.0, 120.0], dequantize(np.array([0, 1000])))
+
+    def test_round_trip(self):
+        """ Test that a stream round trip keeps joints within half a servo count and the other columns exactly. """
+        for codec in ('zlib', 'lzma'):
+            # Arrange
+            buffer = BytesIO()
+
+            # Act
+            write_archive(self.test_path, buffer, chunk_size=1000, codec=codec)
+            buffer.seek(0)
+            restored = read_archive(buffer)
+
+            # Assert
+            self.assertLessEqual(np.abs(restored.joints - self.test_joints).max(), 0.12 + 1e-5)
+            np.testing.assert_allclose(restored.timestamps, self.test_path.timestamps, atol=1e-6)
+            np.testing.assert_array_equal(restored.durations, self.test_path.durations)
+            self.assertLess(len(buffer.getvalue()), self.test_joints.size)
+
+    def test_streaming(self):
+        """ Test that a stream decodes one chunk at a time. """
+        # Arrange
+        buffer = BytesIO()
+        write_archive(MotionPath(self.test_joints), buffer, chunk_size=1000)
+        buffer.seek(0)
+
+        # Act
+        chunks = iter_archive(buffer)
+        first = next(chunks)
+
+        # Assert
+        self.assertEqual(1000, len(first))
+        self.assertIsNone(first.timestamps)
+        self.assertEqual([1000, 500], [len(chunk) for chunk in chunks])
+
+    def test_seek(self):
+        """ Test that chunks decode independently from any sample. """
+        # Arrange
+        with TemporaryDirectory() as tempdir:
+            filename = path.join(tempdir, 'archive')
+            save_archive(self.test_path, filename, chunk_size=1000)
+
+            # Act
+            with MotionArchive(filename) as archive:
+                last = archive.read_chunk(2)
+                tail = list(archive.iter_chunks(1800))
+            loaded = load_recording(filename)
+
+            # Assert
+            self.assertEqual([200, 500], [len(chunk) for chunk in tail])
+            np.testing.assert_allclose(last.joints, self.test_joints[2000:], atol=0.12 + 1e-5)
+            np.testing.assert_allclose(tail[0].timestamps, self.test_path.timestamps[1800:2000], atol=1e-6)
+            self.assertEqual(2500, len(loaded))
+
+    def test_invalid_archive(self):
+        """ Test that opening a file which is not an indexed archive closes it before raising. """
+        # Arrange
+        opened = []
+
+        def tracked_open(*args, **kwargs):
+            opened.append(open(*args, **kwargs))
+            return opened[-1]
+
+        with TemporaryDirectory() as tempdir:
+            filename = path.join(tempdir, 'archive')
+            archive = BytesIO()
+            write_archive(self.test_path, archive)
+            with open(filename, 'wb') as f:
+                # Without its index magic, the archive can only be read as a stream.
+                f.write(archive.getvalue()[:-4])
+
+            # Act
+            with mock.patch('MotionArchive.open', tracked_open, create=True):
+                with self.assertRaises(ValueError):
+                    MotionArchive(filename)
+
+            # Assert
+            self.assertTrue(opened[0].closed)
@@ -0,0 +1,140 @@
+import mock
+import pickle
+import unittest
+import numpy as np
+from os import path, utime
+from tempfile import TemporaryDirectory
+
+from MotionLibrary import MotionLibrary, describe
+from MotionPath import MotionPath
+
+
+class TestMotionLibrary(unittest.TestCase):
+    safe_joints = np.zeros((4, 6))
+    unsafe_joints = np.array([[0, 0, 0, 0, 0, 0], [0, 0, 0, 120, 0, 0], [0, 0, 0, 0, 0, 0]], dtype=np.float64)
+
+    def test_describe(self):
+        """ Test that describe summarizes the size, duration, bounds and safety of a motion path. """
+        # Arrange
+        motion_path = MotionPath(self.unsafe_joints, durations=np.array([0, 500, 250], dtype=np.float32))
+
+        # Act
+        entry = describe(motion_path)
+
+        # Assert
+        self.assertEqual(3, entry['poses'])
+        self.assertAlmostEqual(0.75, entry['duration_s'])
+        self.assertEqual(120, entry['joint_max']['shoulder'])
+        self.assertFalse(entry['safe'])
+        self.assertEqual(1, entry['first_unsafe'])
+        self.assertTrue(np.all(np.asarray(entry['box_min']) <= entry['box_max']))
+
+    @mock.patch('MotionLibrary.CollisionChecker')
+    def test_describe_collisions(self, mocked_checker):
+        """ Test that describe only checks collisions with a checker passed in. """
+        # Arrange
+        motion_path = MotionPath(self.safe_joints)
+        checker = mock.Mock()
+        checker.first_collision.return_value = 2
+
+        # Act
+        without_checker = describe(motion_path)
+        with_checker = describe(motion_path, checker)
+
+        # Assert
+        mocked_checker.assert_not_called()
+        self.assertTrue(without_checker['safe'])
+        self.assertFalse(with_checker['safe'])
+        self.assertEqual(2, with_checker['first_unsafe'])
+
+    def test_refresh(self):
+        """ Test that refresh indexes new files, skips unchanged ones and drops deleted ones. """
+        # Arrange
+        with TemporaryDirectory() as tempdir:
+            MotionPath(self.safe_joints).save(path.join(tempdir, 'wave'))
+            MotionPath(self.unsafe_joints).save(path.join(tempdir, 'reach'))
+            library = MotionLibrary(tempdir)
+
+            # Act
+            first = library.refresh()
+            with mock.patch('MotionLibrary.MotionPath.load_any') as mocked_load:
+                second = MotionLibrary(tempdir).refresh()
+            MotionPath(self.safe_joints[:2]).save(path.join(tempdir, 'reach'))
+            utime(path.join(tempdir, 'reach'), (0, 0))
+            third = MotionLibrary(tempdir).refresh()
+
+            # Assert
+            self.assertEqual(['reach', 'wave'], sorted(first))
+            self.assertEqual([], second)
+            mocked_load.assert_not_called()
+            self.assertEqual(['reach'], third)
+            self.assertTrue(MotionLibrary(tempdir).entries['reach']['safe'])
+
+    def test_refresh_unreadable(self):
+        """ Test that refresh skips files which are not recordings and indexes the rest. """
+        # Arrange
+        with TemporaryDirectory() as tempdir:
+            MotionPath(self.safe_joints).save(path.join(tempdir, 'wave'))
+            with open(path.join(tempdir, 'settings'), 'wb') as f:
+                pickle.dump({'speed': 2.0}, f)
+
+            # Act
+            updated = MotionLibrary(tempdir).refresh()
+
+            # Assert
+            self.assertEqual(['wave'], updated)
+            self.assertNotIn('settings', MotionLibrary(tempdir))
+
+    def test_refresh_failed(self):
+        """ Test that refresh retries an unreadable file only once it has changed. """
+        # Arrange
+        with TemporaryDirectory() as tempdir:
+            with open(path.join(tempdir, 'settings'), 'wb') as f:
+                pickle.dump({'speed': 2.0}, f)
+            MotionLibrary(tempdir).refresh()
+
+            # Act
+            with mock.patch('MotionLibrary.load_recording') as mocked_load:
+                MotionLibrary(tempdir).refresh()
+            MotionPath(self.safe_joints).save(path.join(tempdir, 'settings'))
+            utime(path.join(tempdir, 'settings'), (0, 0))
+            updated = MotionLibrary(tempdir).refresh()
+
+            # Assert
+            mocked_load.assert_not_called()
+            self.assertEqual(['settings'], updated)
+            self.assertEqual({}, MotionLibrary(tempdir).failures)
+
+    def test_refresh_removed(self):
+        """ Test that refresh forgets recordings which were deleted. """
+        # Arrange
+        with TemporaryDirectory() as tempdir:
+            library = MotionLibrary(tempdir)
+            library.entries['gone'] = {'name': 'gone', 'size': 0, 'mtime': 0}
+
+            # Act
+            library.refresh()
+
+            # Assert
+            self.assertNotIn('gone', MotionLibrary(tempdir))
+
+    def test_search(self):
+        """ Test that search filters on name, size, duration and safety. """
+        # Arrange
+        with TemporaryDirectory() as tempdir:
+            MotionPath(self.safe_joints, durations=np.full(4, 500, dtype=np.float32)).save(path.join(tempdir, 'wave'))
+            MotionPath(self.unsafe_joints).save(path.join(tempdir, 'reach'))
+            library = MotionLibrary(tempdir)
+            library.refresh()
+
+            # Act
+            by_name = library.search('w*')
+            by_poses = library.search(min_poses=4)
+            by_duration = library.search(max_duration_s=5)
+            unsafe = library.search(safe=False)
+
+            # Assert
+            self.assertEqual(['wave'], [entry['name'] for entry in by_name])
+            self.assertEqual(['wave'], [entry['name'] for entry in by_poses])
+            self.assertEqual(['wave'], [entry['name'] for entry in by_duration])
+            self.assertEqual(['reach'], [entry['name'] for entry in unsafe])
@@ -0,0 +1,129 @@
+import unittest
+import numpy as np
+from os import path
+from tempfile import TemporaryDirectory
+
+from MotionPath import MotionPath
+from MotionLog import MotionLog, convert_log, read_log
+
+
+class TestMotionLog(unittest.TestCase):
+    def test_append_and_read(self):
+        """ Test that appended samples are read back in order, across chunk boundaries. """
+        # Arrange
+        with TemporaryDirectory() as tempdir:
+            test_file = path.join(tempdir, 'session.log')
+
+            # Act
+            with MotionLog(test_file, chunk_size=4, fsync=False) as motion_log:
+                for index in range(10):
+                    motion_log.append([index] * 6, timestamp=index / 10)
+            motion_path = read_log(test_file)
+
+            # Assert
+            self.assertEqual(10, len(motion_path))
+            np.testing.assert_array_equal(np.repeat(np.arange(10), 6).reshape(10, 6), motion_path.joints)
+            np.testing.assert_allclose(np.arange(10) / 10, motion_path.timestamps)
+            self.assertIsNone(motion_path.durations)
+
+    def test_flush_interval(self):
+        """ Test that samples reach the disk once they are older than the flush interval. """
+        # Arrange
+        current_time = [0.0]
+        with TemporaryDirectory() as tempdir:
+            test_file = path.join(tempdir, 'session.log')
+            motion_log = MotionLog(test_file, chunk_size=100, flush_interval_s=1.0, fsync=False,
+                                   clock=lambda: current_time[0])
+
+            # Act
+            motion_log.append([0] * 6, 0.0, 250)
+            samples_before_interval = len(read_log(test_file))
+            current_time[0] = 1.5
+            motion_log.append([1] * 6, 1.5, 250)
+            samples_after_interval = len(read_log(test_file))
+            motion_log.close()
+
+            # Assert
+            self.assertEqual(0, samples_before_interval)
+            self.assertEqual(2, samples_after_interval)
+            np.testing.assert_array_equal([250, 250], read_log(test_file).durations)
+
+    def test_flush_if_due(self):
+        """ Test that an idle owner writes pending samples once they are older than the flush interval. """
+        # Arrange
+        current_time = [0.0]
+        with TemporaryDirectory() as tempdir:
+            test_file = path.join(tempdir, 'session.log')
+            motion_log = MotionLog(test_file, chunk_size=100, flush_interval_s=1.0, fsync=False,
+                                   clock=lambda: current_time[0])
+            motion_log.append([0] * 6, 0.0)
+
+            # Act
+            current_time[0] = 0.5
+            motion_log.flush_if_due()
+            samples_before_interval = len(read_log(test_file))
+            current_time[0] = 1.5
+            motion_log.flush_if_due()
+            samples_after_interval = len(read_log(test_file))
+            motion_log.close()
+
+            # Assert
+            self.assertEqual(0, samples_before_interval)
+            self.assertEqual(1, samples_after_interval)
+
+    def test_recover_partial_chunk(self):
+        """ Test that a partial final chunk is truncated when the log is reopened and appending resumes. """
+        # Arrange
+        with TemporaryDirectory() as tempdir:
+            test_file = path.join(tempdir, 'session.log')
+            with MotionLog(test_file, chunk_size=2, fsync=False) as motion_log:
+                for index in range(4):
+                    motion_log.append([index] * 6, float(index))
+            complete_size = path.getsize(test_file)
+            with open(test_file, 'ab') as f:
+                f.write(b'CHNK\x02\x00\x00\x00garbage')
+
+            # Act
+            with MotionLog(test_file, chunk_size=2, fsync=False) as motion_log:
+                recovered_samples = motion_log.samples
+                recovered_size = path.getsize(test_file)
+                motion_log.append([4] * 6, 4.0)
+            motion_path = read_log(test_file)
+
+            # Assert
+            self.assertEqual(4, recovered_samples)
+            self.assertEqual(complete_size, recovered_size)
+            np.testing.assert_array_equal(np.arange(5), motion_path.timestamps)
+
+    def test_invalid_log(self):
+        """ Test that files which are not motion logs are refused rather than overwritten. """
+        # Arrange
+        with TemporaryDirectory() as tempdir:
+            test_file = path.join(tempdir, 'not_a_log')
+            with open(test_file, 'wb') as f:
+                f.write(bytes(range(100)))
+
+            # Act & Assert
+            with self.assertRaises(ValueError):
+                MotionLog(test_file)
+
+    def test_convert_log(self):
+        """ Test that a log streamed into a motion path file matches the log read into memory. """
+        # Arrange
+        with TemporaryDirectory() as tempdir:
+            test_file = path.join(tempdir, 'session.log')
+            destination = path.join(tempdir, 'session')
+            with MotionLog(test_file, chunk_size=4, fsync=False) as motion_log:
+                for index in range(10):
+                    motion_log.append([index] * 6, timestamp=index / 10, duration_ms=index * 10.0)
+
+            # Act
+            count = convert_log(test_file, destination)
+            motion_path = MotionPath.load(destination, mmap=False)
+
+            # Assert
+            expected = read_log(test_file)
+            self.assertEqual(10, count)
+            np.testing.assert_array_equal(expected.joints, motion_path.joints)
+            np.testing.assert_array_equal(expected.timestamps, motion_path.timestamps)
+            np.testing.assert_array_equal(expected.durations, motion_path.durations)
@@ -0,0 +1,95 @@
+import pickle
+import unittest
+import numpy as np
+from io import BytesIO
+from os import path
+from tempfile import TemporaryDirectory
+
+from MotionPath import MotionPath, convert_pickle
+from RobotState import RobotState
+from definitions import motor_names
+
+
+class TestMotionPath(unittest.TestCase):
+    test_joints = np.arange(30, dtype=np.float64).reshape(5, 6) - 15
+
+    def test_round_trip(self):
+        """ Test that every column survives a round trip through the binary format. """
+        # Arrange
+        motion_path = MotionPath(self.test_joints, np.linspace(0, 1, 5), np.full(5, 250, dtype=np.float32))
+        buffer = BytesIO()
+
+        # Act
+        motion_path.write(buffer, np.float64)
+        buffer.seek(0)
+        restored = MotionPath.read(buffer)
+
+        # Assert
+        np.testing.assert_array_equal(motion_path.joints, restored.joints)
+        np.testing.assert_array_equal(motion_path.timestamps, restored.timestamps)
+        np.testing.assert_array_equal(motion_path.durations, restored.durations)
+
+    def test_load_mmap(self):
+        """ Test that load maps the columns of the file instead of reading them. """
+        # Arrange
+        motion_path = MotionPath(self.test_joints, timestamps=np.linspace(0, 1, 5))
+        with TemporaryDirectory() as tempdir:
+            test_file = path.join(tempdir, 'path.xamp')
+            motion_path.save(test_file)
+
+            # Act
+            mapped = MotionPath.load(test_file)
+            empty_file = path.join(tempdir, 'empty.xamp')
+            MotionPath(np.zeros((0, 6))).save(empty_file)
+            empty = MotionPath.load(empty_file)
+
+            # Assert
+            self.assertFalse(mapped.joints.flags.owndata or mapped.joints.flags.writeable)
+            self.assertEqual(np.float32, mapped.joints.dtype)
+            np.testing.assert_array_equal(self.test_joints, mapped.joints)
+            np.testing.assert_array_equal(motion_path.timestamps, mapped.timestamps)
+            self.assertIsNone(mapped.durations)
+            self.assertEqual(0, len(empty))
+            del mapped, empty
+
+    def test_states(self):
+        """ Test that motion paths convert to and from RobotStates. """
+        # Arrange
+        states = [RobotState({motor: float(index) for motor in motor_names[1:]}) for index in range(3)]
+
+        # Act
+        motion_path = MotionPath.from_states(states)
+
+        # Assert
+        self.assertEqual((3, 6), motion_path.joints.shape)
+        self.assertEqual([vars(state) for state in states], [vars(state) for state in motion_path.to_states()])
+
+    def test_invalid_file(self):
+        """ Test that files which are not motion paths are rejected. """
+        # Arrange
+        buffer = BytesIO(pickle.dumps([RobotState()]))
+
+        # Act & Assert
+        self.assertFalse(MotionPath.is_motion_path(buffer))
+        with self.assertRaises(ValueError):
+            MotionPath.read(buffer)
+
+    def test_convert_pickle(self):
+        """ Test that legacy pickles convert, and that nothing but RobotStates is unpickled. """
+        # Arrange
+        states = [RobotState(), RobotState({motor: 10.0 for motor in motor_names[1:]})]
+        with TemporaryDirectory() as tempdir:
+            source, destination, unsafe = (path.join(tempdir, name) for name in ('old', 'new', 'unsafe'))
+            with open(source, 'wb') as f:
+                pickle.dump(states, f)
+            with open(unsafe, 'wb') as f:
+                pickle.dump([TemporaryDirectory], f)
+
+            # Act
+            convert_pickle(source, destination)
+            converted = MotionPath.load(destination, mmap=False)
+
+            # Assert
+            np.testing.assert_array_equal([list(state) for state in states], converted.joints)
+            with self.assertRaises(pickle.UnpicklingError):
+                convert_pickle(unsafe, destination)
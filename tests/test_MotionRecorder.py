@@ -1,9 +1,19 @@
 import mock
+import argparse
 import snapshottest
+import numpy as np
 from os import path
 from tempfile import TemporaryDirectory
 
-from MotionRecorder import MotionRecorder
+from MotionLog import MotionLog
+from MotionArchive import save_archive
+from MotionLibrary import MotionLibrary
+from MotionPath import MotionPath
+from MotionRecorder import MotionRecorder, iter_recording, iter_samples, iter_schedule, positive_float, scale_speed
+from RobotState import RobotState
+from definitions import motor_names
+from trajectory import max_joint_speeds
+import packetmaker as pk
 
 
 class TestMotionRecorder(snapshottest.TestCase):
@@ -20,31 +30,145 @@ class TestMotionRecorder(snapshottest.TestCase):
         mocked_receive_serial.assert_called_once()
         mocked_request_positions.assert_called_once()
 
-    @mock.patch('MotionRecorder.open')
-    def test_load_pose_queue(self, mocked_open):
+    @mock.patch('MotionRecorder.motionpath_dir', path.dirname(test_motionpath))
+    def test_load_pose_queue(self):
         """ Test that load_pose_queue loads a motion path as expected. """
         # Arrange
-        mocked_open.side_effect = lambda _file, option: open(self.test_motionpath, option)
         recorder = MotionRecorder()
 
         # Act
-        recorder.load_pose_queue('this_file_is_already_mocked')
+        recorder.load_pose_queue(path.basename(self.test_motionpath))
 
         # Assert
         self.assertMatchSnapshot(str(recorder.pose_queue))
 
-    @mock.patch('MotionRecorder.open')
-    def test_save_pose_queue(self, mocked_open):
-        """ Test that load_pose_queue loads a motion path as expected. """
+    def test_save_pose_queue(self):
+        """ Test that save_pose_queue saves a motion path which load_pose_queue restores. """
         # Arrange
-        with TemporaryDirectory() as tempdir:
+        with TemporaryDirectory() as tempdir, mock.patch('MotionRecorder.motionpath_dir', tempdir):
             test_file = path.join(tempdir, 'temp_motionpath')
-            mocked_open.side_effect = lambda _file, option: open(test_file, option)
             recorder = MotionRecorder()
-            recorder.pose_queue.append({'motor': 'angle'})
+            recorder.pose_queue.append(RobotState({'fingers': -55.25, 'base': 92.75, 'elbow': 0.5,
+                                                   'shoulder': -13.0, 'wrist': -3.125, 'hand': -14.0}))
 
             # Act
-            recorder.save_pose_queue('this_file_is_already_mocked')
+            recorder.save_pose_queue('temp_motionpath')
+            recorder.load_pose_queue('temp_motionpath')
 
             # Assert
             self.assertTrue(path.isfile(test_file))
+            self.assertEqual(1, len(recorder.pose_queue))
+            self.assertEqual(-55.25, recorder.pose_queue[0].fingers)
+
+    def test_finalize_log(self):
+        """ Test that finalize_log turns a recording log into a motion path file. """
+        # Arrange
+        with TemporaryDirectory() as tempdir, mock.patch('MotionRecorder.motionpath_dir', tempdir):
+            with MotionLog(path.join(tempdir, 'session.log'), fsync=False) as motion_log:
+                motion_log.append([1.0] * 6, 10.0)
+            recorder = MotionRecorder()
+
+            # Act
+            recorder.finalize_log('session')
+            recorder.load_pose_queue('session')
+
+            # Assert
+            self.assertFalse(path.isfile(path.join(tempdir, 'session.log')))
+            self.assertEqual([1.0] * 6, list(recorder.pose_queue[0]))
+            self.assertIn('session', MotionLibrary(tempdir))
+
+    @mock.patch('MotionRecorder.RobotArm.request_positions')
+    @mock.patch('MotionRecorder.RobotArm.receive_serial')
+    def test_poll_state(self, mocked_receive_serial, _mocked_request_positions):
+        """ Test that poll_state returns as soon as a position reply has been parsed. """
+        # Arrange
+        recorder = MotionRecorder()
+
+        def reply():
+            recorder.xArm.position_updates += 1
+        mocked_receive_serial.side_effect = reply
+
+        # Act & Assert
+        self.assertTrue(recorder.poll_state())
+        mocked_receive_serial.assert_called_once()
+
+        # Arrange
+        mocked_receive_serial.side_effect = None
+
+        # Act & Assert
+        self.assertFalse(recorder.poll_state(timeout_s=0.01))
+
+    def test_iter_schedule(self):
+        """ Test that keyframes play at a fixed interval and timed recordings keep their timing. """
+        # Arrange
+        joints = np.zeros((3, 6))
+        keyframes = MotionPath(joints)
+        recording = MotionPath(joints, timestamps=np.array([5.0, 5.02, 5.05]), durations=np.array([0, 20, 30]))
+
+        def run(frames):
+            schedule = []
+            while True:
+                try:
+                    schedule.append(next(frames))
+                except StopIteration as stop:
+                    return schedule, stop.value
+
+        # Act
+        keyframe_schedule, keyframe_end = run(iter_schedule(iter_samples(keyframes, chunk_size=2), 500))
+        timed_schedule, timed_end = run(iter_schedule(iter_samples(recording, chunk_size=2), 500, start=10.0))
+        fast_schedule, _fast_end = run(iter_schedule(scale_speed(iter_samples(recording), 2.0), 500))
+
+        # Assert
+        self.assertEqual([0.0, 0.5, 1.0], [offset for offset, _frame in keyframe_schedule])
+        self.assertEqual(1.5, keyframe_end)
+        self.assertEqual([10.0, 10.5, 10.52], [offset for offset, _frame in timed_schedule])
+        self.assertAlmostEqual(10.55, timed_end)
+        self.assertEqual(pk.write_servo_move(vars(RobotState()), 30), timed_schedule[2][1])
+        self.assertEqual([0.0, 0.5, 0.51], [offset for offset, _frame in fast_schedule])
+
+    def test_scale_speed_limits(self):
+        """ Test that a faster playback stretches the moves which would exceed the joint speed limits. """
+        # Arrange
+        joints = np.zeros((3, 6))
+        joints[2, motor_names.index('shoulder') - 1] = 45.0
+        recording = MotionPath(joints, durations=np.array([0, 100, 1000]))
+
+        # Act
+        durations = [duration for _joints, duration in scale_speed(iter_samples(recording), 10.0)]
+
+        # Assert
+        np.testing.assert_allclose([0.0, 10.0, 1000 * 45.0 / max_joint_speeds['shoulder']], durations)
+
+    def test_iter_recording(self):
+        """ Test that archives and binary motion paths stream the same samples as the loaded path. """
+        # Arrange
+        joints = np.arange(30, dtype=np.float64).reshape(5, 6)
+        motion_path = MotionPath(joints, timestamps=np.arange(5) * 0.02, durations=np.full(5, 20.0))
+        with TemporaryDirectory() as tempdir:
+            binary_file, archive_file = path.join(tempdir, 'binary'), path.join(tempdir, 'archive')
+            motion_path.save(binary_file)
+            save_archive(motion_path, archive_file, chunk_size=2)
+
+            # Act
+            binary_samples = list(iter_recording(binary_file, chunk_size=2))
+            with mock.patch('MotionArchive.read_archive') as mocked_read_archive:
+                archive_samples = list(iter_recording(archive_file))
+
+        # Assert
+        mocked_read_archive.assert_not_called()
+        for samples in (binary_samples, archive_samples):
+            np.testing.assert_allclose(joints, [sample_joints for sample_joints, _duration in samples], atol=0.25)
+            self.assertEqual([20.0] * 5, [duration for _joints, duration in samples])
+
+    def test_scale_speed_positive(self):
+        """ Test that zero and negative speed factors are rejected by scale_speed and the command line. """
+        # Arrange
+        samples = iter_samples(MotionPath(np.zeros((2, 6)), durations=np.array([0, 20])))
+
+        # Act & Assert
+        for speed in (0.0, -1.0):
+            with self.assertRaises(ValueError):
+                scale_speed(samples, speed)
+            with self.assertRaises(argparse.ArgumentTypeError):
+                positive_float(str(speed))
+        self.assertEqual(0.5, positive_float('0.5'))
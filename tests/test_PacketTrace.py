@@ -0,0 +1,74 @@
+import unittest
+from io import BytesIO
+
+import packetmaker as pk
+from PacketTrace import PacketTrace, decode_frame, format_trace, incoming, outgoing, read_trace
+
+
+class TestPacketTrace(unittest.TestCase):
+    def create(self, capacity=4, slot_size=64):
+        current_time = [0.0]
+
+        def clock():
+            current_time[0] += 0.001
+            return current_time[0]
+
+        return PacketTrace(capacity, slot_size, clock)
+
+    def test_ring_buffer(self):
+        """ Test that the trace keeps the most recent frames, oldest first, truncated to the slot size. """
+        # Arrange
+        trace = self.create(capacity=3, slot_size=4)
+
+        # Act
+        for index in range(5):
+            trace.record(outgoing, bytes([index] * (index + 1)))
+        records = trace.records()
+
+        # Assert
+        self.assertEqual([b'\x02\x02\x02', b'\x03\x03\x03\x03', b'\x04\x04\x04\x04'],
+                         [record.frame for record in records])
+        self.assertEqual([3, 4, 5], [record.length for record in records])
+        self.assertAlmostEqual(0.003, records[0].timestamp)
+
+    def test_dump(self):
+        """ Test that a dumped trace reads back identically. """
+        # Arrange
+        trace = self.create()
+        trace.record(outgoing, pk.write_request_positions())
+        trace.record(incoming, b'\x55\x55\x06\x15\x01\x02\xf4\x01')
+        buffer = BytesIO()
+
+        # Act
+        trace.write(buffer)
+        buffer.seek(0)
+
+        # Assert
+        self.assertEqual(trace.records(), read_trace(buffer))
+
+    def test_decode_frame(self):
+        """ Test that frames are decoded with the command and motor names. """
+        # Arrange
+        move = pk.write_servo_move({'base': 0.0, 'fingers': -120.0}, 500)
+        reply = b'\x55\x55\x06\x15\x01\x02\xf4\x01'
+
+        # Act & Assert
+        self.assertEqual('move_servo in 500 ms: base +0.00, fingers -120.00', decode_frame(move))
+        self.assertEqual('read_multiple_servo_positions reply: base +0.00', decode_frame(reply, incoming))
+        self.assertEqual('unload_multiple_servo: fingers, base', decode_frame(pk.write_servo_unlock(['fingers', 'base'])))
+        self.assertEqual('action_speed/get_battery_voltage group 2 at 50%', decode_frame(pk.write_action_speed(2, 50)))
+        self.assertEqual('raw 5500', decode_frame(b'\x55\x00'))
+
+    def test_format_trace(self):
+        """ Test that each record is printed with its relative time, direction and description. """
+        # Arrange
+        trace = self.create()
+        trace.record(outgoing, pk.write_servo_unlock(['base']))
+        trace.record(incoming, b'\x55\x55\x06\x15\x01\x02\xf4\x01')
+
+        # Act
+        lines = format_trace(trace.records()).splitlines()
+
+        # Assert
+        self.assertEqual(['     0.000 ms -> unload_multiple_servo: base',
+                          '     1.000 ms <- read_multiple_servo_positions reply: base +0.00'], lines)
@@ -0,0 +1,98 @@
+import unittest
+
+from PlaybackScheduler import PlaybackScheduler
+
+
+class TestPlaybackScheduler(unittest.TestCase):
+    def create(self, oversleep_s=0.0, spin_s=0.0):
+        """ Creates a scheduler on a simulated clock whose sleeps overshoot by oversleep_s. """
+        current_time = [50.0]
+
+        def clock():
+            current_time[0] += 1e-5
+            return current_time[0]
+
+        def wait(seconds):
+            current_time[0] += seconds + oversleep_s
+
+        return PlaybackScheduler(spin_s, clock=clock, wait=wait), current_time
+
+    def test_no_drift(self):
+        """ Test that sleep overshoot does not accumulate across frames and loops. """
+        # Arrange
+        scheduler, current_time = self.create(oversleep_s=0.002)
+        schedule = [(0.0, b'a'), (0.5, b'b')]
+        sent = []
+
+        # Act
+        scheduler.run(schedule, lambda frame: sent.append(current_time[0] - scheduler.origin), loop_s=1.0, loops=100)
+
+        # Assert
+        self.assertEqual(200, len(sent))
+        for index, sent_at in enumerate(sent):
+            self.assertAlmostEqual(index * 0.5, sent_at, delta=3e-3)
+
+    def test_endless_empty_schedule(self):
+        """ Test that endless playback returns on an empty schedule and repeats need a loop duration. """
+        # Arrange
+        scheduler, _current_time = self.create()
+        sent = []
+
+        # Act
+        scheduler.run([], sent.append, loops=None)
+
+        # Assert
+        self.assertEqual([], sent)
+        with self.assertRaises(ValueError):
+            scheduler.run([(0.0, b'a')], sent.append, loops=None)
+        with self.assertRaises(ValueError):
+            scheduler.run([(0.0, b'a'), (0.5, b'b')], sent.append, loops=2)
+        self.assertEqual([], sent)
+
+    def test_spin(self):
+        """ Test that busy-waiting the final stretch removes the sleep overshoot. """
+        # Arrange
+        scheduler, _current_time = self.create(oversleep_s=0.0005, spin_s=0.001)
+
+        # Act
+        scheduler.start()
+        lateness = [scheduler.wait_until(0.1 * index) for index in range(1, 11)]
+
+        # Assert
+        self.assertLess(max(lateness), 1e-4)
+
+    def test_stats(self):
+        """ Test that lateness statistics are reported in milliseconds. """
+        # Arrange
+        scheduler, _current_time = self.create(oversleep_s=0.003)
+
+        # Act
+        scheduler.start()
+        for index in range(1, 5):
+            scheduler.wait_until(0.1 * index)
+        stats = scheduler.stats()
+
+        # Assert
+        self.assertEqual(4, stats['frames'])
+        self.assertAlmostEqual(3.0, stats['lateness_mean_ms'], delta=0.1)
+        self.assertAlmostEqual(3.0, stats['lateness_p99_ms'], delta=0.1)
+        self.assertEqual({'frames': 0.0}, PlaybackScheduler().stats())
+
+    def test_stream(self):
+        """ Test that stream sends frames from a generator and returns its return value. """
+        # Arrange
+        scheduler, current_time = self.create()
+        sent = []
+
+        def frames():
+            yield 0.25, b'a'
+            yield 0.75, b'b'
+            return 1.0
+
+        # Act
+        scheduler.start()
+        end = scheduler.stream(frames(), lambda frame: sent.append((round(current_time[0] - scheduler.origin, 3), frame)))
+
+        # Assert
+        self.assertEqual(1.0, end)
+        self.assertEqual([(0.25, b'a'), (0.75, b'b')], sent)
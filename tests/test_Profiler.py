@@ -0,0 +1,94 @@
+import os
+import mock
+import pstats
+import cProfile
+import tempfile
+import unittest
+
+from Profiler import CommandProfiler, collapsed_stacks, frame_name
+
+
+def leaf(n):
+    return sum(i * i for i in range(n))
+
+
+def branch():
+    return leaf(20000) + leaf(20000)
+
+
+def root():
+    return branch() + leaf(20000)
+
+
+class TestProfiler(unittest.TestCase):
+    def test_collapsed_stacks(self):
+        """ Test that stacks are rebuilt from the caller graph of a real profile, keeping every call path. """
+        # Arrange
+        profile = cProfile.Profile()
+        profile.enable()
+        root()
+        profile.disable()
+        stats = pstats.Stats(profile)
+        functions = {function[2]: function for function in stats.stats}
+        names = {name: frame_name(function) for name, function in functions.items()}
+
+        # Act
+        stacks = collapsed_stacks(stats, min_us=0.0)
+
+        # Assert
+        leaf_under_branch = [stack for stack in stacks if stack.endswith(f"{names['branch']};{names['leaf']}")]
+        leaf_under_root = [stack for stack in stacks if stack.endswith(f"{names['root']};{names['leaf']}")]
+        self.assertEqual(1, len(leaf_under_branch))
+        self.assertEqual(1, len(leaf_under_root))
+        self.assertIn(f"{names['root']};{names['branch']}", leaf_under_branch[0])
+        leaf_callers = stats.stats[functions['leaf']][4]
+        self.assertEqual(2, leaf_callers[functions['branch']][1])
+        self.assertEqual(1, leaf_callers[functions['root']][1])
+        self.assertAlmostEqual(sum(entry[2] for entry in stats.stats.values()) * 1e6, sum(stacks.values()),
+                               delta=1.0)
+
+    def test_collapsed_stacks_split(self):
+        """ Test that the time of a function is split between its callers in proportion to their share. """
+        # Arrange
+        root_key, branch_key, leaf_key = ('~', 0, 'root'), ('~', 0, 'branch'), ('~', 0, 'leaf')
+        # Entries: (primitive calls, calls, own time, cumulative time, callers) with times in seconds.
+        stats = mock.Mock(stats={
+            root_key: (1, 1, 0.001, 0.009, {}),
+            branch_key: (1, 1, 0.001, 0.006, {root_key: (1, 1, 0.001, 0.006)}),
+            leaf_key: (3, 3, 0.006, 0.006, {branch_key: (2, 2, 0.004, 0.004), root_key: (1, 1, 0.002, 0.002)}),
+        })
+
+        # Act
+        stacks = collapsed_stacks(stats, min_us=0.0)
+
+        # Assert
+        expected = {'root': 1000.0, 'root;branch': 1000.0, 'root;branch;leaf': 4000.0, 'root;leaf': 2000.0}
+        self.assertEqual(sorted(expected), sorted(stacks))
+        for stack, microseconds in expected.items():
+            self.assertAlmostEqual(microseconds, stacks[stack], places=6)
+
+    def test_command_profiler(self):
+        """ Test that runs of a command accumulate in one profile, and that dump writes both formats. """
+        # Arrange
+        profiler = CommandProfiler()
+
+        # Act
+        profiler.start('ignored')
+        profiler.enabled = True
+        for _ in range(2):
+            profiler.start('pick')
+            profiler.start('nested')
+            root()
+            profiler.stop()
+        with tempfile.TemporaryDirectory() as directory:
+            written = [os.path.basename(filename) for filename in profiler.dump(directory)]
+            with open(os.path.join(directory, 'pick.folded')) as f:
+                folded = f.read().splitlines()
+            calls = pstats.Stats(os.path.join(directory, 'pick.prof')).stats
+
+        # Assert
+        self.assertEqual({'pick': 2}, profiler.runs)
+        self.assertEqual(['pick.prof', 'pick.folded'], written)
+        self.assertEqual(2, [entry[1] for function, entry in calls.items() if function[2] == 'root'][0])
+        self.assertTrue(all(line.rsplit(' ', 1)[1].isdigit() for line in folded))
+        self.assertIn('pick: 2 runs', profiler.summary())
@@ -1,28 +1,33 @@
+import os
 import mock
+import tempfile
 import unittest
 from io import BytesIO
 from serial import SerialException
 
+from PacketTrace import outgoing, read_trace
 from RobotArm import RobotArm, ensure_serial_connection
+from RobotState import RobotState
 from definitions import commands
 
 
 class TestRobotArm(unittest.TestCase):
 
     @mock.patch('RobotArm.RobotState')
-    @mock.patch('RobotArm.Serial')
+    @mock.patch('RobotArm.open_serial')
     def create(self, _mocked_serial, _mocked_state):
         """ Creates a RobotArms with mocked serial and state. """
         return RobotArm()
 
     @mock.patch('RobotArm.RobotState')
-    @mock.patch('RobotArm.Serial')
+    @mock.patch('RobotArm.open_serial')
     def test_try_except_serial(self, mocked_serial, _mocked_robot_state):
         """ Test that the try-except block of establishing serial connection. """
         # Arrange & Act
         test_arm = RobotArm()
 
         # Assert
+        self.assertTrue(test_arm.ensure_serial())
         self.assertTrue(hasattr(test_arm, 'Ser'))
 
         # Arrange
@@ -32,11 +37,35 @@ class TestRobotArm(unittest.TestCase):
         test_arm = RobotArm()
 
         # Assert
+        self.assertFalse(test_arm.ensure_serial())
         self.assertFalse(hasattr(test_arm, 'Ser'))
 
+    @mock.patch('RobotArm.RobotState')
+    @mock.patch('RobotArm.open_serial')
+    def test_lazy_serial(self, mocked_serial, _mocked_robot_state):
+        """ Test that the serial port is opened once, on first use, and a failed open is not retried. """
+        # Arrange & Act
+        test_arm = RobotArm()
+
+        # Assert
+        mocked_serial.assert_not_called()
+        test_arm.send(b'\x55')
+        test_arm.send(b'\x55')
+        mocked_serial.assert_called_once()
+
+        # Arrange
+        mocked_serial.side_effect = SerialException()
+        test_arm = RobotArm()
+
+        # Act & Assert
+        self.assertFalse(hasattr(test_arm, 'Ser'))
+        self.assertFalse(test_arm.ensure_serial())
+        self.assertFalse(test_arm.ensure_serial())
+        self.assertEqual(2, mocked_serial.call_count)
+
     @mock.patch('RobotArm.ensure_serial_connection', side_effect=lambda func: func)
     @mock.patch('RobotArm.RobotState')
-    @mock.patch('RobotArm.Serial', return_value=mock.MagicMock())
+    @mock.patch('RobotArm.open_serial', return_value=mock.MagicMock())
     def test_send(self, mocked_serial, _mocked_robot_state, _mocked_ensure_serial):
         """ Test that send passes the packet to the serial write. """
         # Arrange
@@ -54,7 +83,7 @@ class TestRobotArm(unittest.TestCase):
     @mock.patch('RobotArm.ensure_serial_connection', side_effect=lambda func: func)
     @mock.patch('RobotArm.RobotState')
     @mock.patch('RobotArm.RobotArm.handle_packet')
-    @mock.patch('RobotArm.Serial')
+    @mock.patch('RobotArm.open_serial')
     def test_receive_serial(self,  mocked_serial, mocked_handle, _mocked_robot_state, _mocked_ensure_serial):
         """ Test that receive_serial passes the expected message components to handle_packet. """
         # Arrange
@@ -84,6 +113,51 @@ class TestRobotArm(unittest.TestCase):
         self.assertEqual((command_1, message_1), mocked_handle.call_args_list[0][0])
         self.assertEqual((command_2, message_2), mocked_handle.call_args_list[1][0])
 
+    @mock.patch('RobotArm.ensure_serial_connection', side_effect=lambda func: func)
+    @mock.patch('RobotArm.RobotState')
+    @mock.patch('RobotArm.open_serial', return_value=mock.MagicMock())
+    def test_send_failure_dumps_trace(self, mocked_serial, _mocked_robot_state, _mocked_ensure_serial):
+        """ Test that a failing serial write dumps the packet trace, including the failed packet, and re-raises. """
+        # Arrange
+        mocked_serial.return_value.write.side_effect = SerialException('Device disconnected')
+        test_arm = RobotArm()
+
+        # Act
+        with tempfile.TemporaryDirectory() as directory, mock.patch('RobotArm.trace_dir', directory):
+            with self.assertRaises(SerialException):
+                test_arm.send(b'\x55\x55\x02\x07')
+            dumps = os.listdir(directory)
+            with open(os.path.join(directory, dumps[0]), 'rb') as f:
+                records = read_trace(f)
+
+        # Assert
+        self.assertEqual(1, len(dumps))
+        self.assertEqual([(outgoing, b'\x55\x55\x02\x07')], [(record.direction, record.frame) for record in records])
+
+    @mock.patch('RobotArm.ensure_serial_connection', side_effect=lambda func: func)
+    @mock.patch('RobotArm.RobotState')
+    @mock.patch('RobotArm.open_serial', return_value=mock.MagicMock())
+    def test_trace_dumps(self, mocked_serial, _mocked_robot_state, _mocked_ensure_serial):
+        """ Test that bad frames dump no trace and that serial failures within a second get their own dump. """
+        # Arrange
+        mocked_serial.return_value.write.side_effect = SerialException('Device disconnected')
+        test_arm = RobotArm()
+
+        # Act
+        with tempfile.TemporaryDirectory() as directory, mock.patch('RobotArm.trace_dir', directory):
+            with mock.patch.object(test_arm, 'read_packets', side_effect=NotImplementedError), \
+                    self.assertRaises(NotImplementedError):
+                test_arm.receive_serial()
+            bad_frame_dumps = os.listdir(directory)
+            for _ in range(2):
+                with self.assertRaises(SerialException):
+                    test_arm.send(b'\x55\x55\x02\x07')
+            failure_dumps = os.listdir(directory)
+
+        # Assert
+        self.assertEqual([], bad_frame_dumps)
+        self.assertEqual(2, len(failure_dumps))
+
     @mock.patch('RobotArm.RobotArm.handle_position_packet')
     def test_handle_packet(self, mocked_handle_position):
         """ Test that handle_packet handles a serial packet as expected. """
@@ -103,7 +177,7 @@ class TestRobotArm(unittest.TestCase):
         # Assert
         self.assertEqual((test_data, ), mocked_handle_position.call_args[0])
 
-    @mock.patch('RobotArm.Serial')
+    @mock.patch('RobotArm.open_serial')
     @mock.patch('RobotArm.RobotState', return_value=mock.MagicMock())
     def test_handle_position_packet(self, mocked_state, _mocked_serial):
         """ Test that handle_position_packet decodes packets as expected. """
@@ -213,7 +287,7 @@ class TestRobotArm(unittest.TestCase):
         self.assertNotEqual((b'unlock',), mocked_send.call_args[0])
 
     @mock.patch('RobotArm.RobotState')
-    @mock.patch('RobotArm.Serial')
+    @mock.patch('RobotArm.open_serial')
     def test_ensure_serial_connection(self, mocked_serial, _mocked_robot_state):
         """ Test that ensure_serial_connection correctly identifies the presence of a serial connection. """
         # Arrange
@@ -234,4 +308,29 @@ class TestRobotArm(unittest.TestCase):
 
         # Assert
         with self.assertRaises(RuntimeError):
-            dummy_function(test_arm)
\ No newline at end of file
+            dummy_function(test_arm)
+
+    @mock.patch('RobotArm.RobotArm.send')
+    @mock.patch('RobotArm.get_pose_for_target_analytical')
+    def test_move_to_point_collision(self, mocked_get_pose, mocked_send):
+        """ Test that move_to_point does not send moves which the collision checker rejects. """
+        # Arrange
+        test_arm = RobotArm(collision_checker=mock.MagicMock())
+        test_arm.State = RobotState()
+        mocked_get_pose.return_value = RobotState()
+        test_arm.collision_checker.check_move.return_value = 3
+
+        # Act
+        test_arm.move_to_point(mock.MagicMock(), 250)
+
+        # Assert
+        mocked_send.assert_not_called()
+
+        # Arrange
+        test_arm.collision_checker.check_move.return_value = None
+
+        # Act
+        test_arm.move_to_point(mock.MagicMock(), 250)
+
+        # Assert
+        mocked_send.assert_called_once()
@@ -1,7 +1,7 @@
 import unittest
 import numpy as np
 
-from RobotState import RobotState
+from RobotState import RobotState, joints_safe
 from definitions import motor_names
 from definitions import shoulder_to_elbow, elbow_to_wrist, wrist_to_fingers
 
@@ -190,3 +190,19 @@ class TestRobotState(unittest.TestCase):
 
         for state, expected_bool in zip(test_states, expected_results):
             self.assertEqual(RobotState(state).is_state_safe(), expected_bool)
+
+    def test_joints_safe(self):
+        """ Test that joints_safe agrees with is_state_safe for a batch of joint vectors """
+        # Arrange
+        test_states = [
+            RobotState({'base': 0, 'shoulder': 0, 'elbow': 0, 'wrist': 0, 'hand': 0, 'fingers': 0}),
+            RobotState({'base': 120, 'shoulder': 120, 'elbow': 120, 'wrist': 120, 'hand': 120, 'fingers': 120}),
+            RobotState({'base': -120, 'shoulder': 93, 'elbow': -120, 'wrist': 120, 'hand': -120, 'fingers': -49})
+        ]
+        joints = np.array([[state[motor] for motor in motor_names[1:]] for state in test_states])
+
+        # Act
+        result = joints_safe(joints)
+
+        # Assert
+        self.assertEqual([state.is_state_safe() for state in test_states], result.tolist())
@@ -0,0 +1,143 @@
+import mock
+import uuid
+import unittest
+import numpy as np
+from threading import Event, Thread
+
+from RobotArm import RobotArm
+from RobotState import RobotState
+from StateMemory import StatePublisher, StateReader, state_memory_size
+
+
+class TestStateMemory(unittest.TestCase):
+    def setUp(self):
+        self.name = f'xarm_test_{uuid.uuid4().hex[:8]}'
+
+    def test_publish_and_read(self):
+        """ Test that a reader sees the published joints, tip position, timestamp and update count. """
+        # Arrange
+        publisher = StatePublisher(self.name)
+        reader = StateReader(self.name)
+        state = RobotState({'fingers': 0.0, 'base': 10.0, 'elbow': 20.0, 'shoulder': -30.0, 'wrist': 40.0, 'hand': 0.0})
+
+        # Act
+        empty_sequence = reader.read()
+        empty_updates = reader.updates
+        publisher.publish(state, 12.5, 3)
+        sequence = reader.read()
+        joints = reader.get()
+
+        # Assert
+        self.assertEqual(0, empty_sequence)
+        self.assertEqual(0, empty_updates)
+        self.assertEqual(2, sequence)
+        self.assertEqual(dict(state.items()), joints)
+        np.testing.assert_allclose(state.get_cartesian(), reader.cartesian)
+        self.assertEqual(12.5, reader.timestamp)
+        self.assertEqual(3, reader.updates)
+        self.assertGreaterEqual(state_memory_size, 16 + 8 * 11)
+        reader.close()
+        publisher.close()
+
+    def test_consistent_reads(self):
+        """ Test that reads racing a writer never mix values of two states. """
+        # Arrange
+        publisher = StatePublisher(self.name)
+        reader = StateReader(self.name)
+        stopped = Event()
+
+        def write():
+            value = 0
+            while not stopped.is_set():
+                value = (value + 1) % 100
+                publisher.publish(RobotState({joint: float(value) for joint in RobotState().keys()}), value, value)
+        writer = Thread(target=write)
+        publisher.publish(RobotState(), 0.0, 0)
+
+        # Act
+        writer.start()
+        torn = 0
+        for _ in range(20000):
+            reader.read(spins=1)
+            torn += len(set(reader.joints.tolist() + [reader.timestamp])) > 1
+        stopped.set()
+        writer.join()
+
+        # Assert
+        self.assertEqual(0, torn)
+        reader.close()
+        publisher.close()
+
+    def test_concurrent_publishers(self):
+        """ Test that a publish waits while another thread is publishing, and that every publish lands. """
+        # Arrange
+        publisher = StatePublisher(self.name)
+        reader = StateReader(self.name)
+        writers = [Thread(target=publisher.publish, args=(RobotState(), float(value), value)) for value in range(4)]
+
+        # Act
+        with publisher.lock:
+            for writer in writers:
+                writer.start()
+            for writer in writers:
+                writer.join(0.05)
+            blocked = [writer.is_alive() for writer in writers]
+            blocked_sequence = int(publisher.sequence[0])
+        for writer in writers:
+            writer.join()
+        sequence = reader.read()
+
+        # Assert
+        self.assertEqual([True] * 4, blocked)
+        self.assertEqual(0, blocked_sequence)
+        self.assertEqual(8, sequence)
+        reader.close()
+        publisher.close()
+
+    def test_read_timeout(self):
+        """ Test that a reader gives up on a block whose writer died mid-write. """
+        # Arrange
+        publisher = StatePublisher(self.name)
+        reader = StateReader(self.name)
+        publisher.sequence[0] += 1
+
+        # Act & Assert
+        with self.assertRaises(TimeoutError):
+            reader.read(timeout_s=0.01)
+        reader.close()
+        publisher.close()
+
+    def test_stale_block(self):
+        """ Test that a block left by a crashed publisher is replaced, and that missing blocks raise. """
+        # Arrange
+        StatePublisher(self.name).memory.close()
+
+        # Act
+        publisher = StatePublisher(self.name)
+
+        # Assert
+        self.assertEqual(0, StateReader(self.name).read())
+        publisher.close()
+        with self.assertRaises(FileNotFoundError):
+            StateReader(self.name)
+
+    @mock.patch('RobotArm.open_serial')
+    def test_arm_publishes(self, _mocked_serial):
+        """ Test that RobotArm publishes position replies and commanded moves. """
+        # Arrange
+        arm = RobotArm()
+        arm.start_publishing(self.name)
+        reader = StateReader(self.name)
+
+        # Act
+        first = reader.read()
+        arm.handle_position_packet(bytes([1, 2, 0xf4, 0x01]))
+        second = reader.read()
+        arm.stop_publishing()
+
+        # Assert
+        self.assertEqual(2, first)
+        self.assertEqual(4, second)
+        self.assertEqual(1, reader.updates)
+        self.assertAlmostEqual(0.0, reader.get()['base'])
+        reader.close()
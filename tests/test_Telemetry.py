@@ -0,0 +1,138 @@
+import mock
+import unittest
+
+from RobotState import RobotState
+from Telemetry import Telemetry
+
+
+class FakeArm:
+    """ Arm whose position replies arrive a fixed delay after each request. """
+    def __init__(self, clock, reply_delay):
+        self.clock = clock
+        self.reply_delay = reply_delay
+        self.State = RobotState()
+        self.position_updates = 0
+        self.last_update = 0.0
+        self.requested_at = None
+
+    def request_positions(self):
+        self.requested_at = self.clock()
+
+    def receive_serial(self):
+        if self.requested_at is not None and self.clock() >= self.requested_at + self.reply_delay:
+            self.State.update_state({'base': float(self.position_updates)})
+            self.last_update = self.clock()
+            self.position_updates += 1
+            self.requested_at = None
+
+
+class TestTelemetry(unittest.TestCase):
+    def create(self, reply_delay, rate_hz=10.0, capacity=16, timeout_s=None):
+        current_time = [0.0]
+
+        def clock():
+            return current_time[0]
+
+        def wait(seconds):
+            current_time[0] += seconds
+
+        arm = FakeArm(clock, reply_delay)
+        return Telemetry(arm, rate_hz, capacity, clock, wait, poll_s=0.001, timeout_s=timeout_s)
+
+    def test_fixed_rate(self):
+        """ Test that telemetry samples at the requested rate and measures reply latency. """
+        # Arrange
+        telemetry = self.create(reply_delay=0.02)
+
+        # Act
+        telemetry.run(cycles=10)
+        stats = telemetry.stats()
+
+        # Assert
+        self.assertEqual(10, telemetry.count)
+        self.assertAlmostEqual(10.0, stats['rate_hz'], places=6)
+        self.assertAlmostEqual(20.0, stats['latency_p50_ms'], delta=1.0)
+        self.assertEqual(0, stats['overruns'])
+        self.assertEqual(0, stats['timeouts'])
+
+    def test_ring_buffer(self):
+        """ Test that the ring buffer keeps the most recent samples in chronological order. """
+        # Arrange
+        telemetry = self.create(reply_delay=0.001, capacity=4)
+
+        # Act
+        telemetry.run(cycles=10)
+        latest = telemetry.latest()
+
+        # Assert
+        self.assertEqual((4, 8), latest.shape)
+        self.assertEqual([6.0, 7.0, 8.0, 9.0], list(latest[:, 2 + 1]))
+        self.assertEqual(2, len(telemetry.latest(2)))
+
+    def test_timeouts_and_overruns(self):
+        """ Test that missing replies are counted as timeouts and slow replies as overruns. """
+        # Arrange
+        silent = self.create(reply_delay=1.0)
+        slow = self.create(reply_delay=0.001, timeout_s=0.5)
+        slow.arm.request_positions = mock.MagicMock(side_effect=lambda: (FakeArm.request_positions(slow.arm),
+                                                                          slow.wait(0.25)))
+
+        # Act
+        silent.run(cycles=3)
+        slow.run(cycles=6)
+
+        # Assert
+        self.assertEqual(3, silent.timeouts)
+        self.assertEqual(0, silent.count)
+        self.assertEqual(2, slow.count)
+        self.assertEqual(2, slow.overruns)
+
+    def test_bad_frames(self):
+        """ Test that unknown and truncated frames are skipped without stopping telemetry. """
+        # Arrange
+        telemetry = self.create(reply_delay=0.002)
+        errors = [NotImplementedError('Command code not recognized: 7'), IndexError('index out of range')]
+        receive_serial = telemetry.arm.receive_serial
+
+        def noisy_receive_serial():
+            if errors:
+                raise errors.pop(0)
+            receive_serial()
+        telemetry.arm.receive_serial = noisy_receive_serial
+
+        # Act
+        telemetry.run(cycles=5)
+
+        # Assert
+        self.assertEqual(5, telemetry.count)
+        self.assertEqual(2, telemetry.stats()['bad_frames'])
+        self.assertEqual(0, telemetry.timeouts)
+
+    def test_stops_without_connection(self):
+        """ Test that telemetry stops when the arm has no serial connection. """
+        # Arrange
+        telemetry = self.create(reply_delay=0.002)
+        telemetry.arm.request_positions = mock.MagicMock(side_effect=RuntimeError)
+
+        # Act
+        telemetry.run(cycles=5)
+
+        # Assert
+        telemetry.arm.request_positions.assert_called_once_with()
+        self.assertEqual(0, telemetry.count)
+
+    @mock.patch('RobotArm.open_serial')
+    def test_robot_arm_telemetry(self, _mocked_serial):
+        """ Test that RobotArm starts and stops its telemetry thread. """
+        # Arrange
+        from RobotArm import RobotArm
+        test_arm = RobotArm()
+
+        # Act
+        with mock.patch('Telemetry.Telemetry.run'):
+            telemetry = test_arm.start_telemetry(rate_hz=50.0)
+            test_arm.stop_telemetry()
+
+        # Assert
+        self.assertIs(telemetry, test_arm.telemetry)
+        self.assertIsNone(telemetry.thread)
@@ -0,0 +1,117 @@
+import mock
+import unittest
+from os import listdir, path
+from tempfile import TemporaryDirectory
+
+import packetmaker as pk
+from Point import Point
+from RobotState import RobotState
+from motion_compiler import CompiledMotion, MotionStep, compile_program, hash_program, play_compiled
+
+
+class TestMotionCompiler(unittest.TestCase):
+    test_program = [
+        MotionStep.point(Point(cartesian=(10, 10, 10)), 1000, fingers=20),
+        MotionStep.approach(Point(cartesian=(10, 10, 10)), -30, 500),
+        MotionStep.joints({'base': 15.0}, 250),
+    ]
+
+    def test_compile_program(self):
+        """ Test that compile_program encodes one timestamped frame per step. """
+        # Arrange & Act
+        compiled = compile_program(self.test_program)
+
+        # Assert
+        self.assertEqual([0, 1000, 1500], [timestamp for timestamp, _frame in compiled.frames])
+        for _timestamp, frame in compiled.frames:
+            self.assertEqual(bytes([0x55, 0x55]), frame[:2])
+
+    def test_compile_joints_holds_missing_motors(self):
+        """ Test that joint steps keep the angles of motors that are not specified. """
+        # Arrange
+        initial_state = RobotState({'base': 0.0, 'shoulder': 10.0, 'elbow': 20.0,
+                                    'wrist': 30.0, 'hand': 0.0, 'fingers': -10.0})
+        expected_state = dict(vars(initial_state), base=15.0)
+
+        # Act
+        compiled = compile_program([MotionStep.joints({'base': 15.0}, 250)], initial_state)
+
+        # Assert
+        self.assertEqual(pk.write_servo_move(expected_state, 250), compiled.frames[0][1])
+
+    def test_joints_step(self):
+        """ Test that joint steps hold only the motors they were given, in motor order. """
+        # Arrange & Act
+        step = MotionStep.joints({'hand': 5.0, 'base': 15.0}, 250)
+
+        # Assert
+        self.assertEqual(('base', 'hand'), step.motors)
+        self.assertEqual((15.0, 5.0), step.target)
+
+    def test_hash_follows_compiler(self):
+        """ Test that a change of the kinematics or encoder code changes the program hash. """
+        # Arrange
+        initial_state = RobotState()
+        program_hash = hash_program(self.test_program, initial_state)
+
+        # Act
+        with mock.patch('motion_compiler.compiler_token', return_value='changed'):
+            changed_hash = hash_program(self.test_program, initial_state)
+
+        # Assert
+        self.assertEqual(program_hash, hash_program(self.test_program, initial_state))
+        self.assertNotEqual(program_hash, changed_hash)
+
+    def test_compile_unsafe_program(self):
+        """ Test that compile_program refuses programs with unsafe steps. """
+        # Arrange
+        unsafe_program = [MotionStep.joints({'shoulder': 110.0}, 250)]
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            compile_program(unsafe_program)
+
+    def test_serialization(self):
+        """ Test that a compiled motion survives a round trip through its binary form. """
+        # Arrange
+        compiled = compile_program(self.test_program)
+
+        # Act
+        restored = CompiledMotion.from_bytes(compiled.to_bytes())
+
+        # Assert
+        self.assertEqual(compiled, restored)
+        with self.assertRaises(ValueError):
+            CompiledMotion.from_bytes(b'PICKLE' + compiled.to_bytes())
+
+    @mock.patch('motion_compiler.get_pose_for_target_analytical', side_effect=lambda point: RobotState())
+    def test_compile_cache(self, mocked_get_pose):
+        """ Test that compiled programs are reused from the cache directory. """
+        # Arrange
+        program = self.test_program[:1]
+        with TemporaryDirectory() as tempdir:
+            # Act
+            first = compile_program(program, cache_dir=tempdir)
+            second = compile_program(program, cache_dir=tempdir)
+
+            # Assert
+            self.assertEqual(1, len(listdir(tempdir)))
+            self.assertTrue(path.isfile(path.join(tempdir, first.program_hash.hex() + '.xacm')))
+        self.assertEqual(first, second)
+        mocked_get_pose.assert_called_once()
+
+    def test_play_compiled(self):
+        """ Test that play_compiled sends frames at their scheduled offsets. """
+        # Arrange
+        compiled = CompiledMotion([(0, b'a'), (500, b'b'), (1500, b'c')])
+        current_time = [100.0]
+        sent = []
+
+        def wait(seconds):
+            current_time[0] += seconds
+
+        # Act
+        play_compiled(lambda frame: sent.append((current_time[0], frame)), compiled, lambda: current_time[0], wait)
+
+        # Assert
+        self.assertEqual([(100.0, b'a'), (100.5, b'b'), (101.5, b'c')], sent)
@@ -48,4 +48,11 @@ class TestPacketMaker(snapshottest.TestCase):
 
         # Act & Assert
         self.assertMatchSnapshot(write_request_positions())
-        self.assertMatchSnapshot(write_request_positions(test_joint_list))
\ No newline at end of file
+        self.assertMatchSnapshot(write_request_positions(test_joint_list))
+
+    def test_write_action_group_commands(self):
+        """ Test that the action group commands return the expected packets. """
+        # Arrange, Act & Assert
+        self.assertEqual(bytes([0x55, 0x55, 5, 6, 3, 0x2C, 0x01]), write_run_action_group(3, 300))
+        self.assertEqual(bytes([0x55, 0x55, 2, 7]), write_stop_action())
+        self.assertEqual(bytes([0x55, 0x55, 5, 11, 0xFF, 150, 0]), write_action_speed(0xFF, 150))
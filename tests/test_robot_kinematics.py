@@ -1,4 +1,5 @@
 import unittest
+import numpy as np
 from random import random
 from numpy.random import rand
 
@@ -6,7 +7,7 @@ from Point import Point
 from RobotState import RobotState
 
 from definitions import joints_list
-from robot_kinematics import approach_point_from_angle, get_pose_for_target_analytical
+from robot_kinematics import approach_point_from_angle, forward_kinematics, get_pose_for_target_analytical
 
 
 class TestRobotKinematics(unittest.TestCase):
@@ -107,3 +108,13 @@ class TestRobotKinematics(unittest.TestCase):
             state = approach_point_from_angle(test_point, test_angle)
             for expect, test in zip(test_point.cartesian, state.get_cartesian()):
                 self.assertAlmostEqual(expect, test, delta=1e-4)
+
+    def test_forward_kinematics(self):
+        """ Test that the batched finger tip matches RobotState.get_cartesian above the shoulder. """
+        for _ in range(10):
+            state = RobotState({'base': (180 * random()) - 90, 'shoulder': 30 * random(), 'elbow': 30 * random(),
+                                'wrist': 30 * random(), 'hand': 0.0, 'fingers': 0.0})
+            endpoints = forward_kinematics(np.array(list(state)))
+            self.assertEqual((1, 4, 3), endpoints.shape)
+            for expect, test in zip(state.get_cartesian(), endpoints[0, -1]):
+                self.assertAlmostEqual(expect, test, delta=1e-6)
@@ -1,11 +1,16 @@
+import sys
 import mock
+import subprocess
 import snapshottest
+from os import path
+from time import sleep
 from cmd2 import Statement
 from sys import stdin, stdout
 from serial import SerialException
 
 from robot_session import RobotSession
 from Point import Point
+import packetmaker as pk
 
 
 # noinspection PyUnresolvedReferences
@@ -14,14 +19,14 @@ class TestRobotSession(snapshottest.TestCase):
         self.mock_stdin = mock.create_autospec(stdin)
         self.mock_stdout = mock.create_autospec(stdout)
 
-    @mock.patch('RobotArm.Serial')
+    @mock.patch('RobotArm.open_serial')
     def create(self, mocked_serial):
         mocked_serial.return_value = mock.MagicMock()
         mocked_serial.return_value.inWaiting.return_value = False
         mocked_serial.return_value.write = mock.MagicMock()
         return RobotSession(stdin=self.mock_stdin, stdout=self.mock_stdout)
 
-    @mock.patch('RobotArm.Serial', side_effect=SerialException())
+    @mock.patch('RobotArm.open_serial', side_effect=SerialException())
     def no_serial_create(self, mocked_serial):
         mocked_serial.return_value = mock.MagicMock()
         mocked_serial.return_value.inWaiting.return_value = False
@@ -61,6 +66,22 @@ class TestRobotSession(snapshottest.TestCase):
         self.assertMatchSnapshot(str(session.arm.Ser.write.call_args_list[0]))
         self.assertMatchSnapshot(str(session.arm.Ser.write.call_args_list[1]))
 
+    def test_move_publishes(self):
+        """ Test that move publishes the state only once the command was sent. """
+        # Arrange
+        no_serial_session = self.no_serial_create()
+        session = self.create()
+
+        # Act
+        with mock.patch.object(no_serial_session.arm, 'publish_state') as mocked_no_serial_publish, \
+                mock.patch.object(session.arm, 'publish_state') as mocked_publish:
+            no_serial_session.do_move('--base 50')
+            session.do_move('--base 50')
+
+        # Assert
+        mocked_no_serial_publish.assert_not_called()
+        mocked_publish.assert_called_once()
+
     # noinspection PyTypeChecker
     def test_move2point(self):
         """ Test that move2point sends the expected arguments to the arm. """
@@ -123,3 +144,156 @@ class TestRobotSession(snapshottest.TestCase):
         self.assertTrue(len(session.arm.Ser.write.call_args_list) == 2)
         self.assertMatchSnapshot(str(session.arm.Ser.write.call_args_list[0]))
         self.assertMatchSnapshot(str(session.arm.Ser.write.call_args_list[1]))
+
+    def test_action(self):
+        """ Test that action runs and stops controller action groups. """
+        # Arrange
+        session = self.create()
+
+        # Act
+        session.do_action('2 -n 0 -s 50')
+        session.do_action('--stop')
+        session.do_action('')
+
+        # Assert
+        self.assertEqual([b'UU\x05\x0b\x02\x32\x00', b'UU\x05\x06\x02\x00\x00', b'UU\x02\x07'],
+                         [write_call[0][0] for write_call in session.arm.Ser.write.call_args_list])
+
+    def test_batch(self):
+        """ Test that batch validates the whole script before sending, then plays every frame. """
+        # Arrange
+        session = self.create()
+        script = ['# Generated script', 'move --base 10 -t 500', 'move2point --cart 10 10 10 -t 250',
+                  'unlock fingers', 'approach --cart 10 10 10 -a -30 -t 250']
+        bad_script = ['move --base 10', 'move2point -t 250', 'approach --cart 100 100 100', 'poll']
+
+        # Act
+        steps = session.parse_script(script)
+        compiled, final_state, duration_ms = session.compile_script(steps)
+        with self.assertRaises(ValueError) as context:
+            session.compile_script(session.parse_script([bad_script[0], '', bad_script[2]]))
+        with self.assertRaises(ValueError) as parse_context:
+            session.parse_script(bad_script)
+
+        with mock.patch('robot_session.open', mock.mock_open(read_data='\n'.join(script))), \
+                mock.patch('motion_compiler.play_compiled') as mocked_play, mock.patch('robot_session.print'):
+            session.do_batch('script.txt -n')
+            mocked_play.assert_not_called()
+            session.do_batch('script.txt')
+
+        # Assert
+        self.assertEqual(4, len(compiled))
+        self.assertEqual([0, 500, 750, 750], [timestamp for timestamp, _frame in compiled.frames])
+        self.assertEqual(1000, duration_ms)
+        self.assertIn('Line 3', str(context.exception))
+        self.assertEqual(['Line 2', 'Line 4'], [line[:6] for line in str(parse_context.exception).splitlines()])
+        self.assertEqual(compiled.frames, mocked_play.call_args[0][1].frames)
+        self.assertEqual(final_state, session.arm.State)
+
+    def test_monitor(self):
+        """ Test that monitor starts telemetry in the background and stops it again. """
+        # Arrange
+        session = self.create()
+
+        # Act
+        with mock.patch('RobotArm.Telemetry') as mocked_telemetry:
+            session.do_monitor('-r 50 --refresh 4')
+            monitor = session.monitor
+            session.do_monitor('off')
+
+        # Assert
+        self.assertEqual(50.0, mocked_telemetry.call_args[0][1])
+        self.assertEqual(0.25, monitor.period)
+        mocked_telemetry.return_value.stop.assert_called_once()
+        self.assertIsNone(session.monitor)
+
+    def test_monitor_shares_port(self):
+        """ Test that commands and the telemetry of a running monitor never write to the port at once. """
+        # Arrange
+        class SlowSerial:
+            def __init__(self, *_args):
+                self.writing = 0
+                self.overlaps = 0
+                self.writes = []
+
+            def write(self, data):
+                self.writing += 1
+                self.overlaps += self.writing > 1
+                sleep(0.001)
+                self.writes.append(data)
+                self.writing -= 1
+
+            def inWaiting(self):
+                return 0
+
+        with mock.patch('RobotArm.open_serial', side_effect=SlowSerial):
+            session = RobotSession(stdin=self.mock_stdin, stdout=self.mock_stdout)
+        session.render_monitor = mock.MagicMock(return_value=True)
+
+        # Act
+        session.do_monitor('-r 500')
+        for _ in range(20):
+            session.do_move('--base 10')
+        session.do_monitor('off')
+
+        # Assert
+        self.assertEqual(0, session.arm.Ser.overlaps)
+        self.assertIn(pk.write_request_positions(), session.arm.Ser.writes)
+
+    @mock.patch('robot_session.print')
+    def test_stats(self, mocked_print):
+        """ Test that stats records the arm's metrics once enabled. """
+        # Arrange
+        session = self.create()
+
+        # Act
+        session.do_stats('on')
+        session.do_unlock(Statement(''))
+        session.do_stats('')
+        session.do_stats('reset')
+        session.do_stats('off')
+
+        # Assert
+        output = mocked_print.call_args[0][0]
+        self.assertIn('Metrics recording is on.', output)
+        self.assertIn('arm.send', output)
+        self.assertIn('packetmaker.write_servo_unlock', output)
+        self.assertIn('arm.bytes_sent', output)
+
+    @mock.patch('robot_session.print')
+    def test_profile(self, mocked_print):
+        """ Test that commands run through the command loop are profiled per command once enabled. """
+        # Arrange
+        session = self.create()
+
+        # Act
+        session.onecmd_plus_hooks('unlock')
+        session.onecmd_plus_hooks('profile on')
+        session.onecmd_plus_hooks('unlock')
+        session.onecmd_plus_hooks('unlock base')
+        session.onecmd_plus_hooks('profile off')
+        session.onecmd_plus_hooks('unlock')
+        session.onecmd_plus_hooks('profile')
+
+        # Assert
+        self.assertEqual({'unlock': 2}, session.profiler.runs)
+        self.assertIsNone(session.profiler.active)
+        output = mocked_print.call_args[0][0]
+        self.assertIn('Profiling is off.', output)
+        self.assertIn('unlock: 2 runs', output)
+
+    def test_lazy_imports(self):
+        """ Test that starting a session defers pyserial, IPython, cProfile, the motion compiler and shared memory,
+            and leaves IPython importable. """
+        # Arrange
+        code = ('import sys, importlib; from robot_session import RobotSession; RobotSession(); '
+                'print(*(name in sys.modules for name in '
+                '("serial", "IPython", "cProfile", "motion_compiler", "StateMemory"))); '
+                'importlib.import_module("IPython")')
+
+        # Act
+        output = subprocess.run([sys.executable, '-c', code], cwd=path.dirname(path.dirname(__file__)),
+                                stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True).stdout
+
+        # Assert
+        self.assertEqual(b'False False False False False', output.strip())
@@ -0,0 +1,116 @@
+import unittest
+import numpy as np
+
+from MotionPath import MotionPath
+from definitions import motor_names
+from trajectory import clamp_velocity, max_joint_speeds, resample, resample_path, servo_resolution_deg, \
+    simplify, simplify_path, warp_times
+
+
+class TestTrajectory(unittest.TestCase):
+    # Shoulder sweeps out and back along a straight line in time; the base holds still.
+    test_times = np.linspace(0, 2, 201)
+    test_joints = np.zeros((201, 6))
+    test_joints[:, motor_names.index('shoulder') - 1] = 60 * (1 - np.abs(test_times - 1))
+
+    def test_simplify_lines(self):
+        """ Test that linear segments reduce to their corners. """
+        # Arrange, Act & Assert
+        self.assertEqual([0, 100, 200], list(simplify(self.test_joints, self.test_times)))
+        self.assertEqual([0, 1], list(simplify(self.test_joints[:2])))
+
+    def test_simplify_tolerance(self):
+        """ Test that every dropped sample is reproduced within the tolerance. """
+        # Arrange
+        joints = self.test_joints.copy()
+        joints[:, motor_names.index('base') - 1] = 20 * np.sin(3 * self.test_times)
+
+        # Act
+        kept = simplify(joints, self.test_times, tolerance=0.5)
+        reproduced = np.column_stack([np.interp(self.test_times, self.test_times[kept], joints[kept, column])
+                                      for column in range(6)])
+
+        # Assert
+        self.assertLess(len(kept), len(joints) // 4)
+        self.assertLessEqual(np.abs(reproduced - joints).max(), 0.5)
+
+    def test_simplify_cartesian(self):
+        """ Test that Cartesian tolerances keep gripper motion that does not move the finger tip. """
+        # Arrange
+        joints = self.test_joints.copy()
+        joints[150:, motor_names.index('fingers') - 1] = 30.0
+
+        # Act
+        kept = simplify(joints, self.test_times, tolerance=0.1, cartesian=True)
+
+        # Assert
+        self.assertIn(150, kept)
+        self.assertIn(149, kept)
+
+    def test_simplify_path(self):
+        """ Test that timed paths get the duration of each kept segment and keyframes stay untimed. """
+        # Arrange
+        durations = np.concatenate(([0], np.full(200, 10)))
+        timed = MotionPath(self.test_joints, self.test_times, durations)
+        keyframes = MotionPath(self.test_joints)
+
+        # Act
+        simplified = simplify_path(timed, servo_resolution_deg)
+        simplified_keyframes = simplify_path(keyframes)
+
+        # Assert
+        self.assertEqual(3, len(simplified))
+        np.testing.assert_allclose([0, 1000, 1000], simplified.durations)
+        np.testing.assert_allclose([0, 1, 2], simplified.timestamps)
+        self.assertEqual(3, len(simplified_keyframes))
+        self.assertIsNone(simplified_keyframes.durations)
+
+    def test_warp_times(self):
+        """ Test that speed factors shrink or stretch each segment. """
+        # Arrange
+        times = np.array([1.0, 2.0, 4.0])
+
+        # Act & Assert
+        np.testing.assert_allclose([1.0, 1.5, 2.5], warp_times(times, 2.0))
+        np.testing.assert_allclose([1.0, 3.0, 4.0], warp_times(times, np.array([0.5, 2.0])))
+        with self.assertRaises(ValueError):
+            warp_times(times, 0.0)
+
+    def test_clamp_velocity(self):
+        """ Test that segments too fast for a joint are stretched to its speed limit. """
+        # Arrange
+        joints = np.zeros((3, 6))
+        joints[1, motor_names.index('shoulder') - 1] = 45.0
+
+        # Act
+        times = clamp_velocity(joints, np.array([0.0, 0.1, 2.0]))
+
+        # Assert
+        np.testing.assert_allclose([0.0, 45.0 / max_joint_speeds['shoulder'], 45.0 / max_joint_speeds['shoulder']
+                                    + 1.9], times)
+
+    def test_resample(self):
+        """ Test that resampling at a fixed rate reproduces the trajectory at the new times. """
+        # Arrange
+        shoulder = motor_names.index('shoulder') - 1
+
+        # Act
+        times, joints = resample(self.test_joints[::50], self.test_times[::50], rate_hz=10, speed=0.5)
+
+        # Assert
+        self.assertEqual(41, len(times))
+        np.testing.assert_allclose(np.diff(times), 0.1)
+        np.testing.assert_allclose(joints[:, shoulder], 60 * (1 - np.abs(times / 2 - 1)), atol=1e-9)
+
+    def test_resample_path(self):
+        """ Test that a keyframe path becomes a timed path of evenly spaced frames. """
+        # Arrange
+        motion_path = MotionPath(self.test_joints[::100])
+
+        # Act
+        resampled = resample_path(motion_path, rate_hz=4, time_ms=2000)
+
+        # Assert
+        self.assertEqual(17, len(resampled))
+        np.testing.assert_allclose(resampled.durations, [0] + [250] * 16)
+        np.testing.assert_allclose(resampled.joints[-1], self.test_joints[-1])
@@ -0,0 +1,98 @@
+import json
+import mock
+import pickle
+import unittest
+import numpy as np
+from os import path
+from tempfile import TemporaryDirectory
+
+from MotionPath import MotionPath
+from definitions import motor_names
+from validate_motionpaths import peak_velocities, summary_name, validate, validate_directory
+
+
+class TestValidateMotionPaths(unittest.TestCase):
+    shoulder = motor_names.index('shoulder') - 1
+    test_joints = np.zeros((3, 6))
+    test_joints[1, shoulder] = 30.0
+
+    def test_peak_velocities(self):
+        """ Test that peak velocities use the recorded durations, or the keyframe time for keyframe paths. """
+        # Arrange
+        timed = MotionPath(self.test_joints, durations=np.array([0, 500, 0], dtype=np.float32))
+        keyframes = MotionPath(self.test_joints)
+
+        # Act & Assert
+        self.assertEqual(60.0, peak_velocities(timed)[self.shoulder])
+        self.assertEqual(15.0, peak_velocities(keyframes, time_ms=2000)[self.shoulder])
+
+    def test_validate(self):
+        """ Test that validate reports unsafe poses and joints moving faster than their limit. """
+        # Arrange
+        with TemporaryDirectory() as tempdir:
+            filename = path.join(tempdir, 'fast')
+            joints = self.test_joints.copy()
+            joints[1, self.shoulder] = 120.0
+            MotionPath(joints, durations=np.array([0, 100, 100], dtype=np.float32)).save(filename)
+
+            # Act
+            report = validate(filename)
+
+            # Assert
+            self.assertFalse(report['valid'])
+            self.assertEqual(1, report['first_unsafe'])
+            self.assertEqual(1200.0, report['peak_velocity_dps']['shoulder'])
+            self.assertEqual(2, len(report['problems']))
+
+    @mock.patch('validate_motionpaths.CollisionChecker')
+    def test_validate_collisions(self, mocked_checker):
+        """ Test that collisions are only reported when they are asked for. """
+        # Arrange
+        mocked_checker.return_value.first_collision.return_value = 2
+        with TemporaryDirectory() as tempdir:
+            filename = path.join(tempdir, 'wave')
+            MotionPath(self.test_joints).save(filename)
+
+            # Act
+            default = validate(filename)
+            checked = validate(filename, collisions=True)
+
+            # Assert
+            self.assertTrue(default['valid'])
+            self.assertFalse(checked['valid'])
+            self.assertEqual(2, checked['first_unsafe'])
+
+    def test_validate_unreadable(self):
+        """ Test that a file which fails to load in any way is reported as unreadable. """
+        # Arrange
+        with TemporaryDirectory() as tempdir:
+            filename = path.join(tempdir, 'settings')
+            with open(filename, 'wb') as f:
+                pickle.dump({'speed': 2.0}, f)
+
+            # Act
+            report = validate(filename)
+
+            # Assert
+            self.assertFalse(report['valid'])
+            self.assertTrue(report['problems'][0].startswith('Unreadable: TypeError'))
+
+    def test_validate_directory(self):
+        """ Test that a directory is validated in parallel into per-file reports and a summary. """
+        # Arrange
+        with TemporaryDirectory() as tempdir:
+            MotionPath(self.test_joints).save(path.join(tempdir, 'wave'))
+            with open(path.join(tempdir, 'broken'), 'wb') as f:
+                f.write(b'not a motion path')
+            output = path.join(tempdir, 'reports')
+
+            # Act
+            summary = validate_directory(tempdir, output, workers=2)
+
+            # Assert
+            self.assertEqual(2, summary['recordings'])
+            self.assertEqual(['broken'], summary['invalid'])
+            self.assertEqual(3.0, summary['playback_s'])
+            with open(path.join(output, 'wave.json')) as f:
+                self.assertTrue(json.load(f)['valid'])
+            self.assertTrue(path.isfile(path.join(output, summary_name)))
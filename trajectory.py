@@ -0,0 +1,198 @@
+import logging
+import numpy as np
+from numpy.linalg import norm
+from typing import Dict, Optional, Tuple, Union
+
+from MotionPath import MotionPath
+from definitions import motor_names
+from robot_kinematics import forward_kinematics
+
+log = logging.getLogger('Trajectory')
+
+# One servo count: degrees_to_rotation maps 240 degrees onto 1000 counts.
+servo_resolution_deg: float = 240 / 1000
+gripper_columns = [motor_names.index(motor) - 1 for motor in ('hand', 'fingers')]
+# Fastest joint motion allowed when a trajectory is retimed, in degrees per second.
+max_joint_speeds: Dict[str, float] = \
+    {
+        'fingers': 180.0,
+        'base': 120.0,
+        'elbow': 120.0,
+        'shoulder': 90.0,
+        'wrist': 180.0,
+        'hand': 180.0
+    }
+
+
+def sample_times(motion_path: MotionPath) -> Optional[np.ndarray]:
+    """ Playback times in seconds of a timed motion path, or None for keyframes (paths without durations). """
+    if motion_path.durations is None:
+        return None
+    return np.cumsum(np.asarray(motion_path.durations, dtype=np.float64)) / 1000
+
+
+def simplify(joints: np.ndarray, times: Optional[np.ndarray] = None,
+             tolerance: float = servo_resolution_deg, cartesian: bool = False) -> np.ndarray:
+    """
+        Ramer-Douglas-Peucker simplification of a joint trajectory.
+        The servos move linearly in time between frames, so each sample is compared with the interpolation
+        between the kept waypoints at the same instant.
+    :param joints: Array of shape (N, 6) of joint angles in motor_names[1:] order.
+    :param times: Sample times. (Defaults to evenly spaced samples.)
+    :param tolerance: Largest allowed error: degrees on any joint or, if cartesian, distance of the finger tip
+                      (hand and fingers are then held to one servo count).
+    :param cartesian: Measure the error at the finger tip through forward kinematics.
+    :return: Sorted indices of the samples to keep, always including the first and last.
+    """
+    joints = np.asarray(joints, dtype=np.float64)
+    count = len(joints)
+    if count <= 2:
+        return np.arange(count)
+    times = np.arange(count, dtype=np.float64) if times is None else np.asarray(times, dtype=np.float64)
+    tips = forward_kinematics(joints)[:, -1] if cartesian else None
+
+    keep = np.zeros(count, dtype=bool)
+    keep[[0, -1]] = True
+    segments = [(0, count - 1)]
+    while segments:
+        start, end = segments.pop()
+        if end - start < 2:
+            continue
+
+        span = times[end] - times[start]
+        fractions = (times[start + 1:end] - times[start]) / span if span > 0 else \
+            np.arange(1, end - start) / (end - start)
+        interpolated = joints[start] + fractions[:, np.newaxis] * (joints[end] - joints[start])
+        deviation = np.abs(interpolated - joints[start + 1:end])
+
+        # Errors relative to their tolerance, so a ratio above one means the sample must be kept.
+        if tips is not None:
+            tip_error = norm(forward_kinematics(interpolated)[:, -1] - tips[start + 1:end], axis=1) / tolerance
+            gripper_error = deviation[:, gripper_columns].max(axis=1) / servo_resolution_deg
+            ratio = np.maximum(tip_error, gripper_error)
+        else:
+            ratio = deviation.max(axis=1) / tolerance
+
+        worst = int(np.argmax(ratio))
+        if ratio[worst] > 1:
+            split = start + 1 + worst
+            keep[split] = True
+            segments += [(start, split), (split, end)]
+    return np.flatnonzero(keep)
+
+
+def simplify_path(motion_path: MotionPath, tolerance: float = servo_resolution_deg,
+                  cartesian: bool = False) -> MotionPath:
+    """
+        Reduce a motion path to the waypoints needed to reproduce it within a tolerance.
+    :param motion_path: Motion path to simplify.
+    :param tolerance: See simplify.
+    :param cartesian: See simplify.
+    :return: MotionPath of the kept waypoints. Timed paths get the duration of each new segment.
+    """
+    times = sample_times(motion_path)
+    kept = simplify(motion_path.joints, times, tolerance, cartesian)
+    log.info(f'Simplified {len(motion_path)} samples to {len(kept)} waypoints.')
+
+    timestamps = None if motion_path.timestamps is None else np.asarray(motion_path.timestamps)[kept]
+    durations = None
+    if times is not None and motion_path.durations is not None:
+        first_duration = float(motion_path.durations[0])
+        durations = np.concatenate(([first_duration], 1000 * np.diff(times[kept]))).astype(np.float32)
+    return MotionPath(np.asarray(motion_path.joints)[kept], timestamps, durations)
+
+
+def warp_times(times: np.ndarray, speed: Union[float, np.ndarray] = 1.0) -> np.ndarray:
+    """
+        Retime a trajectory by a speed factor.
+    :param times: Increasing sample times in seconds.
+    :param speed: Speed factor, either one for the whole trajectory or an array with one per segment.
+    :return: New sample times starting at the same time.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    speed = np.broadcast_to(np.asarray(speed, dtype=np.float64), (max(len(times) - 1, 0),))
+    if np.any(speed <= 0):
+        raise ValueError('Speed factors must be positive.')
+    return times[0] + np.concatenate(([0.0], np.cumsum(np.diff(times) / speed)))
+
+
+def speed_limits(limits: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """ Joint speed limits in degrees per second in motor_names[1:] order. (Defaults to max_joint_speeds.) """
+    limits = max_joint_speeds if limits is None else limits
+    return np.array([limits[motor] for motor in motor_names[1:]], dtype=np.float64)
+
+
+def clamp_velocity(joints: np.ndarray, times: np.ndarray,
+                   limits: Optional[Dict[str, float]] = None) -> np.ndarray:
+    """
+        Stretch the segments of a trajectory in which any joint would exceed its speed limit.
+    :param joints: Array of shape (N, 6) of joint angles in motor_names[1:] order.
+    :param times: Increasing sample times in seconds.
+    :param limits: Speed limits in degrees per second by motor name. (Defaults to max_joint_speeds.)
+    :return: New sample times starting at the same time.
+    """
+    times = np.asarray(times, dtype=np.float64)
+    steps = np.abs(np.diff(np.asarray(joints, dtype=np.float64), axis=0))
+    shortest = (steps / speed_limits(limits)).max(axis=1, initial=0.0)
+    clamped = np.maximum(np.diff(times), shortest)
+    return times[0] + np.concatenate(([0.0], np.cumsum(clamped)))
+
+
+def interpolate(joints: np.ndarray, times: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    """
+        Linearly interpolate every joint of a trajectory at once.
+    :param joints: Array of shape (N, 6) of joint angles.
+    :param times: Increasing sample times of the joints.
+    :param targets: Times to interpolate at. Times outside the trajectory hold its first or last sample.
+    :return: Array of shape (len(targets), 6).
+    """
+    joints = np.asarray(joints, dtype=np.float64)
+    if len(joints) == 1:
+        return np.repeat(joints, len(targets), axis=0)
+    segment = np.clip(np.searchsorted(times, targets, side='right') - 1, 0, len(times) - 2)
+    span = times[segment + 1] - times[segment]
+    fractions = np.clip(np.divide(targets - times[segment], span, out=np.ones_like(span), where=span > 0), 0, 1)
+    return joints[segment] + fractions[:, np.newaxis] * (joints[segment + 1] - joints[segment])
+
+
+def resample(joints: np.ndarray, times: np.ndarray, rate_hz: float, speed: Union[float, np.ndarray] = 1.0,
+             limits: Optional[Dict[str, float]] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+        Retime a trajectory and sample it at a fixed frame rate.
+    :param joints: Array of shape (N, 6) of joint angles in motor_names[1:] order.
+    :param times: Increasing sample times in seconds.
+    :param rate_hz: Output frame rate.
+    :param speed: Speed factor for the whole trajectory, or an array with one per segment.
+    :param limits: Joint speed limits, see clamp_velocity.
+    :return: Tuple (output times starting at zero, output joints). The last sample is always included.
+    """
+    joints = np.asarray(joints, dtype=np.float64)
+    if not len(joints):
+        return np.zeros(0), np.zeros((0, joints.shape[-1]))
+    warped = clamp_velocity(joints, warp_times(times, speed), limits)
+    warped -= warped[0]
+    targets = np.arange(0.0, warped[-1], 1 / rate_hz)
+    targets = np.append(targets, warped[-1])
+    return targets, interpolate(joints, warped, targets)
+
+
+def resample_path(motion_path: MotionPath, rate_hz: float, speed: Union[float, np.ndarray] = 1.0,
+                  time_ms: float = 1000.0, limits: Optional[Dict[str, float]] = None) -> MotionPath:
+    """
+        Resample a motion path for playback at a fixed frame rate and speed.
+    :param motion_path: Motion path to resample.
+    :param rate_hz: Output frame rate.
+    :param speed: See resample.
+    :param time_ms: Duration of each move of a keyframe path (one without durations).
+    :param limits: See clamp_velocity.
+    :return: Timed MotionPath. The first duration is zero: playback supplies the lead-in move.
+    """
+    if not len(motion_path):
+        return motion_path
+    times = sample_times(motion_path)
+    if times is None:
+        times = np.arange(len(motion_path), dtype=np.float64) * time_ms / 1000
+    new_times, joints = resample(motion_path.joints, times, rate_hz, speed, limits)
+    durations = 1000 * np.concatenate(([0.0], np.diff(new_times)))
+    log.info(f'Resampled {len(motion_path)} samples to {len(joints)} frames over {new_times[-1]:.2f} s.')
+    return MotionPath(joints.astype(np.float32), durations=durations.astype(np.float32))
@@ -0,0 +1,140 @@
+#! /usr/bin/env python3
+import os
+import json
+import logging
+import argparse
+import numpy as np
+from os import path
+from time import monotonic
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from MotionArchive import load_recording
+from CollisionChecker import CollisionChecker
+from MotionLibrary import describe, ignored_suffixes
+from MotionPath import MotionPath
+from definitions import motor_names
+from trajectory import max_joint_speeds, sample_times
+
+log = logging.getLogger('ValidateMotionPaths')
+
+summary_name = 'summary.json'
+
+
+def peak_velocities(motion_path: MotionPath, time_ms: float = 1000.0) -> np.ndarray:
+    """
+        Fastest motion of each joint during playback.
+    :param motion_path: Motion path to analyze.
+    :param time_ms: Duration of each move of a keyframe path (one without durations).
+    :return: Array of 6 peak speeds in degrees per second, in motor_names[1:] order.
+    """
+    joints = np.asarray(motion_path.joints, dtype=np.float64)
+    if len(joints) < 2:
+        return np.zeros(len(motor_names) - 1)
+    times = sample_times(motion_path)
+    intervals = np.full(len(joints) - 1, time_ms / 1000) if times is None else np.diff(times)
+    moves = np.abs(np.diff(joints, axis=0))
+    # Zero-length intervals are duplicate samples, not infinitely fast moves.
+    speeds = np.divide(moves, intervals[:, np.newaxis], out=np.zeros_like(moves), where=intervals[:, np.newaxis] > 0)
+    return speeds.max(axis=0)
+
+
+def validate(filename: str, time_ms: float = 1000.0, collisions: bool = False) -> Dict[str, Any]:
+    """
+        Check one recording. Runs in a worker process.
+    :param filename: Path of the recording, in any motion path format.
+    :param time_ms: Duration of each move of a keyframe path.
+    :param collisions: Also report collisions with the estimated table and base geometry of definitions.
+    :return: Report of the catalogue description plus peak velocities, playback duration and problems found.
+    """
+    report: Dict[str, Any] = {'name': path.basename(filename), 'problems': []}
+    try:
+        motion_path = load_recording(filename, mmap=True)
+    except Exception as error:
+        # A worker that raises would abort the whole directory, so every failure becomes a report.
+        report.update({'valid': False, 'problems': [f'Unreadable: {error!r}']})
+        return report
+
+    report.update(describe(motion_path, CollisionChecker() if collisions else None))
+    peaks = peak_velocities(motion_path, time_ms)
+    report['peak_velocity_dps'] = dict(zip(motor_names[1:], peaks.tolist()))
+    report['playback_s'] = report['duration_s'] if report['timed'] else len(motion_path) * time_ms / 1000
+
+    if not report['safe']:
+        report['problems'].append(f"Unsafe pose or collision at sample {report['first_unsafe']}.")
+    for motor, peak in zip(motor_names[1:], peaks):
+        if peak > max_joint_speeds[motor]:
+            report['problems'].append(f'{motor} reaches {peak:.0f} deg/s (limit {max_joint_speeds[motor]:.0f}).')
+    report['valid'] = not report['problems']
+    return report
+
+
+def summarize(reports: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """ Aggregate per-file reports. """
+    valid = [report for report in reports if report['valid']]
+    boxes = [report for report in reports if report.get('box_min') is not None]
+    return {
+        'recordings': len(reports),
+        'valid': len(valid),
+        'invalid': sorted(report['name'] for report in reports if not report['valid']),
+        'poses': sum(report.get('poses', 0) for report in reports),
+        'playback_s': sum(report.get('playback_s', 0.0) for report in reports),
+        'box_min': np.min([report['box_min'] for report in boxes], axis=0).tolist() if boxes else None,
+        'box_max': np.max([report['box_max'] for report in boxes], axis=0).tolist() if boxes else None,
+    }
+
+
+def validate_directory(directory: str, output: Optional[str] = None, time_ms: float = 1000.0,
+                       workers: Optional[int] = None, collisions: bool = False) -> Dict[str, Any]:
+    """
+        Validate every recording in a directory on a process pool, one task per file.
+    :param directory: Motion path directory.
+    :param output: Directory for the per-file reports and the summary. (Defaults to not writing them.)
+    :param time_ms: Duration of each move of keyframe paths.
+    :param workers: Number of processes. (Defaults to one per core.)
+    :param collisions: See validate.
+    :return: Summary.
+    """
+    filenames = sorted(path.join(directory, name) for name in os.listdir(directory)
+                       if not name.startswith('.') and not name.endswith(ignored_suffixes)
+                       and path.isfile(path.join(directory, name)))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        reports = list(executor.map(validate, filenames, [time_ms] * len(filenames), [collisions] * len(filenames)))
+
+    summary = summarize(reports)
+    if output is not None:
+        os.makedirs(output, exist_ok=True)
+        for report in reports:
+            with open(path.join(output, report['name'] + '.json'), 'w') as f:
+                json.dump(report, f, indent=1, sort_keys=True)
+        with open(path.join(output, summary_name), 'w') as f:
+            json.dump(summary, f, indent=1, sort_keys=True)
+    return summary
+
+
+def main() -> None:  # pragma: no cover
+    logging.basicConfig(level=logging.INFO,
+                        format=f'[%(levelname)s] {path.basename(__file__)} %(funcName)s: \n%(message)s')
+
+    parser = argparse.ArgumentParser(description='Validate every recording of a motion path directory in parallel.')
+    parser.add_argument('directory', type=str, nargs='?', default='motionpaths', help='Motion path directory.')
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='Directory for the reports. (Defaults to <directory>/reports.)')
+    parser.add_argument('-t', '--time', type=float, default=1000.0, help='Time of each keyframe move in ms.')
+    parser.add_argument('-c', '--collisions', action='store_true',
+                        help='Report collisions with the table or the base. Uses the estimated geometry of definitions.')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes. (Defaults to every core.)')
+    arguments = parser.parse_args()
+
+    start = monotonic()
+    output = path.join(arguments.directory, 'reports') if arguments.output is None else arguments.output
+    summary = validate_directory(arguments.directory, output, arguments.time, arguments.jobs,
+                                 arguments.collisions)
+    log.info(f"{summary['valid']} of {summary['recordings']} recordings valid "
+             f'in {monotonic() - start:.2f} s. Reports in {output}.')
+    for name in summary['invalid']:
+        log.warning(f'{name} failed validation. See {path.join(output, name + ".json")}.')
+
+
+if __name__ == '__main__':
+    main()